@@ -1,20 +1,52 @@
 """Agents package initialization."""
 from .nodes import (
     classify_intent,
+    aclassify_intent,
     extract_product_metadata,
+    aextract_product_metadata,
+    speculative_extract_product_metadata,
+    aspeculative_extract_product_metadata,
+    resolve_speculation,
+    get_speculation_stats,
     ask_clarification,
     faq_assistant,
+    afaq_assistant,
     product_assistant,
+    aproduct_assistant,
+    product_search,
+    aproduct_search,
+    product_answer,
+    aproduct_answer,
+    template_product_answer,
+    render_products,
     route_by_intent,
     route_by_metadata,
+    route_after_speculation,
 )
+from .prompt_budget import get_prompt_budget_stats
 
 __all__ = [
     "classify_intent",
+    "aclassify_intent",
     "extract_product_metadata",
+    "aextract_product_metadata",
+    "speculative_extract_product_metadata",
+    "aspeculative_extract_product_metadata",
+    "resolve_speculation",
+    "get_speculation_stats",
     "ask_clarification",
     "faq_assistant",
+    "afaq_assistant",
     "product_assistant",
+    "aproduct_assistant",
+    "product_search",
+    "aproduct_search",
+    "product_answer",
+    "aproduct_answer",
+    "template_product_answer",
+    "render_products",
     "route_by_intent",
     "route_by_metadata",
+    "route_after_speculation",
+    "get_prompt_budget_stats",
 ]
@@ -1,6 +1,9 @@
 """Graph nodes and routing functions."""
+import json
+import threading
+import uuid
 from typing import Literal
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, ToolMessage
 from langchain_google_genai import ChatGoogleGenerativeAI
 
 from core import (
@@ -14,97 +17,257 @@ from core import (
     PRODUCT_ASSISTANT_SYSTEM_PROMPT,
     DEFAULT_CLARIFICATION_MESSAGE,
 )
-from services import search_faq_tool, search_products_tool
+from .fake_llm import FakeChatModel
+from .prompt_budget import assemble_prompt
+from services import (
+    search_faq_tool,
+    search_products_tool,
+    asearch_products_tool,
+    get_intent_classifier,
+    get_metadata_extractor,
+    run_in_search_pool,
+)
 
 
-# Initialize LLM
-llm = ChatGoogleGenerativeAI(
-    model=settings.LLM_MODEL,
-    api_key=settings.GOOGLE_API_KEY
-)
+# Initialize LLM (settings.LLM_PROVIDER "fake" for local serving tests)
+if settings.LLM_PROVIDER == "fake":
+    llm = FakeChatModel()
+else:
+    llm = ChatGoogleGenerativeAI(
+        model=settings.LLM_MODEL,
+        api_key=settings.GOOGLE_API_KEY
+    )
 
 
 def classify_intent(state: State) -> dict:
     """
     Classify user intent as FAQ or Product search.
-    Uses full conversation history for context-aware classification.
+    Tries the local embedding classifier first; when it is not confident,
+    uses the LLM with full conversation history for context-aware classification.
     """
-    structured_llm = llm.with_structured_output(IntentClassification)
+    intent = _local_intent(state)
+    if intent is None:
+        structured_llm = llm.with_structured_output(IntentClassification)
+        intent = structured_llm.invoke(_intent_messages(state))
     
-    # Filter messages: only keep HumanMessage and final AIMessage responses
-    # Exclude tool calls and tool messages
-    conversation_history = []
-    for msg in state['messages']:
-        if isinstance(msg, HumanMessage):
-            conversation_history.append(msg)
-        elif isinstance(msg, AIMessage):
-            # Handle both string content and list content
-            content_text = None
-            if isinstance(msg.content, str):
-                content_text = msg.content.strip()
-            elif isinstance(msg.content, list):
-                # Extract text from list of content parts
-                text_parts = [part.get('text', '') if isinstance(part, dict) else str(part) for part in msg.content]
-                content_text = ' '.join(text_parts).strip()
-            
-            # Only include if we have actual text content
-            if content_text:
-                # Create a new AIMessage with string content
-                conversation_history.append(AIMessage(content=content_text))
-    
-    # Add the classification prompt
-    messages = conversation_history + [
-        HumanMessage(content=INTENT_CLASSIFICATION_PROMPT.format(
-            user_message=state['messages'][-1].content
-        ))
-    ]
+    return {"intent": intent, "history": _user_turn_history(state)}
+
+
+async def aclassify_intent(state: State) -> dict:
+    """Async classify_intent: awaits the LLM instead of blocking."""
+    intent = await run_in_search_pool(_local_intent, state)
+    if intent is None:
+        structured_llm = llm.with_structured_output(IntentClassification)
+        intent = await structured_llm.ainvoke(_intent_messages(state))
     
-    intent = structured_llm.invoke(messages)
+    return {"intent": intent, "history": _user_turn_history(state)}
+
+
+def _local_intent(state: State):
+    """Local classifier result, or None when the LLM should decide."""
+    if not settings.LOCAL_INTENT_CLASSIFIER:
+        return None
+    
+    user_message = state['messages'][-1].content
+    if not isinstance(user_message, str) or not user_message.strip():
+        return None
     
-    return {"intent": intent}
+    # The previous turn's intent stands in for the history: a follow-up that
+    # would switch intent goes to the LLM, which sees the conversation
+    classifier = get_intent_classifier()
+    intent = classifier.classify(user_message)
+    return intent if classifier.accept(intent, state.get('intent')) else None
+
 
 def extract_product_metadata(state: State) -> dict:
     """
     Extract product search metadata from user message.
-    Uses full conversation history for context-aware extraction.
+    Tries the local catalog-vocabulary extractor first; when the message is
+    ambiguous, uses the LLM with full conversation history for context-aware extraction.
     """
+    metadata, _ = _extract_metadata(state)
+    return {"product_metadata": metadata}
+
+
+async def aextract_product_metadata(state: State) -> dict:
+    """Async extract_product_metadata: awaits the LLM instead of blocking."""
+    metadata, _ = await _aextract_metadata(state)
+    return {"product_metadata": metadata}
+
+
+def _extract_metadata(state: State) -> tuple:
+    """(metadata, whether the LLM was called)."""
+    metadata = _local_metadata(state)
+    if metadata is not None:
+        return metadata, False
     structured_llm = llm.with_structured_output(ProductMetadata)
+    return structured_llm.invoke(_metadata_messages(state)), True
+
+
+async def _aextract_metadata(state: State) -> tuple:
+    """Async _extract_metadata."""
+    metadata = await run_in_search_pool(_local_metadata, state)
+    if metadata is not None:
+        return metadata, False
+    structured_llm = llm.with_structured_output(ProductMetadata)
+    return await structured_llm.ainvoke(_metadata_messages(state)), True
+
+
+def _local_metadata(state: State):
+    """Local extractor result (with previous-turn context), or None when the LLM should decide."""
+    if not settings.LOCAL_METADATA_EXTRACTOR:
+        return None
+    
+    user_message = state['messages'][-1].content
+    if not isinstance(user_message, str) or not user_message.strip():
+        return None
+    
+    return get_metadata_extractor().extract(user_message, state.get('product_metadata'))
+
+
+# Speculative routing: extraction runs in parallel with classification and
+# is thrown away on FAQ turns. Counters let us judge the cost trade-off.
+_speculation_lock = threading.Lock()
+_speculation_stats = {"speculative_calls": 0, "wasted_calls": 0}
+
+
+def speculative_extract_product_metadata(state: State) -> dict:
+    """
+    extract_product_metadata run alongside classify_intent.
+    Result is parked in speculative_metadata until the intent is known.
+    """
+    metadata, llm_call = _extract_metadata(state)
+    return {"speculative_metadata": metadata, "speculative_llm_call": llm_call}
+
+
+async def aspeculative_extract_product_metadata(state: State) -> dict:
+    """Async speculative_extract_product_metadata."""
+    metadata, llm_call = await _aextract_metadata(state)
+    return {"speculative_metadata": metadata, "speculative_llm_call": llm_call}
+
+
+def resolve_speculation(state: State) -> dict:
+    """
+    Join point of speculative routing.
+    Keeps the speculative extraction for product turns, discards it for FAQ turns.
+    Only extractions that reached the LLM count as speculative (or wasted) calls.
+    """
+    wasted = state['intent'].intent_type == "faq"
+    if state.get('speculative_llm_call'):
+        with _speculation_lock:
+            _speculation_stats["speculative_calls"] += 1
+            if wasted:
+                _speculation_stats["wasted_calls"] += 1
+    
+    if wasted:
+        return {"speculative_metadata": None, "speculative_llm_call": False}
+    return {
+        "product_metadata": state.get('speculative_metadata'),
+        "speculative_metadata": None,
+        "speculative_llm_call": False,
+    }
+
+
+def get_speculation_stats() -> dict:
+    """Speculative extraction LLM calls made, and how many were wasted on FAQ turns."""
+    with _speculation_lock:
+        stats = dict(_speculation_stats)
+    calls = stats["speculative_calls"]
+    stats["wasted_ratio"] = stats["wasted_calls"] / calls if calls else 0.0
+    return stats
+
+
+def _conversation_history(state: State) -> list:
+    """
+    HumanMessages and final AIMessage responses, ending with the current message.
+    Reads the incrementally maintained state['history'] instead of rescanning
+    every message; only checkpoints from before it existed are rebuilt.
+    """
+    current = state['messages'][-1]
+    history = state.get('history')
+    if history is None:
+        history = _project_history(state['messages'][:-1])[-settings.HISTORY_WINDOW:]
     
-    # Filter messages: only keep HumanMessage and final AIMessage responses
-    # Exclude tool calls and tool messages
+    if any(msg.id == current.id for msg in history):
+        return list(history)
+    return list(history) + [current]
+
+
+def _user_turn_history(state: State) -> list:
+    """History update recording the current user message (seeds legacy threads)."""
+    if state.get('history') is None:
+        return _conversation_history(state)
+    return [state['messages'][-1]]
+
+
+def _project_history(messages: list) -> list:
+    """
+    Filter messages: only keep HumanMessage and final AIMessage responses.
+    Excludes tool calls and tool messages.
+    """
     conversation_history = []
-    for msg in state['messages']:
+    for msg in messages:
         if isinstance(msg, HumanMessage):
             conversation_history.append(msg)
-        elif isinstance(msg, AIMessage):
-            # Handle both string content and list content
-            content_text = None
-            if isinstance(msg.content, str):
-                content_text = msg.content.strip()
-            elif isinstance(msg.content, list):
-                # Extract text from list of content parts
-                text_parts = [part.get('text', '') if isinstance(part, dict) else str(part) for part in msg.content]
-                content_text = ' '.join(text_parts).strip()
-            
-            # Only include if we have actual text content
-            if content_text:
-                # Create a new AIMessage with string content
-                conversation_history.append(AIMessage(content=content_text))
+        else:
+            history_msg = _history_reply(msg)
+            if history_msg:
+                conversation_history.append(history_msg)
+    return conversation_history
+
+
+def _history_reply(msg):
+    """AIMessage with plain string content for the history, or None if it has no text."""
+    if not isinstance(msg, AIMessage):
+        return None
+    
+    # Handle both string content and list content
+    content_text = None
+    if isinstance(msg.content, str):
+        content_text = msg.content.strip()
+    elif isinstance(msg.content, list):
+        # Extract text from list of content parts
+        text_parts = [part.get('text', '') if isinstance(part, dict) else str(part) for part in msg.content]
+        content_text = ' '.join(text_parts).strip()
+    
+    # Only include if we have actual text content
+    if content_text:
+        # Create a new AIMessage with string content
+        return AIMessage(content=content_text, id=msg.id)
+    return None
+
+
+def _assistant_update(response) -> dict:
+    """State update for an assistant reply, appending its text to the history."""
+    update = {"messages": [response]}
+    history_msg = _history_reply(response)
+    if history_msg:
+        update["history"] = [history_msg]
+    return update
+
+
+def _intent_messages(state: State) -> list:
+    """Conversation history plus the classification prompt."""
+    return _conversation_history(state) + [
+        HumanMessage(content=INTENT_CLASSIFICATION_PROMPT.format(
+            user_message=state['messages'][-1].content
+        ))
+    ]
+
+
+def _metadata_messages(state: State) -> list:
+    """Conversation history plus the metadata extraction prompt."""
+    conversation_history = _conversation_history(state)
     
     # Ensure we have at least the current user message
     if not conversation_history:
         conversation_history.append(state['messages'][-1])
     
-    # Add the extraction prompt
-    messages = conversation_history + [
+    return conversation_history + [
         HumanMessage(content=PRODUCT_METADATA_EXTRACTION_PROMPT.format(
             user_message=state['messages'][-1].content
         ))
     ]
-    
-    metadata = structured_llm.invoke(messages)
-    
-    return {"product_metadata": metadata}
 
 
 def ask_clarification(state: State) -> dict:
@@ -113,7 +276,7 @@ def ask_clarification(state: State) -> dict:
     metadata = state['product_metadata']
     question = metadata.clarification_question or DEFAULT_CLARIFICATION_MESSAGE
     
-    return {"messages": [AIMessage(content=question)]}
+    return _assistant_update(AIMessage(content=question))
 
 
 def faq_assistant(state: State) -> dict:
@@ -121,10 +284,16 @@ def faq_assistant(state: State) -> dict:
     Assistant for FAQ queries.
     Uses search_faq_tool to find answers.
     """
-    llm_with_tools = llm.bind_tools([search_faq_tool])
-    sys_msg = SystemMessage(content=FAQ_ASSISTANT_SYSTEM_PROMPT)
+    llm_with_tools = _bind_tool(search_faq_tool, state)
     
-    return {"messages": [llm_with_tools.invoke([sys_msg] + state["messages"])]}
+    return _assistant_update(llm_with_tools.invoke(_faq_messages(state)))
+
+
+async def afaq_assistant(state: State) -> dict:
+    """Async faq_assistant: awaits the LLM instead of blocking."""
+    llm_with_tools = _bind_tool(search_faq_tool, state)
+    
+    return _assistant_update(await llm_with_tools.ainvoke(_faq_messages(state)))
 
 
 def product_assistant(state: State) -> dict:
@@ -132,8 +301,138 @@ def product_assistant(state: State) -> dict:
     Assistant for product search.
     Uses search_products_tool with extracted metadata.
     """
-    llm_with_tools = llm.bind_tools([search_products_tool])
+    llm_with_tools = _bind_tool(search_products_tool, state)
+    
+    return _assistant_update(llm_with_tools.invoke(_product_messages(state)))
+
+
+async def aproduct_assistant(state: State) -> dict:
+    """Async product_assistant: awaits the LLM instead of blocking."""
+    llm_with_tools = _bind_tool(search_products_tool, state)
     
+    return _assistant_update(await llm_with_tools.ainvoke(_product_messages(state)))
+
+
+def _bind_tool(tool, state: State):
+    """
+    LLM with the assistant's search tool. Once the turn has used
+    settings.MAX_TOOL_ROUNDS tool rounds, tool calls are disabled so the
+    assistant answers from the results it already has.
+    """
+    if _tool_rounds(state) >= settings.MAX_TOOL_ROUNDS:
+        return llm.bind_tools([tool], tool_choice="none")
+    return llm.bind_tools([tool])
+
+
+def _tool_rounds(state: State) -> int:
+    """Assistant messages with tool calls since the current user message."""
+    rounds = 0
+    for msg in reversed(state["messages"]):
+        if isinstance(msg, HumanMessage):
+            break
+        if isinstance(msg, AIMessage) and msg.tool_calls:
+            rounds += 1
+    return rounds
+
+
+# Product fast path (build_graph(fast_path=...)): search straight from the
+# extracted metadata instead of letting the LLM emit the tool call
+
+def product_search(state: State) -> dict:
+    """
+    Deterministic search_products_tool call from state['product_metadata'].
+    Recorded as a tool call + result pair, as if product_assistant had made it.
+    """
+    args = _search_args(state)
+    return _search_update(args, search_products_tool(**args))
+
+
+async def aproduct_search(state: State) -> dict:
+    """Async product_search: searches on the search workers or thread pool."""
+    args = _search_args(state)
+    return _search_update(args, await asearch_products_tool(**args))
+
+
+def product_answer(state: State) -> dict:
+    """Answer from the fast-path search result with one LLM call (no further tool calls)."""
+    llm_no_tools = llm.bind_tools([search_products_tool], tool_choice="none")
+    return _assistant_update(llm_no_tools.invoke(_product_messages(state)))
+
+
+async def aproduct_answer(state: State) -> dict:
+    """Async product_answer: awaits the LLM instead of blocking."""
+    llm_no_tools = llm.bind_tools([search_products_tool], tool_choice="none")
+    return _assistant_update(await llm_no_tools.ainvoke(_product_messages(state)))
+
+
+def template_product_answer(state: State) -> dict:
+    """Answer from the fast-path search result without any LLM call (see render_products)."""
+    return _assistant_update(AIMessage(content=render_products(_last_search_result(state))))
+
+
+def render_products(result: dict) -> str:
+    """The PRODUCT_ASSISTANT_SYSTEM_PROMPT output format, filled from a search_products_tool result."""
+    products = (result or {}).get("results") or []
+    if not products:
+        return "I couldn't find products matching that. Want me to broaden the search, e.g. drop a filter?"
+    
+    lines = ["Here's what I found:"]
+    for product in products:
+        lines.append(f"(ID: {product.get('product_id')}) {product.get('productDisplayName')} - ${product.get('price')}")
+    
+    available_filters = result.get("available_filters")
+    if available_filters:
+        options = "; ".join(
+            f"{field}: " + ", ".join(f"{value} ({count})" for value, count in counts.items())
+            for field, counts in available_filters.items()
+        )
+        lines.append(f"\nWant to narrow it down? {options}")
+    elif len(products) < 3:
+        lines.append("\nOnly a few matches - I can broaden the search if you'd like.")
+    return "\n".join(lines)
+
+
+def _search_args(state: State) -> dict:
+    """search_products_tool arguments from the extracted metadata."""
+    metadata = state.get('product_metadata')
+    if metadata is None:
+        return {"query": state['messages'][-1].content}
+    args = {"query": metadata.search_query or "general product search"}
+    for field in ("articleType", "gender", "baseColour", "usage", "season", "min_price", "max_price", "sort"):
+        value = getattr(metadata, field)
+        if value is not None:
+            args[field] = value
+    return args
+
+
+def _search_update(args: dict, result: dict) -> dict:
+    """State update recording the search as a tool call and its result."""
+    call_id = f"call_{uuid.uuid4().hex[:12]}"
+    return {"messages": [
+        AIMessage(content="", tool_calls=[{"name": "search_products_tool", "args": args, "id": call_id}]),
+        ToolMessage(content=json.dumps(result, ensure_ascii=False, default=str), name="search_products_tool", tool_call_id=call_id),
+    ]}
+
+
+def _last_search_result(state: State) -> dict:
+    """The product_search result this turn (last ToolMessage)."""
+    for msg in reversed(state["messages"]):
+        if isinstance(msg, ToolMessage):
+            try:
+                return json.loads(msg.content)
+            except (TypeError, ValueError):
+                return {}
+    return {}
+
+
+def _faq_messages(state: State) -> list:
+    """FAQ system prompt plus the conversation, within the prompt token budget."""
+    sys_msg = SystemMessage(content=FAQ_ASSISTANT_SYSTEM_PROMPT)
+    return assemble_prompt(sys_msg, state["messages"])
+
+
+def _product_messages(state: State) -> list:
+    """Product system prompt (with extracted metadata) plus the conversation, within the prompt token budget."""
     metadata = state.get('product_metadata')
     
     # Build context for assistant
@@ -148,14 +447,26 @@ User is looking for:
 - Gender: {metadata.gender or 'any'}
 - Color: {metadata.baseColour or 'any'}
 - Usage: {metadata.usage or 'any'}
+- Price: {_price_context(metadata)}
+- Sort: {metadata.sort or 'relevance'}
 """
     
     sys_msg = SystemMessage(content=PRODUCT_ASSISTANT_SYSTEM_PROMPT.format(
         context=context,
         search_query=search_query
     ))
-    
-    return {"messages": [llm_with_tools.invoke([sys_msg] + state["messages"])]}
+    return assemble_prompt(sys_msg, state["messages"])
+
+
+def _price_context(metadata: ProductMetadata) -> str:
+    """Price range for the assistant context ('any', 'under $40', '$20 - $50', ...)."""
+    if metadata.min_price is not None and metadata.max_price is not None:
+        return f"${metadata.min_price:g} - ${metadata.max_price:g}"
+    if metadata.max_price is not None:
+        return f"under ${metadata.max_price:g}"
+    if metadata.min_price is not None:
+        return f"over ${metadata.min_price:g}"
+    return "any"
 
 
 # Routing functions
@@ -166,6 +477,15 @@ def route_by_intent(state: State) -> Literal["faq_assistant", "extract_product_m
     return "extract_product_metadata"
 
 
+def route_after_speculation(
+    state: State
+) -> Literal["faq_assistant", "ask_clarification", "product_assistant"]:
+    """Route once both speculative branches are in: FAQ, or by product metadata."""
+    if route_by_intent(state) == "faq_assistant":
+        return "faq_assistant"
+    return route_by_metadata(state)
+
+
 def route_by_metadata(state: State) -> Literal["ask_clarification", "product_assistant"]:
     """Route based on whether clarification is needed."""
     metadata = state.get('product_metadata')
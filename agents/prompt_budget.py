@@ -0,0 +1,132 @@
+"""Token-budgeted prompt assembly for the ReAct assistants."""
+import json
+import threading
+from typing import List, Tuple
+
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, ToolMessage
+
+from core import settings
+
+
+# Product fields the PRODUCT_ASSISTANT_SYSTEM_PROMPT output format needs
+PRODUCT_PROMPT_FIELDS = ("product_id", "productDisplayName", "price")
+# FAQ fields the FAQ assistant answers from
+FAQ_PROMPT_FIELDS = ("question", "answer")
+
+_stats_lock = threading.Lock()
+_stats = {"prompts": 0, "tokens_before": 0, "tokens_after": 0, "last_turn_saved": 0}
+
+
+def estimate_tokens(messages: List[BaseMessage]) -> int:
+    """Cheap token estimate (characters / settings.CHARS_PER_TOKEN)."""
+    chars = 0
+    for msg in messages:
+        content = msg.content
+        chars += len(content) if isinstance(content, str) else len(json.dumps(content, default=str))
+        for call in getattr(msg, "tool_calls", None) or []:
+            chars += len(call["name"]) + len(json.dumps(call["args"], default=str))
+    return chars // settings.CHARS_PER_TOKEN + 1
+
+
+def compact_tool_message(msg: ToolMessage) -> ToolMessage:
+    """Keep only the fields the assistant prompts use from a search tool result."""
+    try:
+        payload = json.loads(msg.content)
+    except (TypeError, ValueError):
+        return msg
+
+    if isinstance(payload, dict) and isinstance(payload.get("results"), list):
+        # search_products_tool: {"count", "results", "available_filters"}
+        payload = {
+            "count": payload.get("count"),
+            "results": [_pick(r, PRODUCT_PROMPT_FIELDS) for r in payload["results"]],
+            "available_filters": payload.get("available_filters"),
+        }
+    elif isinstance(payload, list) and all(isinstance(r, dict) and "answer" in r for r in payload):
+        # search_faq_tool: list of FAQ entries
+        payload = [_pick(r, FAQ_PROMPT_FIELDS) for r in payload]
+    else:
+        return msg
+
+    return msg.model_copy(update={"content": json.dumps(payload, ensure_ascii=False)})
+
+
+def assemble_prompt(
+    sys_msg: BaseMessage,
+    messages: List[BaseMessage],
+    budget: int = None
+) -> List[BaseMessage]:
+    """
+    Build [sys_msg] + messages within a token budget (settings.PROMPT_TOKEN_BUDGET).
+
+    1. Tool results are always trimmed to the fields the prompts need.
+    2. Over budget: tool calls/results of earlier turns are dropped (their final
+       assistant reply already tells the story).
+    3. Still over budget: earliest turns are dropped whole. The current turn is always kept.
+    """
+    if budget is None:
+        budget = settings.PROMPT_TOKEN_BUDGET
+    tokens_before = estimate_tokens([sys_msg] + messages)
+
+    compacted = [
+        compact_tool_message(msg) if isinstance(msg, ToolMessage) else msg
+        for msg in messages
+    ]
+    turns = _split_turns(compacted)
+
+    def total(turn_list):
+        return estimate_tokens([sys_msg] + [msg for turn in turn_list for msg in turn])
+
+    if budget and total(turns) > budget:
+        turns = [_drop_tool_traffic(turn) for turn in turns[:-1]] + turns[-1:]
+    while budget and len(turns) > 1 and total(turns) > budget:
+        turns = turns[1:]
+
+    prompt = [sys_msg] + [msg for turn in turns for msg in turn]
+    _record(tokens_before, estimate_tokens(prompt))
+    return prompt
+
+
+def get_prompt_budget_stats() -> dict:
+    """Prompt sizes before/after assembly and tokens saved (last turn and overall)."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["tokens_saved"] = stats["tokens_before"] - stats["tokens_after"]
+    return stats
+
+
+def _pick(record: dict, fields: Tuple[str, ...]) -> dict:
+    return {field: record[field] for field in fields if field in record}
+
+
+def _split_turns(messages: List[BaseMessage]) -> List[List[BaseMessage]]:
+    """Group messages into turns, each starting at a HumanMessage."""
+    turns: List[List[BaseMessage]] = []
+    for msg in messages:
+        if isinstance(msg, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(msg)
+    return turns
+
+
+def _drop_tool_traffic(turn: List[BaseMessage]) -> List[BaseMessage]:
+    """Remove tool results and text-less tool-call messages from a finished turn."""
+    kept = []
+    for msg in turn:
+        if isinstance(msg, ToolMessage):
+            continue
+        if isinstance(msg, AIMessage) and msg.tool_calls:
+            if not msg.content:
+                continue
+            # Keep what the model said, without the dangling tool calls
+            msg = AIMessage(content=msg.content, id=msg.id)
+        kept.append(msg)
+    return kept
+
+
+def _record(tokens_before: int, tokens_after: int):
+    with _stats_lock:
+        _stats["prompts"] += 1
+        _stats["tokens_before"] += tokens_before
+        _stats["tokens_after"] += tokens_after
+        _stats["last_turn_saved"] = tokens_before - tokens_after
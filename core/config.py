@@ -14,6 +14,17 @@ class Settings:
     # Embedding model for vector search
     EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
     
+    # Encoder backend (services.encoders.EMBEDDING_BACKENDS): "torch", "torch-int8",
+    # "onnx" or "onnx-int8". A non-torch backend is used once
+    # `python -m services.encoders --check` recorded that its vectors match the torch
+    # encoder's (mean cosine >= EMBEDDING_MIN_COSINE); otherwise "torch" is.
+    # EMBEDDING_MAX_SEQ_LENGTH truncates inputs on the non-torch backends only.
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "torch")
+    EMBEDDING_ONNX_INT8_FILE: str = "onnx/model_quint8_avx2.onnx"
+    EMBEDDING_MAX_SEQ_LENGTH: int = 128
+    EMBEDDING_MIN_COSINE: float = 0.98
+    EMBEDDING_CHECK_SAMPLE: int = 32
+    
     # Data paths - FAISS indices stored here
     BASE_DIR: Path = Path(__file__).parent.parent
     DATA_DIR: Path = BASE_DIR / "data"
@@ -24,9 +35,140 @@ class Settings:
     PRODUCT_INDEX_PATH: Path = INDICES_DIR / "products.index"
     PRODUCT_METADATA_PATH: Path = INDICES_DIR / "products.metadata"
     
+    # mmap-able column copies of the metadata pickles (written on first load)
+    FAQ_COLUMNS_PATH: Path = INDICES_DIR / "faq.columns"
+    PRODUCT_COLUMNS_PATH: Path = INDICES_DIR / "products.columns"
+    
+    # Encoder backend verdicts recorded by `python -m services.encoders --check`
+    EMBEDDING_CHECK_PATH: Path = INDICES_DIR / "encoder_checks.json"
+    
+    # Incremental catalog updates: append-only log merged into the base in the background
+    PRODUCT_DELTA_LOG_PATH: Path = INDICES_DIR / "products.delta.jsonl"
+    DELTA_MERGE_INTERVAL: float = 900.0  # seconds between background merges
+    DELTA_MERGE_MAX_ROWS: int = 5000     # merge early once this many products are pending
+    
+    # Load model/indices/metadata on first use, memory-map indices and metadata
+    LAZY_LOAD: bool = os.getenv("LAZY_LOAD", "true").lower() == "true"
+    INDEX_MMAP: bool = os.getenv("INDEX_MMAP", "true").lower() == "true"
+    
     # Search settings
     DEFAULT_SEARCH_K: int = 11
     FAQ_SEARCH_K: int = 3
+    
+    # Retrieval mode for the search tools: "vector" (default), "hybrid" (BM25 + vector, RRF-fused) or "lexical"
+    SEARCH_MODE: str = os.getenv("SEARCH_MODE", "vector")
+    HYBRID_CANDIDATES: int = 50  # hits taken from each retriever before fusion
+    RRF_K: int = 60              # reciprocal-rank-fusion damping constant
+    
+    # A non-relevance sort (e.g. price ascending) is exact over every product matching
+    # the filters; a search without filters re-orders this many most relevant hits
+    SORT_CANDIDATES: int = int(os.getenv("SORT_CANDIDATES", "100"))
+    
+    # Product result diversification: near-duplicate variants (same display name
+    # apart from colour) are dropped, then MMR picks k of the top MMR_CANDIDATES.
+    # MMR_LAMBDA weighs relevance against diversity (1.0 = relevance order only).
+    PRODUCT_DIVERSIFY: bool = os.getenv("PRODUCT_DIVERSIFY", "false").lower() == "true"
+    MMR_LAMBDA: float = 0.7
+    MMR_CANDIDATES: int = 30
+    DEDUP_FIELD: str = "productDisplayName"
+    
+    # Optional local cross-encoder reranking: RERANK_CANDIDATES hits are re-scored
+    # against (query, product name / FAQ question) in batches, and only the top k
+    # are returned. Past RERANK_BUDGET_MS the retrieval order is kept instead.
+    RERANK: bool = os.getenv("RERANK", "false").lower() == "true"
+    RERANK_MODEL: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    RERANK_CANDIDATES: int = 50
+    RERANK_BATCH_SIZE: int = 16
+    RERANK_BUDGET_MS: float = 150.0
+    RERANK_TEXT_FIELDS: dict = {"products": "productDisplayName", "faq": "question"}
+    
+    # Query-time knobs for ANN indices built by services.index_builder
+    IVF_NPROBE: int = 16
+    HNSW_EF_SEARCH: int = 64
+    
+    # Metadata fields indexed up front for filter pre-selection
+    FILTER_FIELDS: tuple = (
+        "articleType", "gender", "baseColour", "usage", "season",
+        "masterCategory", "subCategory",
+    )
+    
+    # Facets suggested to narrow product searches (top FACET_TOP_N values by count)
+    FACET_FIELDS: tuple = ("gender", "articleType", "baseColour", "usage", "season")
+    FACET_TOP_N: int = 5
+    
+    # Query caches (embeddings and search results)
+    EMBEDDING_CACHE_SIZE: int = 2048
+    SEARCH_CACHE_SIZE: int = 1024
+    CACHE_TTL_SECONDS: float = 600.0
+    
+    # Semantic cache of whole FAQ answers: a first message within ANSWER_CACHE_THRESHOLD
+    # cosine of an answered FAQ question is answered from cache, skipping the graph (opt-in)
+    ANSWER_CACHE: bool = os.getenv("ANSWER_CACHE", "false").lower() == "true"
+    ANSWER_CACHE_THRESHOLD: float = 0.95
+    ANSWER_CACHE_SIZE: int = 512
+    ANSWER_CACHE_TTL_SECONDS: float = 3600.0
+    
+    # Worker threads for CPU-bound embedding/FAISS work on the async path
+    SEARCH_THREAD_POOL_SIZE: int = min(32, (os.cpu_count() or 1) + 4)
+    
+    # ReAct tool loops: several tool calls in one assistant message run in parallel
+    # on up to TOOL_CALL_CONCURRENCY threads; after MAX_TOOL_ROUNDS tool rounds in
+    # one turn the assistant must answer with what it has
+    TOOL_CALL_CONCURRENCY: int = 8
+    MAX_TOOL_ROUNDS: int = 3
+    
+    # Search worker processes for the HTTP server (0 = search in-process).
+    # Concurrent searches are coalesced for SEARCH_BATCH_WINDOW_MS into one batch;
+    # past SEARCH_MAX_PENDING queued/running searches new ones are rejected.
+    SEARCH_WORKERS: int = int(os.getenv("SEARCH_WORKERS", "0"))
+    SEARCH_WORKER_THREADS: int = 1
+    SEARCH_BATCH_WINDOW_MS: float = 3.0
+    SEARCH_MAX_BATCH: int = 64
+    SEARCH_MAX_PENDING: int = 256
+    
+    # HTTP server (server.py); LLM_PROVIDER "fake" answers without an API key for local testing
+    SERVE_HOST: str = os.getenv("SERVE_HOST", "127.0.0.1")
+    SERVE_PORT: int = int(os.getenv("SERVE_PORT", "8000"))
+    SERVE_MAX_INFLIGHT: int = 64  # concurrent chats before answering 503
+    LLM_PROVIDER: str = os.getenv("LLM_PROVIDER", "google")
+    
+    # Run intent classification and metadata extraction in parallel.
+    # Halves time-to-first-search on product turns, wastes one call on FAQ turns.
+    SPECULATIVE_ROUTING: bool = os.getenv("SPECULATIVE_ROUTING", "false").lower() == "true"
+    
+    # Product turns without the ReAct tool loop: search straight from the extracted
+    # metadata, then "llm" phrases the results in one call, "template" renders them
+    # with no LLM call at all. "off" lets product_assistant call the tool itself.
+    PRODUCT_FAST_PATH: str = os.getenv("PRODUCT_FAST_PATH", "off")
+    
+    # Local nearest-neighbour intent classifier in front of the LLM (opt-in).
+    # Below LOCAL_INTENT_THRESHOLD confidence we still ask the LLM; calibrate it on
+    # labelled messages with `python -m services.intent_classifier --labels ...`
+    # (the threshold depends on the temperature and the catalog).
+    LOCAL_INTENT_CLASSIFIER: bool = os.getenv("LOCAL_INTENT_CLASSIFIER", "false").lower() == "true"
+    LOCAL_INTENT_THRESHOLD: float = float(os.getenv("LOCAL_INTENT_THRESHOLD", "0.9"))
+    LOCAL_INTENT_NEIGHBORS: int = 3
+    LOCAL_INTENT_TEMPERATURE: float = float(os.getenv("LOCAL_INTENT_TEMPERATURE", "0.05"))
+    
+    # Messages of conversation history sent to classification/extraction prompts
+    HISTORY_WINDOW: int = 20
+    
+    # Approximate token budget for assistant prompts (system prompt + conversation)
+    PROMPT_TOKEN_BUDGET: int = 4000
+    CHARS_PER_TOKEN: int = 4
+    
+    # Local catalog-vocabulary metadata extractor in front of the LLM (opt-in);
+    # the LLM still sees ambiguous turns and exclusions ("anything but black")
+    LOCAL_METADATA_EXTRACTOR: bool = os.getenv("LOCAL_METADATA_EXTRACTOR", "false").lower() == "true"
+    
+    # Conversation checkpoints: "memory" (default, in-process) or "sqlite" (persistent, bounded)
+    CHECKPOINTER: str = os.getenv("CHECKPOINTER", "memory")
+    CHECKPOINT_DB_PATH: Path = Path(os.getenv("CHECKPOINT_DB_PATH", DATA_DIR / "checkpoints.sqlite"))
+    CHECKPOINT_TTL_SECONDS: float = 7 * 24 * 3600.0  # idle threads older than this are evicted
+    CHECKPOINT_MAX_THREADS: int = 10000               # least recently used threads beyond this are evicted
+    CHECKPOINT_KEEP_LAST: int = 5                     # checkpoints kept per thread after compaction
+    CHECKPOINT_FLUSH_EVERY: int = 64                  # buffered write operations per batch
+    CHECKPOINT_FLUSH_INTERVAL: float = 1.0            # max seconds a write stays buffered
 
 
 settings = Settings()
@@ -24,8 +24,10 @@ Examples:
 - Previous: "shirts" → Current: "mens black" → Extract: articleType=Shirts, gender=Men, baseColour=Black
 - Previous: "I need a dress" → Current: "blue one" → Extract: articleType=Dresses, baseColour=Blue
 - Previous: "shoes for women" → Current: "casual" → Extract: articleType=Shoes, gender=Women, usage=Casual
+- Current: "shirts under $40" → Extract: articleType=Shirts, max_price=40
+- Current: "cheapest watches" → Extract: articleType=Watches, sort=price_asc
 
-Extract metadata (articleType, gender, baseColour, usage, season).
+Extract metadata (articleType, gender, baseColour, usage, season, min_price, max_price, sort).
 Set can_search=True if we have SOME info (even just category).
 Set needs_clarification=True ONLY if query is completely vague ("I want something").
 
@@ -45,12 +47,13 @@ PRODUCT_ASSISTANT_SYSTEM_PROMPT = """You are a helpful fashion shopping assistan
 Use search_products_tool to find products. 
 
 CRITICAL: Always provide the 'query' parameter! Use the search query: "{search_query}"
-Then add any applicable filters: gender, articleType, baseColour, usage, season
+Then add any applicable filters: gender, articleType, baseColour, usage, season, min_price, max_price
+For "cheapest"/"most expensive" requests set sort to price_asc/price_desc instead of paging through results.
 
 The tool returns a dict with:
-- results: List of product dicts. Each product has: productDisplayName, price, product_id, gender, articleType, baseColour, usage
+- results: List of product dicts. Each product has: product_id, productDisplayName, price
 - count: Total number found
-- available_filters: Suggested filters if many results
+- available_filters: Suggested filters with how many products match each value, if many results
 
 MANDATORY OUTPUT FORMAT - Follow this EXACTLY for each product:
 (ID: {{product_id}}) {{productDisplayName}} - ${{price}} 
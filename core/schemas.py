@@ -4,6 +4,8 @@ from pydantic import BaseModel, Field
 from langgraph.graph import add_messages
 from typing_extensions import TypedDict
 
+from .config import settings
+
 
 class IntentClassification(BaseModel):
     """Classify user intent as FAQ or Product search."""
@@ -24,6 +26,11 @@ class ProductMetadata(BaseModel):
     baseColour: Optional[str] = Field(None, description="Color preference")
     usage: Optional[str] = Field(None, description="Casual, Formal, Ethnic, Sports")
     season: Optional[str] = Field(None, description="Summer, Winter, Fall, Spring")
+    min_price: Optional[float] = Field(None, description="Lowest acceptable price, e.g. 50 for 'over $50'")
+    max_price: Optional[float] = Field(None, description="Highest acceptable price, e.g. 40 for 'under $40'")
+    sort: Optional[Literal["relevance", "price_asc", "price_desc"]] = Field(
+        None, description="price_asc for cheapest first, price_desc for most expensive first"
+    )
     
     can_search: bool = Field(
         description="True if we have enough info to search (even without all filters)"
@@ -37,9 +44,31 @@ class ProductMetadata(BaseModel):
     )
 
 
+def add_history(left: Optional[list], right: Optional[list]) -> list:
+    """
+    Reducer for the conversation history projection.
+    Appends like add_messages (same id -> replaced, not duplicated), then keeps
+    only the last settings.HISTORY_WINDOW messages, starting on a user turn.
+    """
+    merged = add_messages(left or [], right or [])
+    window = settings.HISTORY_WINDOW
+    if window and len(merged) > window:
+        merged = merged[-window:]
+        while merged and merged[0].type != "human":
+            merged = merged[1:]
+    return merged
+
+
 class State(TypedDict, total=False):
     """Graph state with messages and extracted metadata."""
     messages: Annotated[list, add_messages]
+    # User turns and final assistant replies only (no tool traffic), appended
+    # incrementally by the nodes and shared by classification/extraction
+    history: Annotated[list, add_history]
     intent: Optional[IntentClassification]
     product_metadata: Optional[ProductMetadata]
+    # Extraction made in parallel with classification (speculative routing)
+    speculative_metadata: Optional[ProductMetadata]
+    # Whether that extraction called the LLM (the local extractor is free)
+    speculative_llm_call: bool
 
@@ -1,63 +1,125 @@
 """LangGraph setup and flow configuration"""
 import sys
 from langgraph.graph import StateGraph, START, END
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.prebuilt import ToolNode, tools_condition
+from langchain_core.runnables import RunnableLambda
 from core import State
 from agents import (
     classify_intent,
+    aclassify_intent,
     extract_product_metadata,
+    aextract_product_metadata,
     ask_clarification,
     faq_assistant,
+    afaq_assistant,
     product_assistant,
+    aproduct_assistant,
+    product_search,
+    aproduct_search,
+    product_answer,
+    aproduct_answer,
+    template_product_answer,
     route_by_intent,
     route_by_metadata,
+    speculative_extract_product_metadata,
+    aspeculative_extract_product_metadata,
+    resolve_speculation,
+    route_after_speculation,
 )
-from services import get_tools
+from core import settings
+from services import get_tools, create_checkpointer
 
-def build_graph():
-    """Build graph with 7 nodes and conditional routing"""
+def build_graph(speculative: bool = None, fast_path: str = None):
+    """
+    Build graph with 7 nodes and conditional routing
+    speculative: run classify_intent and metadata extraction in parallel
+                 (defaults to settings.SPECULATIVE_ROUTING)
+    fast_path: "llm"/"template" to search products straight from the metadata
+               instead of the product ReAct loop (defaults to settings.PRODUCT_FAST_PATH)
+    """
     print("Building graph...")
+    if speculative is None:
+        speculative = settings.SPECULATIVE_ROUTING
+    if fast_path is None:
+        fast_path = settings.PRODUCT_FAST_PATH
+    if fast_path not in ("off", "llm", "template"):
+        raise ValueError(f"Unknown product fast path {fast_path!r}, expected 'off', 'llm' or 'template'")
+    
+    # Product turns go to the ReAct loop or to the deterministic search
+    product_route = {"product_assistant": "product_search" if fast_path != "off" else "product_assistant"}
     
     # Initialize graph builder
     builder = StateGraph(State)
     
     # Add nodes - ek ek node graph me add karo
-    builder.add_node("classify_intent", classify_intent)
-    builder.add_node("extract_product_metadata", extract_product_metadata)
+    # LLM nodes get sync + async versions so both stream() and astream() work
+    builder.add_node("classify_intent", RunnableLambda(classify_intent, afunc=aclassify_intent))
+    builder.add_node("extract_product_metadata", RunnableLambda(extract_product_metadata, afunc=aextract_product_metadata))
     builder.add_node("ask_clarification", ask_clarification)
-    builder.add_node("faq_assistant", faq_assistant)
-    builder.add_node("product_assistant", product_assistant)
-    builder.add_node("tools", ToolNode(get_tools()))
+    builder.add_node("faq_assistant", RunnableLambda(faq_assistant, afunc=afaq_assistant))
+    builder.add_node("product_assistant", RunnableLambda(product_assistant, afunc=aproduct_assistant))
+    # One tool node per assistant, so each loop returns only to its own assistant.
+    # Several tool calls in one message (e.g. one search per colour) run in parallel.
+    tool_config = {"max_concurrency": settings.TOOL_CALL_CONCURRENCY}
+    builder.add_node("faq_tools", ToolNode(get_tools("faq")).with_config(tool_config))
+    builder.add_node("product_tools", ToolNode(get_tools("products")).with_config(tool_config))
+    if fast_path != "off":
+        builder.add_node("product_search", RunnableLambda(product_search, afunc=aproduct_search))
+        # The mode is fixed per graph: graphs built with another fast_path are unaffected
+        if fast_path == "template":
+            builder.add_node("product_answer", template_product_answer)
+        else:
+            builder.add_node("product_answer", RunnableLambda(product_answer, afunc=aproduct_answer))
     
     # Add edges
-    builder.add_edge(START, "classify_intent")
-    
-    # Route by intent
-    builder.add_conditional_edges(
-        "classify_intent",
-        route_by_intent
-    )
-    
-    # Route by metadata
-    builder.add_conditional_edges(
-        "extract_product_metadata",
-        route_by_metadata
-    )
+    if speculative:
+        # Fan out both structured calls from START, join once both are done
+        builder.add_node("speculative_extract", RunnableLambda(speculative_extract_product_metadata, afunc=aspeculative_extract_product_metadata))
+        builder.add_node("resolve_speculation", resolve_speculation)
+        builder.add_edge(START, "classify_intent")
+        builder.add_edge(START, "speculative_extract")
+        builder.add_edge(["classify_intent", "speculative_extract"], "resolve_speculation")
+        
+        # FAQ drops the extraction, product routes by metadata
+        builder.add_conditional_edges(
+            "resolve_speculation",
+            route_after_speculation,
+            {"faq_assistant": "faq_assistant", "ask_clarification": "ask_clarification", **product_route}
+        )
+    else:
+        builder.add_edge(START, "classify_intent")
+        
+        # Route by intent
+        builder.add_conditional_edges(
+            "classify_intent",
+            route_by_intent
+        )
+        
+        # Route by metadata
+        builder.add_conditional_edges(
+            "extract_product_metadata",
+            route_by_metadata,
+            {"ask_clarification": "ask_clarification", **product_route}
+        )
     
     # Clarification ends (wait for user response)
     builder.add_edge("ask_clarification", END)
     
-    # FAQ ReAct loop
-    builder.add_conditional_edges("faq_assistant", tools_condition)
-    builder.add_edge("tools", "faq_assistant")
+    # FAQ ReAct loop (rounds capped by settings.MAX_TOOL_ROUNDS in the assistant)
+    builder.add_conditional_edges("faq_assistant", tools_condition, {"tools": "faq_tools", END: END})
+    builder.add_edge("faq_tools", "faq_assistant")
     
     # Product ReAct loop
-    builder.add_conditional_edges("product_assistant", tools_condition)
-    builder.add_edge("tools", "product_assistant")
+    builder.add_conditional_edges("product_assistant", tools_condition, {"tools": "product_tools", END: END})
+    builder.add_edge("product_tools", "product_assistant")
+    
+    # Product fast path: one search, one (or no) LLM call
+    if fast_path != "off":
+        builder.add_edge("product_search", "product_answer")
+        builder.add_edge("product_answer", END)
     
-    # Compile with memory
-    memory = MemorySaver()
+    # Compile with memory (settings.CHECKPOINTER: persistent SQLite or in-process)
+    memory = create_checkpointer()
     graph = builder.compile(checkpointer=memory)
    
  # uncomment the below lines if u wnat to see the png of the langgraph
@@ -18,16 +18,23 @@ class FilteredStderr:
 # Install filtered stderr globally (mimics notebook's %%capture --no-stderr)
 sys.stderr = FilteredStderr(sys.stderr)
 
-from langchain_core.messages import HumanMessage, AIMessage
-from services import get_vector_store
+import uuid
+from typing import AsyncIterator, Iterator
+from langchain_core.messages import HumanMessage, AIMessage, AIMessageChunk
+from core import settings
+from services import get_vector_store, get_answer_cache, run_in_search_pool
 from graph import build_graph
 
+# Nodes whose LLM tokens are user-facing reply text
+STREAMED_NODES = ("faq_assistant", "product_assistant", "product_answer")
+
 class FashionChatbot:
     """Shopping assistant with clean output (no logs just chat)"""
     
-    def __init__(self, verbose: bool = False):
+    def __init__(self, verbose: bool = False, echo: bool = True):
         
         self.verbose = verbose
+        self.echo = echo  # print each reply (off when serving over HTTP)
         # Load vector stores 
         get_vector_store()
         
@@ -41,48 +48,134 @@ class FashionChatbot:
     
     def chat(self, user_message: str, thread_id: str = "default") -> str:
         """Send message and get response with memory persistence"""
-        thread = {"configurable": {"thread_id": thread_id}}
+        response = None
+        for event in self.chat_stream(user_message, thread_id):
+            if event["type"] == "done":
+                response = event["response"]
         
+        return self._show_response(response)
+    
+    async def achat(self, user_message: str, thread_id: str = "default") -> str:
+        """Async chat: awaits LLM calls so many threads can share one process"""
         response = None
-        last_ai_message = None
+        async for event in self.achat_stream(user_message, thread_id):
+            if event["type"] == "done":
+                response = event["response"]
+        
+        return self._show_response(response)
+    
+    def chat_stream(self, user_message: str, thread_id: str = "default") -> Iterator[dict]:
+        """
+        Stream one turn as events, as soon as they happen:
+        - {"type": "node", "node": name}: a graph node finished (progress)
+        - {"type": "token", "node": name, "text": str}: reply text from an assistant, token by token
+        - {"type": "done", "thread_id": str, "response": str}: the final reply
+        Paraphrases of already answered FAQ questions are answered from the
+        semantic answer cache without running the graph (first turns only).
+        """
+        config = {"configurable": {"thread_id": thread_id}}
+        first_turn = not self.graph.get_state(config).values.get("messages")
+        cached = self._cached_answer(user_message, first_turn)
+        if cached is not None:
+            self.graph.update_state(*self._cached_turn(user_message, cached, thread_id))
+            yield from self._cached_events(cached, thread_id)
+            return
         
+        turn = _StreamTurn(self, thread_id)
+        for mode, chunk in self.graph.stream(
+                *self._turn_input(user_message, thread_id),
+                stream_mode=["messages", "updates"]
+            ):
+                yield from turn.handle(mode, chunk)
+        self._remember_answer(user_message, turn, first_turn)
+        yield turn.done()
+    
+    async def achat_stream(self, user_message: str, thread_id: str = "default") -> AsyncIterator[dict]:
+        """Async chat_stream"""
+        config = {"configurable": {"thread_id": thread_id}}
+        first_turn = not (await self.graph.aget_state(config)).values.get("messages")
+        cached = await run_in_search_pool(self._cached_answer, user_message, first_turn)
+        if cached is not None:
+            await self.graph.aupdate_state(*self._cached_turn(user_message, cached, thread_id))
+            for event in self._cached_events(cached, thread_id):
+                yield event
+            return
+        
+        turn = _StreamTurn(self, thread_id)
+        async for mode, chunk in self.graph.astream(
+                *self._turn_input(user_message, thread_id),
+                stream_mode=["messages", "updates"]
+            ):
+                for event in turn.handle(mode, chunk):
+                    yield event
+        await run_in_search_pool(self._remember_answer, user_message, turn, first_turn)
+        yield turn.done()
+    
+    def _cached_answer(self, user_message: str, first_turn: bool):
+        """
+        Answer to a paraphrase of an answered FAQ question, or None.
+        Later turns may lean on the conversation ("and for sale items?"), which the
+        cache, shared by every thread, doesn't know: only first turns use it.
+        """
+        if not settings.ANSWER_CACHE or not first_turn or not user_message.strip():
+            return None
+        return get_answer_cache().lookup(user_message)
+    
+    def _remember_answer(self, user_message: str, turn: "_StreamTurn", first_turn: bool):
+        """Cache the reply of a first-turn FAQ question answered by faq_assistant"""
+        response = turn.last_ai_message.content if turn.last_ai_message else None
+        if (
+            settings.ANSWER_CACHE and first_turn and turn.intent_type == "faq"
+            and turn.answer_node == "faq_assistant" and isinstance(response, str) and response
+        ):
+            get_answer_cache().store(user_message, response)
+    
+    def _cached_turn(self, user_message: str, answer: str, thread_id: str) -> tuple:
+        """update_state arguments recording a cached turn in the conversation, as if faq_assistant answered"""
+        question = HumanMessage(content=user_message, id=str(uuid.uuid4()))
+        reply = AIMessage(content=answer, id=str(uuid.uuid4()))
+        return (
+            {"configurable": {"thread_id": thread_id}},
+            {"messages": [question, reply], "history": [question, reply]},
+            "faq_assistant",
+        )
+    
+    def _cached_events(self, answer: str, thread_id: str) -> Iterator[dict]:
+        yield {"type": "node", "node": "answer_cache"}
+        yield {"type": "token", "node": "answer_cache", "text": answer}
+        yield {"type": "done", "thread_id": thread_id, "response": answer}
+    
+    def _turn_input(self, user_message: str, thread_id: str) -> tuple:
+        """Graph input and config for one user turn"""
         if self.verbose :
             print(f"thi is the users input query \n {user_message} \n")
-
-        # Stream graph and get response
-        for event in self.graph.stream(
-                {"messages": [HumanMessage(content=user_message)]},
-                thread,
-                stream_mode="values"
-            ):
-                if "messages" in event and event["messages"]:
-                    # Get only the last AI message
-                    for msg in reversed(event["messages"]):
-                        if isinstance(msg, AIMessage):
-                            if self.verbose : 
-                                print(f"\n{msg}\n")
-                            last_ai_message = msg
-                            response = msg.content
-                            break
         
+        return (
+            {"messages": [HumanMessage(content=user_message)]},
+            {"configurable": {"thread_id": thread_id}},
+        )
+    
+    def _show_response(self, response) -> str:
+        """Print clean conversation and return the response text"""
+        if not self.echo:
+            return response
         
-        # Print clean conversation
         print(f"\n{'='*60}")
         
-        if last_ai_message and response:
+        if response:
             print(f"Assistant: {response}")
         
         print(f"{'='*60}\n")
         return response
     
-    def interactive(self):
-        """Interactive chat session"""
-        import uuid
-        thread_id = str(uuid.uuid4())[:8]  # Unique conversation ID
+    def interactive(self, thread_id: str = None):
+        """Interactive chat session (pass a previous thread_id to resume it)"""
+        thread_id = thread_id or str(uuid.uuid4())[:8]  # Unique conversation ID
         
         print("="*60)
         print("  Fashion Chatbot - Interactive Mode")
         print("="*60)
+        print(f"Session: {thread_id} (run `python main.py {thread_id}` to resume)")
         print("Type 'quit' or 'exit' to end the conversation\n")
         
         while True:
@@ -105,10 +198,64 @@ class FashionChatbot:
                 print(f"\nError: {e}\n")
 
 
+class _StreamTurn:
+    """Turns graph stream chunks of one turn into chat_stream events"""
+    
+    def __init__(self, chatbot: FashionChatbot, thread_id: str):
+        self.chatbot = chatbot
+        self.thread_id = thread_id
+        self.last_ai_message = None
+        self.answer_node = None  # node that produced last_ai_message
+        self.intent_type = None
+        self.streamed = False  # tokens of the current assistant reply already sent
+    
+    def handle(self, mode: str, chunk) -> Iterator[dict]:
+        if mode == "messages":
+            message, metadata = chunk
+            node = metadata.get("langgraph_node")
+            text = _message_text(message)
+            if node in STREAMED_NODES and isinstance(message, AIMessageChunk) and text:
+                self.streamed = True
+                yield {"type": "token", "node": node, "text": text}
+            return
+        
+        for node, update in chunk.items():
+            messages = update.get("messages", []) if isinstance(update, dict) else []
+            if isinstance(update, dict) and update.get("intent") is not None:
+                self.intent_type = update["intent"].intent_type
+            for msg in messages:
+                if not isinstance(msg, AIMessage):
+                    continue
+                if self.chatbot.verbose :
+                    print(f"\n{msg}\n")
+                self.last_ai_message = msg
+                self.answer_node = node
+                text = _message_text(msg)
+                # Replies that were not token-streamed (clarification, non-streaming models) go out whole
+                if text and not msg.tool_calls and not self.streamed:
+                    yield {"type": "token", "node": node, "text": text}
+            self.streamed = False
+            yield {"type": "node", "node": node}
+    
+    def done(self) -> dict:
+        response = self.last_ai_message.content if self.last_ai_message else None
+        return {"type": "done", "thread_id": self.thread_id, "response": response}
+
+
+def _message_text(message) -> str:
+    """Text of a message or chunk (content may be a list of parts)"""
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return "".join(
+        part.get("text", "") if isinstance(part, dict) else str(part) for part in content or []
+    )
+
+
 def main():
     """Run the chatbot"""
     chatbot = FashionChatbot(verbose=False)
-    chatbot.interactive()
+    chatbot.interactive(sys.argv[1] if len(sys.argv) > 1 else None)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,142 @@
+"""HTTP/JSON server for the Fashion Chatbot
+
+    python server.py --workers 4            # Gemini (GOOGLE_API_KEY)
+    python server.py --workers 4 --fake-llm  # no API key, for local testing
+
+    POST /chat  {"message": "...", "thread_id": "..."} -> {"thread_id", "response"}
+    POST /chat/stream  same body -> newline-delimited FashionChatbot.chat_stream events
+    GET  /health, GET /stats
+
+Chats run on request threads in this process (one graph and checkpointer, so a
+conversation's state is always consistent). Their searches are coalesced into
+micro-batches and served by --workers processes sharing the memory-mapped indices.
+"""
+import argparse
+import json
+import os
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from core import settings
+
+
+class ChatHandler(BaseHTTPRequestHandler):
+    """JSON endpoints over one shared FashionChatbot."""
+
+    chatbot = None
+    inflight: threading.BoundedSemaphore = None
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._reply(200, {"status": "ok", "pid": os.getpid()})
+        elif self.path == "/stats":
+            from services import get_answer_cache, get_batcher_stats, get_cache_stats, get_rerank_stats
+            self._reply(200, {
+                "batchers": get_batcher_stats(),
+                "caches": get_cache_stats(),
+                "answer_cache": get_answer_cache().stats(),
+                "rerank": get_rerank_stats(),
+            })
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path not in ("/chat", "/chat/stream"):
+            self._reply(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            message = body["message"]
+        except (ValueError, KeyError, TypeError):
+            self._reply(400, {"error": "expected JSON body with a 'message'"})
+            return
+
+        # Backpressure: refuse rather than queue without bound
+        if not self.inflight.acquire(blocking=False):
+            self._reply(503, {"error": "server busy, retry shortly"}, {"Retry-After": "1"})
+            return
+        try:
+            thread_id = body.get("thread_id") or str(uuid.uuid4())[:8]
+            if self.path == "/chat/stream":
+                self._stream(self.chatbot.chat_stream(message, thread_id))
+                return
+            response = self.chatbot.chat(message, thread_id)
+            self._reply(200, {"thread_id": thread_id, "response": response})
+        except Exception as e:
+            from services import SearchOverloaded
+            status = 503 if isinstance(e, SearchOverloaded) else 500
+            self._reply(status, {"error": str(e)})
+        finally:
+            self.inflight.release()
+
+    def _reply(self, status: int, payload, headers: dict = None):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, events):
+        """Write chat_stream events as newline-delimited JSON, flushed one by one"""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        try:
+            for event in events:
+                self.wfile.write(json.dumps(event, ensure_ascii=False, default=str).encode("utf-8") + b"\n")
+                self.wfile.flush()
+        except Exception as e:
+            # Headers are gone already: report the failure in-band
+            self.wfile.write(json.dumps({"type": "error", "error": str(e)}).encode("utf-8") + b"\n")
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        if ChatHandler.chatbot is not None and ChatHandler.chatbot.verbose:
+            super().log_message(format, *args)
+
+
+def serve(host: str, port: int, workers: int, verbose: bool = False):
+    """Start the search workers, then serve chats until interrupted"""
+    from services import start_search_workers
+
+    # Workers load the model and indices while the graph is built
+    start_search_workers(workers)
+
+    from main import FashionChatbot
+    ChatHandler.chatbot = FashionChatbot(verbose=verbose, echo=False)
+    ChatHandler.inflight = threading.BoundedSemaphore(settings.SERVE_MAX_INFLIGHT)
+
+    server = ThreadingHTTPServer((host, port), ChatHandler)
+    server.daemon_threads = True
+    print(f"Serving on http://{host}:{port} ({workers} search workers, LLM: {settings.LLM_PROVIDER})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the Fashion Chatbot over HTTP/JSON")
+    parser.add_argument("--host", default=settings.SERVE_HOST)
+    parser.add_argument("--port", type=int, default=settings.SERVE_PORT)
+    parser.add_argument("--workers", type=int, default=settings.SEARCH_WORKERS or os.cpu_count() or 1,
+                        help="search worker processes (0 = search in this process)")
+    parser.add_argument("--fake-llm", action="store_true", help="answer with a deterministic fake LLM (no API key)")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    if args.fake_llm:
+        # Before agents.nodes is imported, which picks the LLM
+        settings.LLM_PROVIDER = "fake"
+    serve(args.host, args.port, args.workers, args.verbose)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,52 @@
 """Services package initialization."""
 from .vector_store import VectorStore, get_vector_store
-from .tools import search_faq_tool, search_products_tool, get_tools
+from .tools import (
+    search_faq_tool,
+    search_products_tool,
+    asearch_faq_tool,
+    asearch_products_tool,
+    search_faq_batch,
+    search_products_batch,
+    get_cache_stats,
+    get_rerank_stats,
+    get_batcher_stats,
+    start_search_workers,
+    clear_caches,
+    embed_queries,
+    run_in_search_pool,
+    get_tools,
+)
+from .intent_classifier import LocalIntentClassifier, get_intent_classifier
+from .metadata_extractor import LocalMetadataExtractor, get_metadata_extractor
+from .checkpointer import SQLiteCheckpointSaver, create_checkpointer
+from .answer_cache import SemanticAnswerCache, get_answer_cache
+from .batcher import MicroBatcher, SearchOverloaded
 
 __all__ = [
     "VectorStore",
     "get_vector_store",
     "search_faq_tool",
     "search_products_tool",
+    "asearch_faq_tool",
+    "asearch_products_tool",
+    "search_faq_batch",
+    "search_products_batch",
+    "get_cache_stats",
+    "get_rerank_stats",
+    "get_batcher_stats",
+    "start_search_workers",
+    "clear_caches",
+    "embed_queries",
+    "run_in_search_pool",
     "get_tools",
+    "LocalIntentClassifier",
+    "get_intent_classifier",
+    "LocalMetadataExtractor",
+    "get_metadata_extractor",
+    "SQLiteCheckpointSaver",
+    "create_checkpointer",
+    "SemanticAnswerCache",
+    "get_answer_cache",
+    "MicroBatcher",
+    "SearchOverloaded",
 ]
@@ -0,0 +1,144 @@
+"""Semantic cache of whole FAQ answers, keyed by question embedding"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import faiss
+import numpy as np
+
+from core.config import settings
+from .tools import embed_queries
+from .vector_store import VectorStore, get_vector_store
+
+
+class SemanticAnswerCache:
+    """
+    Previously answered FAQ questions in a small inner-product FAISS index.
+
+    A message whose embedding is within `threshold` cosine of a cached question
+    gets that question's answer back, with no LLM call. Entries expire after
+    `ttl` seconds, at most `maxsize` are kept (least recently used go first),
+    and everything is dropped when the FAQ index is reloaded or faq.index changes
+    on disk (product catalog updates leave it alone). Entries carry no conversation
+    context, so callers only use it for the first turn of a conversation.
+    """
+
+    def __init__(
+        self,
+        vector_store: VectorStore,
+        maxsize: int = settings.ANSWER_CACHE_SIZE,
+        ttl: float = settings.ANSWER_CACHE_TTL_SECONDS,
+        threshold: float = settings.ANSWER_CACHE_THRESHOLD
+    ):
+        self.vector_store = vector_store
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._index: Optional[faiss.IndexIDMap2] = None
+        # id -> (question, answer, expires_at), least recently used first
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._next_id = 0
+        self._source_mtime = _mtime()
+        self._counts = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        vector_store.add_reload_listener(self.clear, stores=("faq",))
+
+    def lookup(self, message: str) -> Optional[str]:
+        """Cached answer for a paraphrase of a cached question, or None."""
+        self._check_source()
+        vector = self._vector(message)
+        with self._lock:
+            # Expired entries go first, so they cannot shadow a live paraphrase
+            self._purge_expired()
+            entry_id, score = self._nearest(vector)
+            entry = self._entries.get(entry_id) if score >= self.threshold else None
+            if entry is None:
+                self._counts["misses"] += 1
+                return None
+            self._entries.move_to_end(entry_id)
+            self._counts["hits"] += 1
+            return entry[1]
+
+    def store(self, message: str, answer: str):
+        """Cache the answer to a question (replacing a cached paraphrase of it)."""
+        if self.maxsize <= 0 or not answer:
+            return
+        self._check_source()
+        vector = self._vector(message)
+        with self._lock:
+            if self._index is None:
+                self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(len(vector)))
+            self._purge_expired()
+            entry_id, score = self._nearest(vector)
+            if entry_id in self._entries and score >= self.threshold:
+                self._remove(entry_id)
+
+            entry_id, self._next_id = self._next_id, self._next_id + 1
+            self._index.add_with_ids(vector[None, :], np.array([entry_id], dtype=np.int64))
+            self._entries[entry_id] = (message, answer, time.monotonic() + self.ttl)
+            self._counts["stores"] += 1
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+                self._counts["evictions"] += 1
+
+    def clear(self):
+        """Drop every cached answer (counters are kept)."""
+        with self._lock:
+            self._index = None
+            self._entries.clear()
+            self._source_mtime = _mtime()
+
+    def stats(self) -> Dict[str, Any]:
+        """Size and hit/miss/store/eviction counters."""
+        with self._lock:
+            stats = dict(self._counts, size=len(self._entries), maxsize=self.maxsize)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def _vector(self, text: str) -> np.ndarray:
+        """Unit-length query embedding (through the shared embedding cache)."""
+        vector = np.array(embed_queries(self.vector_store, [text])[0], dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _nearest(self, vector: np.ndarray):
+        """(id, cosine) of the closest cached question, (-1, -inf) if empty (caller holds _lock)."""
+        if self._index is None or not self._entries:
+            return -1, float("-inf")
+        scores, ids = self._index.search(vector[None, :], 1)
+        return int(ids[0][0]), float(scores[0][0])
+
+    def _purge_expired(self):
+        """Drop every expired entry from the index (caller holds _lock)."""
+        now = time.monotonic()
+        expired = [entry_id for entry_id, entry in self._entries.items() if entry[2] <= now]
+        for entry_id in expired:
+            self._entries.pop(entry_id)
+        if expired:
+            self._index.remove_ids(np.array(expired, dtype=np.int64))
+
+    def _remove(self, entry_id: int):
+        self._entries.pop(entry_id, None)
+        self._index.remove_ids(np.array([entry_id], dtype=np.int64))
+
+    def _check_source(self):
+        """Invalidate when faq.index was rewritten without a reload."""
+        if _mtime() != self._source_mtime:
+            self.clear()
+
+
+def _mtime() -> Optional[float]:
+    path = settings.FAQ_INDEX_PATH
+    return path.stat().st_mtime if path.exists() else None
+
+
+_answer_cache: Optional[SemanticAnswerCache] = None
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    """Get or create SemanticAnswerCache singleton."""
+    global _answer_cache
+    if _answer_cache is None:
+        _answer_cache = SemanticAnswerCache(get_vector_store())
+    return _answer_cache
@@ -0,0 +1,106 @@
+"""Micro-batching scheduler for concurrent search calls"""
+import queue
+import threading
+import time
+from concurrent.futures import Executor, Future
+from typing import Any, Callable, Dict, List
+
+
+class SearchOverloaded(RuntimeError):
+    """Raised when too many searches are already waiting (backpressure)."""
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent calls into one batch call on an executor.
+
+    The first waiting item opens a window of `window_ms`; everything that
+    arrives within it (up to `max_batch` items) goes to `batch_fn` as one list,
+    so embedding and FAISS run as matrix calls instead of one query at a time.
+    At most `max_pending` items may be queued or running; beyond that `submit`
+    raises SearchOverloaded instead of letting latency grow without bound.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], List[Any]],
+        executor: Executor,
+        window_ms: float,
+        max_batch: int,
+        max_pending: int,
+        name: str = "batcher"
+    ):
+        self.batch_fn = batch_fn
+        self.executor = executor
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stats = {"submitted": 0, "batches": 0, "rejected": 0, "failed": 0}
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        """Queue one item; the future resolves to its entry of the batch result."""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._stats["rejected"] += 1
+                raise SearchOverloaded(f"{self._pending} searches pending, try again later")
+            self._pending += 1
+            self._stats["submitted"] += 1
+        future: Future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._dispatch(batch)
+
+    def _dispatch(self, batch: List[tuple]):
+        with self._lock:
+            self._stats["batches"] += 1
+        try:
+            job = self.executor.submit(self.batch_fn, [item for item, _ in batch])
+        except Exception as e:
+            self._resolve(batch, error=e)
+            return
+        job.add_done_callback(lambda job: self._finish(batch, job))
+
+    def _finish(self, batch: List[tuple], job: Future):
+        try:
+            results = job.result()
+        except Exception as e:
+            self._resolve(batch, error=e)
+        else:
+            self._resolve(batch, results=results)
+
+    def _resolve(self, batch: List[tuple], results: List[Any] = None, error: Exception = None):
+        with self._lock:
+            self._pending -= len(batch)
+            if error is not None:
+                self._stats["failed"] += 1
+        for position, (_, future) in enumerate(batch):
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(results[position])
+
+    def stats(self) -> Dict[str, Any]:
+        """Items submitted/rejected, batches run, mean batch size and current depth."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = self._pending
+        stats["mean_batch_size"] = stats["submitted"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
@@ -0,0 +1,392 @@
+"""Incremental product catalog updates: delta segment, append-only log and merge"""
+import base64
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import faiss
+import joblib
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # Not POSIX: locks only cover the threads of this process
+    fcntl = None
+
+from core.config import settings
+from .lexical_index import CorpusStats, corpus_stats
+from .metadata_store import ColumnarMetadata
+
+
+# One catalog change: ("upsert", record, vector) or ("delete", product_id, None)
+Op = Tuple[str, Any, Optional[np.ndarray]]
+
+
+class DeltaSegment:
+    """
+    Immutable set of catalog changes on top of the base product index.
+    
+    - Changed/new products live in a small IndexIDMap2 whose ids continue after
+      the base rows (delta row i == FAISS id `id_offset + i`).
+    - Base rows that were deleted or replaced are tombstoned.
+    Updates never modify a segment: `apply` returns a new one, so searches
+    holding the old segment are never blocked or torn.
+    """
+    
+    def __init__(
+        self,
+        base_metadata: ColumnarMetadata,
+        dim: int,
+        base_rows: Optional[Dict[Any, int]] = None,
+        records: Optional[List[Dict[str, Any]]] = None,
+        vectors: Optional[np.ndarray] = None,
+        live: Optional[Dict[Any, int]] = None,
+        tombstones: Optional[np.ndarray] = None
+    ):
+        self.id_offset = base_metadata.size
+        self.base_metadata = base_metadata
+        self.dim = dim
+        self.base_rows = base_rows if base_rows is not None else _rows_by_product_id(base_metadata)
+        self.records = records or []
+        self.vectors = vectors if vectors is not None else np.empty((0, dim), dtype=np.float32)
+        self.live = live or {}  # product_id -> delta row, for products currently in the delta
+        self.tombstones = tombstones if tombstones is not None else np.empty(0, dtype=np.int64)
+    
+        self.live_rows = np.array(sorted(self.live.values()), dtype=np.int64)
+        # Superseded/deleted delta rows, as FAISS ids (the lexical index still has them)
+        self.dead_ids = np.setdiff1d(
+            np.arange(len(self.records), dtype=np.int64), self.live_rows, assume_unique=True
+        ) + self.id_offset
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+        if self.live_rows.size:
+            self.index.add_with_ids(self.vectors[self.live_rows], self.live_rows + self.id_offset)
+        self.metadata = ColumnarMetadata(self.records, settings.FILTER_FIELDS, base_metadata.data_type)
+        self._lexical_stats: Optional[CorpusStats] = None
+    
+    @property
+    def lexical_stats(self) -> CorpusStats:
+        """BM25 statistics of the current catalog (base minus tombstones, plus live delta rows)"""
+        if self._lexical_stats is None:
+            base_rows = np.setdiff1d(
+                np.arange(self.base_metadata.size, dtype=np.int64), self.tombstones, assume_unique=True
+            )
+            self._lexical_stats = corpus_stats([
+                (self.base_metadata.lexical_index, base_rows),
+                (self.metadata.lexical_index, self.live_rows),
+            ])
+        return self._lexical_stats
+    
+    @property
+    def changed(self) -> bool:
+        """Whether there is anything to merge into the base"""
+        return bool(self.live) or bool(self.tombstones.size)
+    
+    def contains(self, product_id: Any) -> bool:
+        """Whether the product is in the catalog (base or delta)"""
+        if product_id in self.live:
+            return True
+        row = self.base_rows.get(product_id)
+        return row is not None and not _in_sorted(self.tombstones, row)
+    
+    def record(self, product_id: Any) -> Optional[Dict[str, Any]]:
+        """Current record of a product, or None if it is not in the catalog"""
+        if product_id in self.live:
+            return self.records[self.live[product_id]]
+        if self.contains(product_id):
+            return self.base_metadata.row_dict(self.base_rows[product_id])
+        return None
+    
+    def delta_vector(self, product_id: Any) -> Optional[np.ndarray]:
+        """Embedding of a product living in the delta"""
+        row = self.live.get(product_id)
+        return None if row is None else self.vectors[row]
+    
+    def apply(self, ops: Iterable[Op]) -> "DeltaSegment":
+        """New segment with `ops` applied in order"""
+        records = list(self.records)
+        new_vectors: List[np.ndarray] = []
+        live = dict(self.live)
+        tombstones = set(self.tombstones.tolist())
+    
+        for op, payload, vector in ops:
+            product_id = payload["product_id"] if op == "upsert" else payload
+            # Either way the current version of the product goes away
+            live.pop(product_id, None)
+            base_row = self.base_rows.get(product_id)
+            if base_row is not None:
+                tombstones.add(base_row)
+    
+            if op == "upsert":
+                live[product_id] = len(records)
+                records.append(payload)
+                new_vectors.append(np.asarray(vector, dtype=np.float32).reshape(1, self.dim))
+    
+        vectors = np.vstack([self.vectors] + new_vectors) if new_vectors else self.vectors
+        return DeltaSegment(
+            self.base_metadata, self.dim, self.base_rows, records, vectors, live,
+            np.array(sorted(tombstones), dtype=np.int64),
+        )
+
+
+class ProductSegments(NamedTuple):
+    """Base product index + metadata and the delta on top, swapped as one unit"""
+    index: faiss.Index
+    metadata: ColumnarMetadata
+    delta: DeltaSegment
+
+
+class DeltaLog:
+    """
+    Append-only JSONL log of catalog changes since the last merge.
+    Ops are keyed by product_id and idempotent, so replaying a log onto a base
+    that already contains some of them gives the same catalog.
+    """
+    
+    def __init__(self, path: Path):
+        self.path = Path(path)
+    
+    def size(self) -> int:
+        return self.path.stat().st_size if self.path.exists() else 0
+    
+    def append(self, ops: List[Op]):
+        """Durably append ops (one fsync per batch)"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            for op in ops:
+                f.write(_encode_op(op) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def identity(self) -> Optional[Tuple[int, int]]:
+        """(inode, size) of the log, None if there is none; a rewrite changes the inode"""
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size
+    
+    def read(self, offset: int = 0) -> List[Op]:
+        """Ops written after byte `offset`"""
+        return self.read_from(offset)[0]
+    
+    def read_from(self, offset: int = 0) -> Tuple[List[Op], int]:
+        """Ops written after byte `offset`, and the offset just past the last complete one"""
+        if not self.path.exists():
+            return [], offset
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        # A torn last line (crash mid-append, or an append still in progress) is left for later
+        ops = []
+        for line in data.split(b"\n")[:-1]:
+            try:
+                ops.append(_decode_op(line.decode("utf-8")))
+            except ValueError:
+                break
+            offset += len(line) + 1
+        return ops, offset
+    
+    def rewrite(self, ops: List[Op]):
+        """Atomically replace the log with `ops`"""
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for op in ops:
+                f.write(_encode_op(op) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+
+class FileLock:
+    """
+    Reentrant exclusive lock shared by the threads of this process and, through
+    flock on `path`, by every process using the same indices directory.
+    """
+    
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+    
+    def acquire(self, blocking: bool = True) -> bool:
+        if not self._lock.acquire(blocking):
+            return False
+        if self._depth == 0 and fcntl is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            f = open(self.path, "a")
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                f.close()
+                self._lock.release()
+                return False
+            self._file = f
+        self._depth += 1
+        return True
+    
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0 and self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self._lock.release()
+    
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class BaseFiles(NamedTuple):
+    """Index + metadata files of one base version (0 = the files as built/shipped)"""
+    index: Path
+    metadata: Path
+    version: int
+
+
+def manifest_path(index_path: Path) -> Path:
+    """<name>.manifest.json next to <name>.index, naming the current base version"""
+    return index_path.with_name(f"{index_path.stem}.manifest.json")
+
+
+def base_files(index_path: Path, metadata_path: Path) -> BaseFiles:
+    """The current base: the version named by the manifest, else the plain files"""
+    try:
+        with open(manifest_path(index_path), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return BaseFiles(Path(index_path), Path(metadata_path), 0)
+    return BaseFiles(
+        index_path.with_name(manifest["index"]), index_path.with_name(manifest["metadata"]), manifest["version"]
+    )
+
+
+def write_base_version(
+    index_path: Path,
+    metadata_path: Path,
+    index: faiss.Index,
+    records: List[Dict[str, Any]],
+    data_type: Optional[str]
+) -> BaseFiles:
+    """
+    Write a new base version under its own file names, not yet visible to readers
+    (switch_base makes it current). Callers serialize writers (merge lock).
+    """
+    version = base_files(index_path, metadata_path).version + 1
+    files = BaseFiles(
+        index_path.with_name(f"{index_path.stem}.v{version}{index_path.suffix}"),
+        metadata_path.with_name(f"{metadata_path.stem}.v{version}{metadata_path.suffix}"),
+        version,
+    )
+    faiss.write_index(index, str(files.index))
+    joblib.dump({
+        "metadata_list": records,
+        "id_to_metadata": dict(enumerate(records)),
+        "data_type": data_type,
+    }, str(files.metadata))
+    for path in (files.index, files.metadata):
+        _fsync(path)
+    return files
+
+
+def switch_base(index_path: Path, files: BaseFiles):
+    """
+    Make `files` the current base with one rename of the manifest, so readers
+    see either the old index and metadata or the new ones, never a mix.
+    The version before the replaced one is removed (the replaced one may still
+    be opened by a process that read the old manifest).
+    """
+    manifest = manifest_path(index_path)
+    tmp = manifest.with_name(f"{manifest.name}.tmp{os.getpid()}")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": files.version, "index": files.index.name, "metadata": files.metadata.name}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, manifest)
+    
+    stale_version = files.version - 2
+    if stale_version < 1:
+        return
+    for path in (files.index, files.metadata):
+        stale = path.with_name(path.name.replace(f".v{files.version}.", f".v{stale_version}."))
+        shutil.rmtree(stale.with_suffix(".columns"), ignore_errors=True)
+        try:
+            os.remove(stale)
+        except OSError:
+            pass
+
+
+def _fsync(path: Path):
+    with open(path, "rb") as f:
+        os.fsync(f.fileno())
+
+
+def merge_segments(segments: ProductSegments) -> Tuple[faiss.Index, List[Dict[str, Any]]]:
+    """
+    Fold the delta into a new base index + records (same index type and training).
+    Heavy: meant for the background merge, off the search path.
+    """
+    base_index, base_metadata, delta = segments
+    keep = np.setdiff1d(
+        np.arange(base_metadata.size, dtype=np.int64), delta.tombstones, assume_unique=True
+    )
+    live_rows = sorted(delta.live.values())
+    
+    if isinstance(faiss.downcast_index(base_index), faiss.IndexFlat):
+        # Read straight from the (possibly memory-mapped) base
+        merged = faiss.IndexFlat(base_index.d, base_index.metric_type)
+        source = base_index
+    else:
+        # Owned copy keeps training/parameters (a clone of an mmapped index can't be reset)
+        merged = source = faiss.deserialize_index(faiss.serialize_index(base_index))
+        ivf = faiss.try_extract_index_ivf(merged)
+        if ivf is not None:
+            # IVF can only reconstruct vectors through a direct map
+            ivf.make_direct_map()
+    base_vectors = (
+        source.reconstruct_batch(keep) if keep.size else np.empty((0, delta.dim), dtype=np.float32)
+    )
+    merged.reset()
+    merged.add(np.vstack([base_vectors, delta.vectors[live_rows]]).astype(np.float32))
+    
+    records = [base_metadata.row_dict(int(row)) for row in keep]
+    records += [delta.records[row] for row in live_rows]
+    return merged, records
+
+
+def _rows_by_product_id(metadata: ColumnarMetadata) -> Dict[Any, int]:
+    if "product_id" in metadata.numeric:
+        return {pid: row for row, pid in enumerate(metadata.numeric["product_id"].tolist())}
+    return {metadata.value(row, "product_id"): row for row in range(metadata.size)}
+
+
+def _in_sorted(array: np.ndarray, value: int) -> bool:
+    position = np.searchsorted(array, value)
+    return position < array.size and array[position] == value
+
+
+def _encode_op(op: Op) -> str:
+    kind, payload, vector = op
+    entry = {"op": kind}
+    if kind == "upsert":
+        entry["record"] = payload
+        entry["vector"] = base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii")
+    else:
+        entry["product_id"] = payload
+    return json.dumps(entry, ensure_ascii=False)
+
+
+def _decode_op(line: str) -> Op:
+    entry = json.loads(line)
+    if entry["op"] == "upsert":
+        vector = np.frombuffer(base64.b64decode(entry["vector"]), dtype=np.float32)
+        return ("upsert", entry["record"], vector)
+    return ("delete", entry["product_id"], None)
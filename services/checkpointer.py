@@ -0,0 +1,514 @@
+"""Persistent, bounded checkpointers for the LangGraph conversation state"""
+import asyncio
+import atexit
+import functools
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from core.config import settings
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata_type TEXT,
+    metadata BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    type TEXT NOT NULL,
+    blob BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS threads_by_last_access ON threads (last_access);
+"""
+
+
+class SQLiteCheckpointSaver(BaseCheckpointSaver):
+    """
+    LangGraph checkpointer backed by a single SQLite file.
+    
+    - Writes are buffered and flushed in one transaction every `flush_every`
+      operations / `flush_interval` seconds, before any read, and at exit.
+    - Each thread keeps only its last `keep_last` checkpoints (older ones, their
+      writes and unreferenced channel blobs are compacted away on flush).
+    - Threads idle for longer than `ttl` seconds are evicted, and at most
+      `max_threads` threads are kept (least recently used go first).
+    - The async methods run the SQLite work on a single background thread, so
+      the event loop never blocks on the database or on the lock.
+    """
+    
+    def __init__(
+        self,
+        path: Path,
+        *,
+        ttl: Optional[float] = None,
+        max_threads: Optional[int] = None,
+        keep_last: int = 5,
+        flush_every: int = 64,
+        flush_interval: float = 1.0,
+        serde=None
+    ):
+        super().__init__(serde=serde)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = str(path)
+        self.ttl = ttl
+        self.max_threads = max_threads
+        self.keep_last = keep_last
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+    
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+    
+        # Buffered (sql, params) operations and the threads they touch
+        self._pending: List[Tuple[str, tuple]] = []
+        self._pending_threads: Dict[str, float] = {}
+        self._pending_since: Optional[float] = None
+        self._flushes = 0
+    
+        # Database access is serialized by _lock anyway: one worker is enough
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpointer")
+    
+        atexit.register(self.flush)
+    
+    # ---- writes ---------------------------------------------------------
+    
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions
+    ) -> RunnableConfig:
+        """Buffer a checkpoint (channel values are stored once per new version)."""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        c = checkpoint.copy()
+        values: Dict[str, Any] = c.pop("channel_values")
+    
+        ops = []
+        for channel, version in new_versions.items():
+            type_, blob = (
+                self.serde.dumps_typed(values[channel]) if channel in values else ("empty", b"")
+            )
+            ops.append((
+                "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, channel, str(version), type_, blob),
+            ))
+    
+        type_, blob = self.serde.dumps_typed(c)
+        meta_type, meta_blob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        ops.append((
+            "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                thread_id, checkpoint_ns, checkpoint["id"],
+                config["configurable"].get("checkpoint_id"),
+                type_, blob, meta_type, meta_blob,
+            ),
+        ))
+        self._buffer(thread_id, ops)
+    
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+    
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = ""
+    ) -> None:
+        """Buffer intermediate writes linked to a checkpoint."""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+    
+        ops = []
+        for idx, (channel, value) in enumerate(writes):
+            idx = WRITES_IDX_MAP.get(channel, idx)
+            type_, blob = self.serde.dumps_typed(value)
+            # Regular writes are idempotent per (task, idx); special ones overwrite
+            verb = "INSERT OR IGNORE" if idx >= 0 else "INSERT OR REPLACE"
+            ops.append((
+                f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type_, blob, task_path),
+            ))
+        self._buffer(thread_id, ops)
+    
+    def delete_thread(self, thread_id: str) -> None:
+        """Delete all checkpoints, writes and blobs of a thread."""
+        with self._lock:
+            self.flush()
+            self._delete_threads([thread_id])
+    
+    def _buffer(self, thread_id: str, ops: List[Tuple[str, tuple]]):
+        with self._lock:
+            self._pending.extend(ops)
+            self._pending_threads[thread_id] = time.time()
+            if self._pending_since is None:
+                self._pending_since = time.monotonic()
+    
+            if (
+                len(self._pending) >= self.flush_every
+                or time.monotonic() - self._pending_since >= self.flush_interval
+            ):
+                self.flush()
+    
+    def flush(self):
+        """Write buffered operations in one transaction, then compact and evict."""
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, []
+            touched, self._pending_threads = self._pending_threads, {}
+            self._pending_since = None
+    
+            with self._transaction():
+                for sql, params in pending:
+                    self._conn.execute(sql, params)
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO threads VALUES (?, ?)", list(touched.items())
+                )
+                for thread_id in touched:
+                    self._compact(thread_id)
+    
+            self._flushes += 1
+            if self._flushes % 16 == 1:
+                self.evict()
+    
+    # ---- reads ----------------------------------------------------------
+    
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Get a specific checkpoint, or the latest one of the thread."""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+    
+        with self._lock:
+            self.flush()
+            if checkpoint_id:
+                row = self._conn.execute(
+                    "SELECT * FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    "SELECT * FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            return self._to_tuple(row) if row else None
+    
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None
+    ) -> Iterator[CheckpointTuple]:
+        """List checkpoints, newest first."""
+        where, params = [], []
+        if config:
+            where.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if config["configurable"].get("checkpoint_ns") is not None:
+                where.append("checkpoint_ns = ?")
+                params.append(config["configurable"]["checkpoint_ns"])
+            if checkpoint_id := get_checkpoint_id(config):
+                where.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            where.append("checkpoint_id < ?")
+            params.append(before_id)
+    
+        sql = "SELECT * FROM checkpoints"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY checkpoint_id DESC"
+    
+        with self._lock:
+            self.flush()
+            rows = self._conn.execute(sql, params).fetchall()
+            results = []
+            for row in rows:
+                if limit is not None and len(results) >= limit:
+                    break
+                checkpoint_tuple = self._to_tuple(row)
+                if filter and not all(
+                    checkpoint_tuple.metadata.get(key) == value for key, value in filter.items()
+                ):
+                    continue
+                results.append(checkpoint_tuple)
+        yield from results
+    
+    def _to_tuple(self, row: tuple) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id, parent_id, type_, blob, meta_type, meta_blob = row
+        checkpoint = self.serde.loads_typed((type_, blob))
+    
+        channel_values = {}
+        for channel, version in checkpoint["channel_versions"].items():
+            blob_row = self._conn.execute(
+                "SELECT type, blob FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? "
+                "AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, str(version)),
+            ).fetchone()
+            if blob_row and blob_row[0] != "empty":
+                channel_values[channel] = self.serde.loads_typed(blob_row)
+    
+        writes = self._conn.execute(
+            "SELECT task_id, channel, type, value FROM writes WHERE thread_id = ? "
+            "AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_path, task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+    
+        return CheckpointTuple(
+            config={"configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint_id,
+            }},
+            checkpoint={**checkpoint, "channel_values": channel_values},
+            metadata=self.serde.loads_typed((meta_type, meta_blob)),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((w_type, value)))
+                for task_id, channel, w_type, value in writes
+            ],
+            parent_config={"configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": parent_id,
+            }} if parent_id else None,
+        )
+    
+    # ---- bounds ---------------------------------------------------------
+    
+    def _compact(self, thread_id: str):
+        """Keep the last `keep_last` checkpoints per namespace of a thread."""
+        namespaces = self._conn.execute(
+            "SELECT checkpoint_ns, COUNT(*) FROM checkpoints WHERE thread_id = ? GROUP BY checkpoint_ns",
+            (thread_id,),
+        ).fetchall()
+        for checkpoint_ns, count in namespaces:
+            if count <= self.keep_last:
+                continue
+            keep = self._conn.execute(
+                "SELECT checkpoint_id, type, checkpoint FROM checkpoints WHERE thread_id = ? "
+                "AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT ?",
+                (thread_id, checkpoint_ns, self.keep_last),
+            ).fetchall()
+            oldest_kept = keep[-1][0]
+    
+            self._conn.execute(
+                "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+                (thread_id, checkpoint_ns, oldest_kept),
+            )
+            self._conn.execute(
+                "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+                (thread_id, checkpoint_ns, oldest_kept),
+            )
+    
+            # Drop channel blobs no retained checkpoint points at
+            referenced = set()
+            for _, type_, blob in keep:
+                versions = self.serde.loads_typed((type_, blob))["channel_versions"]
+                referenced.update((channel, str(version)) for channel, version in versions.items())
+            stored = self._conn.execute(
+                "SELECT channel, version FROM blobs WHERE thread_id = ? AND checkpoint_ns = ?",
+                (thread_id, checkpoint_ns),
+            ).fetchall()
+            self._conn.executemany(
+                "DELETE FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                [(thread_id, checkpoint_ns, channel, version)
+                 for channel, version in stored if (channel, version) not in referenced],
+            )
+    
+    def evict(self) -> int:
+        """Evict expired threads (TTL) and least recently used ones beyond max_threads."""
+        with self._lock:
+            expired: List[str] = []
+            if self.ttl:
+                expired += [row[0] for row in self._conn.execute(
+                    "SELECT thread_id FROM threads WHERE last_access < ?", (time.time() - self.ttl,)
+                )]
+            if self.max_threads:
+                expired += [row[0] for row in self._conn.execute(
+                    "SELECT thread_id FROM threads ORDER BY last_access DESC LIMIT -1 OFFSET ?",
+                    (self.max_threads,),
+                )]
+            expired = [t for t in dict.fromkeys(expired) if t not in self._pending_threads]
+            if expired:
+                self._delete_threads(expired)
+            return len(expired)
+    
+    def _delete_threads(self, thread_ids: List[str]):
+        params = [(thread_id,) for thread_id in thread_ids]
+        with self._transaction():
+            for table in ("checkpoints", "blobs", "writes", "threads"):
+                self._conn.executemany(f"DELETE FROM {table} WHERE thread_id = ?", params)
+    
+    def _transaction(self):
+        return _Transaction(self._conn)
+    
+    def close(self):
+        """Flush and close the database."""
+        with self._lock:
+            self.flush()
+            self._conn.close()
+        self._executor.shutdown(wait=False)
+    
+    # ---- versions / async -----------------------------------------------
+    
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        """Monotonic, string-sortable channel versions (same scheme as MemorySaver)."""
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+    
+    async def _run(self, func, *args, **kwargs):
+        """Run a blocking method on the checkpointer thread, off the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+    
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await self._run(self.get_tuple, config)
+    
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await self._run(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+    
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions
+    ) -> RunnableConfig:
+        return await self._run(self.put, config, checkpoint, metadata, new_versions)
+    
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = ""
+    ) -> None:
+        return await self._run(self.put_writes, config, writes, task_id, task_path)
+    
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await self._run(self.delete_thread, thread_id)
+
+
+class _Transaction:
+    """BEGIN/COMMIT (or ROLLBACK on error) around a block on an autocommit connection."""
+    
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+    
+    def __enter__(self):
+        self.conn.execute("BEGIN")
+        return self.conn
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+# Pydantic models stored in State (see core.schemas)
+STATE_MODELS = [
+    ("core.schemas", "IntentClassification"),
+    ("core.schemas", "ProductMetadata"),
+]
+
+
+def _serializer() -> Optional[JsonPlusSerializer]:
+    """Serializer that may load our State models back (None = langgraph default)."""
+    try:
+        return JsonPlusSerializer(allowed_msgpack_modules=STATE_MODELS)
+    except TypeError:
+        # Older langgraph: no allow-list, every type loads
+        return None
+
+
+def create_checkpointer() -> BaseCheckpointSaver:
+    """Checkpointer selected by settings.CHECKPOINTER ("sqlite" or "memory")."""
+    if settings.CHECKPOINTER == "memory":
+        return MemorySaver(serde=_serializer())
+    if settings.CHECKPOINTER == "sqlite":
+        return SQLiteCheckpointSaver(
+            settings.CHECKPOINT_DB_PATH,
+            ttl=settings.CHECKPOINT_TTL_SECONDS,
+            max_threads=settings.CHECKPOINT_MAX_THREADS,
+            keep_last=settings.CHECKPOINT_KEEP_LAST,
+            flush_every=settings.CHECKPOINT_FLUSH_EVERY,
+            flush_interval=settings.CHECKPOINT_FLUSH_INTERVAL,
+            serde=_serializer(),
+        )
+    raise ValueError(f"Unknown CHECKPOINTER: {settings.CHECKPOINTER!r}")
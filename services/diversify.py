@@ -0,0 +1,71 @@
+"""Result de-duplication and maximal-marginal-relevance diversification"""
+from typing import List, Optional
+import numpy as np
+
+from .lexical_index import tokenize
+from .metadata_store import SearchResult
+
+
+def name_root(hit: SearchResult, field: str = "productDisplayName") -> str:
+    """
+    De-dup key of a hit: its display name without its own colour words,
+    so "Puma Men Black Polo" and "Puma Men Navy Blue Polo" share a root.
+    """
+    colour = set(tokenize(str(hit.get("baseColour", ""))))
+    return " ".join(token for token in tokenize(str(hit.get(field, ""))) if token not in colour)
+
+
+def dedup_positions(results: List[SearchResult], field: str = "productDisplayName") -> np.ndarray:
+    """Positions of the first (best ranked) hit per name root, in rank order."""
+    seen = set()
+    keep = []
+    for position, hit in enumerate(results):
+        key = name_root(hit, field)
+        if key and key in seen:
+            continue
+        seen.add(key)
+        keep.append(position)
+    return np.array(keep, dtype=np.int64)
+
+
+def mmr(
+    vectors: np.ndarray,
+    k: int,
+    lambda_mult: float,
+    query_vec: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Greedy maximal marginal relevance over rank-ordered candidate vectors.
+    score(d) = lambda_mult * relevance(d) - (1 - lambda_mult) * max cosine(d, selected)
+    (lambda_mult 1 = plain relevance order, 0 = maximum diversity)
+    relevance is the cosine to `query_vec`, or falls linearly with rank without one
+    (lexical/hybrid hits). Candidate-candidate similarities are one matrix product,
+    and each step updates the running max in one vector op.
+    Returns the chosen positions, in pick order.
+    """
+    n = len(vectors)
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    unit = vectors / np.maximum(norms, 1e-12)
+    if query_vec is not None:
+        query = np.asarray(query_vec, dtype=np.float32)
+        relevance = unit @ (query / max(float(np.linalg.norm(query)), 1e-12))
+    else:
+        relevance = 1.0 - np.arange(n, dtype=np.float32) / n
+    similarity = unit @ unit.T
+
+    chosen = [int(np.argmax(relevance))]
+    max_similarity = similarity[chosen[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[chosen[0]] = False
+    for _ in range(k - 1):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        pick = int(np.argmax(scores))
+        chosen.append(pick)
+        available[pick] = False
+        np.maximum(max_similarity, similarity[pick], out=max_similarity)
+    return np.array(chosen, dtype=np.int64)
@@ -0,0 +1,233 @@
+"""
+Query/document encoder backends for the embedding model.
+
+    python -m services.encoders --check [--backends onnx-int8]
+    python -m services.encoders --compare
+
+All backends load the same settings.EMBEDDING_MODEL weights, so their vectors
+should stay compatible with indices built by the PyTorch encoder. --check
+compares a backend against it once (see compatibility) and records the verdict
+in settings.EMBEDDING_CHECK_PATH; at serve time only the selected backend is
+loaded, and one without a passing verdict falls back to torch. --compare
+reports latency, RSS and recall@k of every backend against the full-precision
+PyTorch encoder.
+"""
+import argparse
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import faiss
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+from core.config import settings
+from .metadata_store import ColumnarMetadata
+
+
+# torch: full-precision PyTorch (reference)
+# torch-int8: PyTorch with dynamically int8-quantized Linear layers
+# onnx / onnx-int8: ONNX Runtime, fp32 or the int8-quantized export
+EMBEDDING_BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+
+
+def load_encoder(
+    model_name: str = settings.EMBEDDING_MODEL,
+    backend: str = settings.EMBEDDING_BACKEND
+) -> SentenceTransformer:
+    """
+    Load the embedding model on the given backend.
+    The accelerated backends also truncate inputs at settings.EMBEDDING_MAX_SEQ_LENGTH
+    tokens (queries are short): less padding per batch and a cheaper tokenizer pass.
+    "torch" keeps the model's own limit, so its embeddings are unchanged.
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {EMBEDDING_BACKENDS}")
+
+    if backend == "torch":
+        model = SentenceTransformer(model_name, device="cpu")
+    elif backend == "torch-int8":
+        import torch
+        model = SentenceTransformer(model_name, device="cpu")
+        torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    elif backend == "onnx":
+        # Needs sentence-transformers>=3.2 with optimum[onnxruntime]
+        model = SentenceTransformer(model_name, device="cpu", backend="onnx")
+    else:
+        model = SentenceTransformer(
+            model_name, device="cpu", backend="onnx",
+            model_kwargs={"file_name": settings.EMBEDDING_ONNX_INT8_FILE}
+        )
+
+    if backend != "torch" and (
+        model.max_seq_length is None or model.max_seq_length > settings.EMBEDDING_MAX_SEQ_LENGTH
+    ):
+        model.max_seq_length = settings.EMBEDDING_MAX_SEQ_LENGTH
+    return model
+
+
+def compatibility(
+    model: SentenceTransformer,
+    reference: SentenceTransformer,
+    texts: List[str]
+) -> Optional[float]:
+    """
+    Mean cosine between `model` and `reference` (the torch encoder) embeddings of
+    the same texts. Independent of how the stored index text was put together:
+    a faithful export scores ~1.0 whatever was indexed. None without texts.
+    """
+    if not texts:
+        return None
+    encoded = np.asarray(model.encode(texts), dtype=np.float32)
+    expected = np.asarray(reference.encode(texts), dtype=np.float32)
+    faiss.normalize_L2(encoded)
+    faiss.normalize_L2(expected)
+    return float(np.mean(np.sum(encoded * expected, axis=1)))
+
+
+def check_key(model_name: str, backend: str) -> str:
+    """What a recorded verdict applies to: the model, the backend and its ONNX file"""
+    onnx_file = settings.EMBEDDING_ONNX_INT8_FILE if backend == "onnx-int8" else ""
+    return f"{model_name}|{backend}|{onnx_file}"
+
+
+def recorded_compatibility(model_name: str, backend: str) -> Optional[float]:
+    """Mean cosine recorded by check_backend for this model/backend, or None if never checked"""
+    try:
+        with open(settings.EMBEDDING_CHECK_PATH, encoding="utf-8") as f:
+            checks = json.load(f)
+    except FileNotFoundError:
+        return None
+    return checks.get(check_key(model_name, backend))
+
+
+def check_backend(
+    backend: str,
+    texts: List[str],
+    model_name: str = settings.EMBEDDING_MODEL
+) -> Optional[float]:
+    """
+    Compare `backend` against the torch encoder on `texts` and record the mean
+    cosine in settings.EMBEDDING_CHECK_PATH (None without texts, not recorded).
+    """
+    cosine = compatibility(load_encoder(model_name, backend), load_encoder(model_name, "torch"), texts)
+    if cosine is None:
+        return None
+
+    path = settings.EMBEDDING_CHECK_PATH
+    try:
+        with open(path, encoding="utf-8") as f:
+            checks: Dict[str, Any] = json.load(f)
+    except FileNotFoundError:
+        checks = {}
+    checks[check_key(model_name, backend)] = cosine
+    tmp = path.with_name(f"{path.name}.tmp{os.getpid()}")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(checks, f, indent=2)
+    os.replace(tmp, path)
+    return cosine
+
+
+def sample_texts(metadata: ColumnarMetadata, n: int = settings.EMBEDDING_CHECK_SAMPLE) -> List[str]:
+    """Product texts spread over the catalog, to compare encoders on"""
+    from .index_builder import PRODUCT_TEXT_FIELDS, record_text
+
+    rows = np.linspace(0, metadata.size - 1, min(n, metadata.size)).astype(np.int64)
+    return [record_text(metadata.row_dict(int(row)), PRODUCT_TEXT_FIELDS) for row in rows]
+
+
+def compare_backends(
+    index: faiss.Index,
+    queries: List[str],
+    k: int,
+    backends=EMBEDDING_BACKENDS
+) -> Dict[str, Dict[str, float]]:
+    """
+    Latency (p50/p95 per single query), RSS growth on load and recall@k of each
+    backend. recall@k is the overlap of its top-k product ids with the top-k
+    of the torch encoder for the same queries.
+    """
+    from .vector_store import rss_mb
+
+    report: Dict[str, Dict[str, float]] = {}
+    reference_ids = None
+    for backend in ("torch",) + tuple(b for b in backends if b != "torch"):
+        rss_before = rss_mb()
+        try:
+            model = load_encoder(settings.EMBEDDING_MODEL, backend)
+        except (ImportError, OSError, ValueError) as e:
+            print(f"  {backend}: unavailable ({e})")
+            continue
+        rss_after = rss_mb()
+
+        model.encode(queries[:1])  # warm-up
+        times = []
+        vectors = []
+        for query in queries:
+            started = time.perf_counter()
+            vectors.append(model.encode([query])[0])
+            times.append((time.perf_counter() - started) * 1000)
+
+        _, ids = index.search(np.asarray(vectors, dtype=np.float32), k)
+        if reference_ids is None:
+            reference_ids = ids
+        overlap = sum(
+            len(set(row[row >= 0]) & set(ref[ref >= 0])) for row, ref in zip(ids, reference_ids)
+        )
+        report[backend] = {
+            "p50_ms": float(np.percentile(times, 50)),
+            "p95_ms": float(np.percentile(times, 95)),
+            "rss_mb": rss_after - rss_before,
+            "recall": overlap / max(1, int((reference_ids >= 0).sum())),
+        }
+        del model
+    return report
+
+
+def main(argv: Optional[List[str]] = None):
+    from .index_builder import PRODUCT_TEXT_FIELDS, record_text, sample_queries
+    from .vector_store import get_vector_store
+
+    parser = argparse.ArgumentParser(description="Check or compare embedding backends on the product index")
+    parser.add_argument("--check", action="store_true", help="check backends against torch and record the verdicts")
+    parser.add_argument("--compare", action="store_true", help="run the comparison")
+    parser.add_argument("--backends", nargs="+", choices=EMBEDDING_BACKENDS, default=None,
+                        help="backends to check/compare (default: EMBEDDING_BACKEND for --check, all for --compare)")
+    parser.add_argument("--k", type=int, default=settings.DEFAULT_SEARCH_K, help="k for recall@k")
+    parser.add_argument("--queries", type=int, default=200, help="queries sampled from the catalog")
+    args = parser.parse_args(argv)
+    if not (args.check or args.compare):
+        parser.error("nothing to do: pass --check or --compare")
+
+    store = get_vector_store()
+    metadata = store.product_metadata
+
+    if args.check:
+        texts = sample_texts(metadata)
+        for backend in args.backends or [settings.EMBEDDING_BACKEND]:
+            if backend == "torch":
+                continue
+            cosine = check_backend(backend, texts)
+            if cosine is None:
+                print(f"{backend}: no catalog texts to check on")
+                continue
+            verdict = "ok" if cosine >= settings.EMBEDDING_MIN_COSINE else "falls back to torch"
+            print(f"{backend}: mean cosine to torch {cosine:.4f} ({verdict})")
+        if not args.compare:
+            return
+
+    texts = [record_text(metadata.row_dict(row), PRODUCT_TEXT_FIELDS) for row in range(metadata.size)]
+    queries = sample_queries(texts, args.queries)
+
+    report = compare_backends(store.product_index, queries, args.k, tuple(args.backends or EMBEDDING_BACKENDS))
+    print(f"\n{'backend':<12} {'p50 ms':>8} {'p95 ms':>8} {'+RSS MB':>8} {'recall@' + str(args.k):>10}")
+    for backend, row in report.items():
+        print(
+            f"{backend:<12} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} "
+            f"{row['rss_mb']:>8.0f} {row['recall']:>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
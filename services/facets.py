@@ -0,0 +1,52 @@
+"""Facet counts over filtered candidate sets"""
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+from .metadata_store import ColumnarMetadata
+
+
+# (metadata, rows) parts of one candidate set; rows None = every row
+FacetPart = Tuple[ColumnarMetadata, Optional[np.ndarray]]
+
+
+def candidate_rows(
+    metadata: ColumnarMetadata,
+    filters: Optional[Dict[str, Any]],
+    include: Optional[np.ndarray] = None,
+    exclude: Optional[np.ndarray] = None
+) -> Optional[np.ndarray]:
+    """
+    Rows matching the filters, optionally limited to `include` and minus `exclude`
+    (all sorted row arrays). None means every row, so counts can skip the gather.
+    """
+    rows = metadata.filter_index.lookup(filters) if filters else include
+    if filters and include is not None:
+        rows = np.intersect1d(rows, include, assume_unique=True)
+    if exclude is not None and exclude.size:
+        if rows is None:
+            rows = np.arange(metadata.size, dtype=np.int64)
+        rows = np.setdiff1d(rows, exclude, assume_unique=True)
+    return rows
+
+
+def count_facets(
+    parts: List[FacetPart],
+    fields: Sequence[str],
+    top_n: int
+) -> Tuple[int, Dict[str, Dict[Any, int]]]:
+    """
+    Count values per field over the union of `parts` (e.g. base + delta segment).
+    Returns (candidate count, {field: {value: count}}) with the top_n values by count.
+    """
+    total = sum(metadata.size if rows is None else int(rows.size) for metadata, rows in parts)
+    
+    facets: Dict[str, Dict[Any, int]] = {}
+    for field in fields:
+        counts: Dict[Any, int] = {}
+        for metadata, rows in parts:
+            for value, count in metadata.facet_counts(field, rows).items():
+                counts[value] = counts.get(value, 0) + count
+        # Most common first, ties alphabetical so output is stable
+        ranked = sorted(counts.items(), key=lambda item: (-item[1], str(item[0])))
+        facets[field] = dict(ranked[:top_n])
+    return total, facets
@@ -0,0 +1,290 @@
+"""
+Offline builder for the FAISS indices and metadata the VectorStore loads.
+
+    python -m services.index_builder --products styles.csv --faq faq.json --index hnsw
+
+Reads products/FAQs (CSV, JSON or JSONL), embeds them in batches with
+settings.EMBEDDING_MODEL (on --backend), writes <name>.index + <name>.metadata and reports
+recall@k against exact search plus query latency.
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import faiss
+import joblib
+import numpy as np
+
+from core.config import settings
+from .catalog_updates import manifest_path
+from .encoders import EMBEDDING_BACKENDS, load_encoder
+from .vector_store import apply_search_params
+
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq")
+
+# Fields joined into the text we embed for each record
+PRODUCT_TEXT_FIELDS = ("productDisplayName", "gender", "baseColour", "articleType", "usage", "season")
+FAQ_TEXT_FIELDS = ("question",)
+
+# Source column names -> our metadata field names
+PRODUCT_FIELD_ALIASES = {"id": "product_id"}
+
+
+def read_records(path: Path, aliases: Optional[Dict[str, str]] = None) -> List[Dict[str, Any]]:
+    """Read records from .csv, .jsonl or .json (a list of objects), renaming `aliases` fields."""
+    aliases = aliases or {}
+    path = Path(path)
+    with open(path, encoding="utf-8") as f:
+        if path.suffix == ".csv":
+            rows = list(csv.DictReader(f))
+        elif path.suffix == ".jsonl":
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = json.load(f)
+    
+    records = []
+    for row in rows:
+        record = {}
+        for field, value in row.items():
+            value = _coerce(value)
+            if value is not None:
+                record[aliases.get(field, field)] = value
+        records.append(record)
+    return records
+
+
+def _coerce(value: Any) -> Any:
+    """CSV cells arrive as strings: '' -> None, '2011' -> 2011, '67.0' -> 67.0."""
+    if not isinstance(value, str):
+        return value
+    value = value.strip()
+    if not value:
+        return None
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+def record_text(record: Dict[str, Any], fields: tuple) -> str:
+    return " ".join(str(record[field]) for field in fields if record.get(field) is not None)
+
+
+def embed_texts(model, texts: List[str], batch_size: int) -> np.ndarray:
+    """Embed in batches, unit-normalized (the stores use L2 on unit vectors)."""
+    vectors = np.asarray(
+        model.encode(texts, batch_size=batch_size, show_progress_bar=len(texts) > batch_size),
+        dtype=np.float32,
+    )
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def build_index(vectors: np.ndarray, index_type: str, args: argparse.Namespace) -> faiss.Index:
+    """Train (if needed) and fill an index of the requested type."""
+    n, d = vectors.shape
+    nlist = args.nlist or max(1, min(int(4 * math.sqrt(n)), n // 39))
+    
+    if (
+        (index_type in ("ivf", "ivfpq") and n < 39 * nlist)
+        or (index_type == "ivfpq" and n < 2 ** args.pq_bits)
+    ):
+        print(f"  {n} vectors are too few to train {index_type}, using flat")
+        index_type = "flat"
+    
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(d)
+    elif index_type == "ivf":
+        index = faiss.IndexIVFFlat(faiss.IndexFlatL2(d), d, nlist)
+    elif index_type == "ivfpq":
+        if d % args.pq_m:
+            raise ValueError(f"--pq-m {args.pq_m} must divide the embedding size {d}")
+        index = faiss.IndexIVFPQ(faiss.IndexFlatL2(d), d, nlist, args.pq_m, args.pq_bits)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(d, args.hnsw_m)
+        index.hnsw.efConstruction = args.ef_construction
+    else:
+        raise ValueError(f"Unknown index type: {index_type}")
+    
+    if not index.is_trained:
+        # k-means does not need every vector; 256 per list is plenty
+        sample = vectors
+        if n > 256 * nlist:
+            sample = vectors[np.random.default_rng(0).choice(n, 256 * nlist, replace=False)]
+        index.train(sample)
+    index.add(vectors)
+    
+    apply_search_params(index, nprobe=args.nprobe, ef_search=args.ef_search)
+    return index
+
+
+def describe(index: faiss.Index) -> str:
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        kind = "IVF-PQ" if isinstance(faiss.downcast_index(ivf), faiss.IndexIVFPQ) else "IVF"
+        return f"{kind} nlist={ivf.nlist} nprobe={ivf.nprobe}"
+    if isinstance(index, faiss.IndexHNSW):
+        return f"HNSW M={index.hnsw.nb_neighbors(1)} efSearch={index.hnsw.efSearch}"
+    return "Flat"
+
+
+def evaluate(
+    index: faiss.Index,
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    k: int
+) -> Dict[str, float]:
+    """recall@k of `index` against exact search, and per-query latency of both."""
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    k = min(k, len(vectors))
+    
+    truth_distances, _ = exact.search(queries, k)
+    _, found = index.search(queries, k)
+    # A hit counts if it is as close as the true k-th neighbour (ties with
+    # duplicate products are as good as the "true" id); distances recomputed
+    # exactly since PQ distances are approximate
+    hits = 0
+    for query, row, kth in zip(queries, found, truth_distances[:, -1]):
+        row = row[row >= 0]
+        distances = ((vectors[row] - query) ** 2).sum(axis=1)
+        hits += int((distances <= kth + 1e-5).sum())
+    recall = hits / (len(queries) * k)
+    
+    def latencies(idx):
+        times = []
+        for query in queries:
+            started = time.perf_counter()
+            idx.search(query[None, :], k)
+            times.append((time.perf_counter() - started) * 1000)
+        return np.percentile(times, 50), np.percentile(times, 95)
+    
+    exact_p50, exact_p95 = latencies(exact)
+    p50, p95 = latencies(index)
+    return {
+        "recall": float(recall), "p50_ms": p50, "p95_ms": p95,
+        "exact_p50_ms": exact_p50, "exact_p95_ms": exact_p95,
+    }
+
+
+def sample_queries(texts: List[str], n: int) -> List[str]:
+    """Query-like strings: the first half of random record texts ("Turtle Check Men")."""
+    rng = np.random.default_rng(0)
+    picks = rng.choice(len(texts), min(n, len(texts)), replace=False)
+    queries = []
+    for i in picks:
+        words = texts[i].split()
+        queries.append(" ".join(words[:max(1, len(words) // 2)]))
+    return queries
+
+
+def write_store(
+    out_dir: Path,
+    name: str,
+    index: faiss.Index,
+    records: List[Dict[str, Any]],
+    data_type: str
+):
+    """
+    Write <name>.index and <name>.metadata; each file is swapped in atomically.
+    A fresh build replaces any base version merged from catalog updates (its manifest is dropped).
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    index_path = out_dir / f"{name}.index"
+    metadata_path = out_dir / f"{name}.metadata"
+    
+    faiss.write_index(index, str(index_path) + ".tmp")
+    joblib.dump({
+        "metadata_list": records,
+        "id_to_metadata": dict(enumerate(records)),
+        "data_type": data_type,
+    }, str(metadata_path) + ".tmp")
+    
+    os.replace(str(index_path) + ".tmp", index_path)
+    os.replace(str(metadata_path) + ".tmp", metadata_path)
+    if manifest_path(index_path).exists():
+        os.remove(manifest_path(index_path))
+
+
+def build_store(
+    model,
+    source: Path,
+    name: str,
+    data_type: str,
+    text_fields: tuple,
+    aliases: Optional[Dict[str, str]],
+    index_type: str,
+    args: argparse.Namespace
+) -> Optional[Dict[str, float]]:
+    """Read, embed, index, evaluate and write one store."""
+    print(f"\n[{name}] reading {source}")
+    records = read_records(source, aliases)
+    texts = [record_text(record, text_fields) for record in records]
+    print(f"[{name}] embedding {len(texts)} records (batch size {args.batch_size})")
+    
+    started = time.perf_counter()
+    vectors = embed_texts(model, texts, args.batch_size)
+    embed_seconds = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    index = build_index(vectors, index_type, args)
+    build_seconds = time.perf_counter() - started
+    
+    queries = embed_texts(model, sample_queries(texts, args.eval_queries), args.batch_size)
+    report = evaluate(index, vectors, queries, args.k)
+    report.update(embed_s=embed_seconds, build_s=build_seconds)
+    
+    write_store(args.out, name, index, records, data_type)
+    print(
+        f"[{name}] {describe(index)}: {index.ntotal} vectors, "
+        f"embed {embed_seconds:.1f}s, build {build_seconds:.1f}s\n"
+        f"[{name}] recall@{args.k} {report['recall']:.3f} | "
+        f"latency p50 {report['p50_ms']:.2f} ms, p95 {report['p95_ms']:.2f} ms "
+        f"(exact: p50 {report['exact_p50_ms']:.2f} ms, p95 {report['exact_p95_ms']:.2f} ms)"
+    )
+    return report
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Build FAISS indices and metadata for the shopping assistant")
+    parser.add_argument("--products", type=Path, help="product catalog (.csv / .jsonl / .json)")
+    parser.add_argument("--faq", type=Path, help="FAQ entries with question/answer (.csv / .jsonl / .json)")
+    parser.add_argument("--out", type=Path, default=settings.INDICES_DIR, help="output directory")
+    parser.add_argument("--index", choices=INDEX_TYPES, default="flat", help="product index type")
+    parser.add_argument("--faq-index", choices=INDEX_TYPES, default="flat", help="FAQ index type")
+    parser.add_argument("--nlist", type=int, default=0, help="IVF lists (default ~4*sqrt(n))")
+    parser.add_argument("--nprobe", type=int, default=settings.IVF_NPROBE, help="IVF lists probed per query")
+    parser.add_argument("--pq-m", type=int, default=48, help="PQ sub-quantizers (must divide the dimension)")
+    parser.add_argument("--pq-bits", type=int, default=8, help="bits per PQ code")
+    parser.add_argument("--hnsw-m", type=int, default=32, help="HNSW neighbours per node")
+    parser.add_argument("--ef-construction", type=int, default=200, help="HNSW build-time beam width")
+    parser.add_argument("--ef-search", type=int, default=settings.HNSW_EF_SEARCH, help="HNSW query-time beam width")
+    parser.add_argument("--backend", choices=EMBEDDING_BACKENDS, default=settings.EMBEDDING_BACKEND, help="encoder backend")
+    parser.add_argument("--batch-size", type=int, default=64, help="embedding batch size")
+    parser.add_argument("--k", type=int, default=settings.DEFAULT_SEARCH_K, help="k for recall@k")
+    parser.add_argument("--eval-queries", type=int, default=200, help="queries used for recall/latency")
+    args = parser.parse_args(argv)
+    
+    if not args.products and not args.faq:
+        parser.error("nothing to build: pass --products and/or --faq")
+    
+    print(f"Loading {settings.EMBEDDING_MODEL} ({args.backend})...")
+    model = load_encoder(settings.EMBEDDING_MODEL, args.backend)
+    
+    if args.products:
+        build_store(model, args.products, "products", "product", PRODUCT_TEXT_FIELDS, PRODUCT_FIELD_ALIASES, args.index, args)
+    if args.faq:
+        build_store(model, args.faq, "faq", "faq", FAQ_TEXT_FIELDS, None, args.faq_index, args)
+    print(f"\nWrote indices to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
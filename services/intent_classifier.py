@@ -0,0 +1,159 @@
+"""
+Local embedding-based intent classifier (FAQ vs Product)
+
+Calibrate settings.LOCAL_INTENT_THRESHOLD on labelled messages (JSON lines of
+{"text": ..., "intent": "faq" | "product"}):
+
+    python -m services.intent_classifier --labels labels.jsonl --target 0.98
+"""
+import argparse
+import json
+import math
+import threading
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from core.config import settings
+from core.schemas import IntentClassification
+from .tools import embed_queries
+from .vector_store import VectorStore, get_vector_store
+
+
+class LocalIntentClassifier:
+    """
+    Classifies a message by its nearest neighbours in the FAQ and product indices.
+    
+    The message embedding is compared with the FAQ questions and the product
+    catalog already in the VectorStore. Whichever side is closer wins, and the
+    confidence grows with the margin between the two. Callers fall back to the
+    LLM when confidence is below settings.LOCAL_INTENT_THRESHOLD, or when a
+    follow-up turn would switch away from the previous turn's intent: the
+    message alone ("what about in blue?") can't tell, the LLM sees the history.
+    """
+    
+    def __init__(self, vector_store: VectorStore):
+        self.vector_store = vector_store
+        self.neighbors = settings.LOCAL_INTENT_NEIGHBORS
+        self.temperature = settings.LOCAL_INTENT_TEMPERATURE
+        self._lock = threading.Lock()
+        self._counts = {"local": 0, "fallback": 0}
+    
+    def classify(self, text: str) -> IntentClassification:
+        """Classify one message (embedding goes through the shared query cache)."""
+        query_vec = embed_queries(self.vector_store, [text])[0]
+        return self.classify_vector(query_vec)
+    
+    def classify_vector(self, query_vec: np.ndarray) -> IntentClassification:
+        """Classify an already embedded message."""
+        faq_score = self._similarity(self.vector_store.faq_index, query_vec)
+        product_score = self._similarity(self.vector_store.product_index, query_vec)
+    
+        margin = faq_score - product_score
+        intent_type = "faq" if margin > 0 else "product"
+        confidence = 1.0 / (1.0 + math.exp(-abs(margin) / self.temperature))
+    
+        return IntentClassification(
+            intent_type=intent_type,
+            confidence=confidence,
+            reasoning=(
+                f"local nearest-neighbour match (faq={faq_score:.3f}, "
+                f"product={product_score:.3f})"
+            )
+        )
+    
+    def accept(
+        self,
+        intent: IntentClassification,
+        previous: Optional[IntentClassification] = None
+    ) -> bool:
+        """
+        True if a local result is confident enough to skip the LLM and, on a
+        follow-up turn, keeps the `previous` turn's intent.
+        """
+        accepted = intent.confidence >= settings.LOCAL_INTENT_THRESHOLD and (
+            previous is None or previous.intent_type == intent.intent_type
+        )
+        with self._lock:
+            self._counts["local" if accepted else "fallback"] += 1
+        return accepted
+    
+    def stats(self) -> dict:
+        """How many turns were answered locally vs sent to the LLM."""
+        with self._lock:
+            counts = dict(self._counts)
+        total = counts["local"] + counts["fallback"]
+        counts["local_ratio"] = counts["local"] / total if total else 0.0
+        return counts
+    
+    def calibrate(
+        self,
+        examples: List[Tuple[str, str]],
+        target_accuracy: float
+    ) -> Tuple[float, float]:
+        """
+        Lowest confidence threshold whose accepted (text, intent) examples are
+        classified with at least `target_accuracy`.
+        Returns (threshold, share of examples accepted); inf if none qualifies.
+        """
+        if not examples:
+            return math.inf, 0.0
+        vectors = embed_queries(self.vector_store, [text for text, _ in examples])
+        predictions = [self.classify_vector(vector) for vector in vectors]
+        confidence = np.array([p.confidence for p in predictions])
+        correct = np.array([p.intent_type == label for p, (_, label) in zip(predictions, examples)])
+    
+        order = np.argsort(-confidence, kind="stable")
+        confidence, correct = confidence[order], correct[order]
+        accuracy = np.cumsum(correct) / np.arange(1, len(correct) + 1)
+        # Only cut between distinct confidences: a threshold accepts all ties
+        last_of_tie = np.append(confidence[1:] < confidence[:-1], True)
+        qualifying = np.flatnonzero((accuracy >= target_accuracy) & last_of_tie)
+        if not qualifying.size:
+            return math.inf, 0.0
+        cut = qualifying[-1]
+        return float(confidence[cut]), (cut + 1) / len(correct)
+    
+    def _similarity(self, index, query_vec: np.ndarray) -> float:
+        """Mean cosine similarity of the k nearest vectors in an index."""
+        k = min(self.neighbors, index.ntotal)
+        if k <= 0:
+            return -1.0
+        distances, _ = index.search(np.array([query_vec], dtype=np.float32), k)
+        # Embeddings are unit length, so squared L2 d maps to cosine 1 - d/2
+        return float(np.mean(1.0 - distances[0] / 2.0))
+
+
+_intent_classifier: Optional[LocalIntentClassifier] = None
+
+
+def get_intent_classifier() -> LocalIntentClassifier:
+    """Get or create LocalIntentClassifier singleton."""
+    global _intent_classifier
+    if _intent_classifier is None:
+        _intent_classifier = LocalIntentClassifier(get_vector_store())
+    return _intent_classifier
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Calibrate LOCAL_INTENT_THRESHOLD on labelled messages")
+    parser.add_argument("--labels", type=Path, required=True, help='JSON lines of {"text": ..., "intent": ...}')
+    parser.add_argument("--target", type=float, default=0.98, help="accuracy required of local decisions")
+    args = parser.parse_args(argv)
+
+    with open(args.labels) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    examples = [(row["text"], row["intent"]) for row in rows]
+    threshold, coverage = get_intent_classifier().calibrate(examples, args.target)
+    if math.isinf(threshold):
+        print(f"No threshold reaches {args.target:.1%} accuracy on {len(examples)} examples: keep the LLM")
+    else:
+        print(
+            f"LOCAL_INTENT_THRESHOLD={threshold:.4f} "
+            f"({coverage:.1%} of {len(examples)} examples answered locally at >= {args.target:.1%} accuracy)"
+        )
+
+
+if __name__ == "__main__":
+    main()
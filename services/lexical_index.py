@@ -0,0 +1,156 @@
+"""BM25 lexical index over metadata text columns, and rank fusion"""
+import re
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, TYPE_CHECKING
+import numpy as np
+
+if TYPE_CHECKING:
+    from .metadata_store import ColumnarMetadata
+
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:['\-][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens; apostrophes/hyphens are joined (men's -> mens, t-shirt -> tshirt)."""
+    return [
+        token.replace("'", "").replace("-", "")
+        for token in _TOKEN_PATTERN.findall(text.lower())
+    ]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over the string columns of a ColumnarMetadata (row == doc id).
+    Catches exact tokens the embedding blurs: brand names ("Puma"), codes, "COD".
+    Postings are stored CSR-style: one doc-id array and one tf array per term.
+    """
+    
+    def __init__(self, store: "ColumnarMetadata", fields: Sequence[str], k1: float = 1.5, b: float = 0.75):
+        self.size = store.size
+        self.fields = tuple(fields)
+        self.k1 = k1
+        self.b = b
+    
+        postings: Dict[str, Dict[int, int]] = {}
+        self.doc_lengths = np.zeros(self.size, dtype=np.float32)
+        for row in range(self.size):
+            tokens = []
+            for field in self.fields:
+                value = store.value(row, field)
+                if value is not None:
+                    tokens += tokenize(str(value))
+            self.doc_lengths[row] = len(tokens)
+            for token in tokens:
+                docs = postings.setdefault(token, {})
+                docs[row] = docs.get(row, 0) + 1
+    
+        self.avg_length = float(self.doc_lengths.sum(dtype=np.float64)) / self.size if self.size else 0.0
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {
+            token: (
+                np.fromiter(docs.keys(), dtype=np.int64, count=len(docs)),
+                np.fromiter(docs.values(), dtype=np.float32, count=len(docs)),
+            )
+            for token, docs in postings.items()
+        }
+    
+    def doc_freq(self, token: str, counted: Optional[np.ndarray] = None) -> int:
+        """Number of docs containing the token (only those True in the `counted` mask)."""
+        docs = self._postings.get(token)
+        if docs is None:
+            return 0
+        if counted is None:
+            return len(docs[0])
+        return int(np.count_nonzero(counted[docs[0]]))
+    
+    def idf(self, token: str, stats: Optional["CorpusStats"] = None) -> float:
+        size, df = (self.size, self.doc_freq(token)) if stats is None else (stats.size, stats.doc_freq(token))
+        return float(np.log(1 + (size - df + 0.5) / (df + 0.5)))
+    
+    def scores(self, query: str, stats: Optional["CorpusStats"] = None) -> np.ndarray:
+        """
+        BM25 score of every doc for the query (0 where no token matches).
+        stats: collection statistics to score with instead of this index's own,
+               so scores from several indices (catalog segments) are comparable.
+        """
+        scores = np.zeros(self.size, dtype=np.float32)
+        if not self.size:
+            return scores
+        avg_length = self.avg_length if stats is None else stats.avg_length
+        length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / max(avg_length, 1e-6))
+        for token in set(tokenize(query)):
+            docs = self._postings.get(token)
+            if docs is None:
+                continue
+            rows, tf = docs
+            # Rows are unique within a posting list, so plain fancy-index add is safe
+            scores[rows] += self.idf(token, stats) * tf * (self.k1 + 1) / (tf + length_norm[rows])
+        return scores
+    
+    def search(
+        self,
+        query: str,
+        k: int,
+        allowed: Optional[np.ndarray] = None,
+        stats: Optional["CorpusStats"] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k (scores, rows) by BM25, best first; only docs with a matching token.
+        allowed: sorted rows to restrict to (metadata filters), None = all.
+        stats: shared collection statistics (see scores)
+        """
+        scores = self.scores(query, stats)
+        if allowed is not None:
+            mask = np.zeros(self.size, dtype=bool)
+            mask[allowed] = True
+            scores[~mask] = 0
+        candidates = np.flatnonzero(scores > 0)
+        if candidates.size > k:
+            # Keep every candidate tied with the k-th, so ties resolve by row below
+            kth = np.partition(-scores[candidates], k - 1)[k - 1]
+            candidates = candidates[-scores[candidates] <= kth]
+        # Best first, ties in row order (the same order a merged catalog gives them)
+        order = candidates[np.lexsort((candidates, -scores[candidates]))][:k]
+        return scores[order], order
+
+
+class CorpusStats(NamedTuple):
+    """
+    BM25 collection statistics over the live docs of several indices, e.g. the
+    base catalog minus tombstoned rows plus the delta segment's current rows.
+    """
+    size: int
+    avg_length: float
+    # (index, bool mask of its docs that count)
+    parts: Tuple[Tuple[BM25Index, np.ndarray], ...]
+    
+    def doc_freq(self, token: str) -> int:
+        return sum(index.doc_freq(token, counted) for index, counted in self.parts)
+
+
+def corpus_stats(parts: Sequence[Tuple[BM25Index, np.ndarray]]) -> CorpusStats:
+    """CorpusStats over (index, sorted live rows) pairs."""
+    masked = []
+    size, total_length = 0, 0.0
+    for index, rows in parts:
+        counted = np.zeros(index.size, dtype=bool)
+        counted[rows] = True
+        masked.append((index, counted))
+        size += int(rows.size)
+        total_length += float(index.doc_lengths[rows].sum(dtype=np.float64))
+    return CorpusStats(size, total_length / size if size else 0.0, tuple(masked))
+
+
+def reciprocal_rank_fusion(ranked_lists: List[List], k: int, rrf_k: int = 60) -> List[Tuple[object, float]]:
+    """
+    Fuse ranked lists of hits into one: score(d) = sum 1 / (rrf_k + rank).
+    Hits are matched by (store, row), so the same SearchResult from two lists merges.
+    Returns the top-k (hit, fused score), best first.
+    """
+    fused: Dict[Tuple[int, int], List] = {}
+    for hits in ranked_lists:
+        for rank, hit in enumerate(hits, start=1):
+            key = (id(hit.store), hit.row)
+            entry = fused.setdefault(key, [hit, 0.0])
+            entry[1] += 1.0 / (rrf_k + rank)
+    ranked = sorted(fused.values(), key=lambda entry: -entry[1])
+    return [(hit, score) for hit, score in ranked[:k]]
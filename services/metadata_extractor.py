@@ -0,0 +1,306 @@
+"""Local ProductMetadata extractor over the catalog vocabulary"""
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.schemas import ProductMetadata
+from .lexical_index import tokenize
+from .vector_store import VectorStore, get_vector_store
+
+
+# Fields we extract, in the order they read naturally in a search query
+EXTRACTED_FIELDS = ("baseColour", "usage", "articleType", "gender", "season")
+
+# Everyday words -> catalog values (only used if the value exists in the catalog)
+SYNONYMS: Dict[str, Dict[str, str]] = {
+    "gender": {
+        "man": "Men", "mens": "Men", "male": "Men", "gents": "Men", "guys": "Men",
+        "woman": "Women", "womens": "Women", "female": "Women", "ladies": "Women", "lady": "Women",
+        "boy": "Boys", "girl": "Girls",
+    },
+    "baseColour": {
+        "navy": "Navy Blue", "gray": "Grey", "golden": "Gold",
+        "multicolor": "Multi", "multicolour": "Multi",
+    },
+    "usage": {
+        "office": "Formal", "work": "Formal", "gym": "Sports", "sport": "Sports",
+        "running": "Sports", "traditional": "Ethnic", "everyday": "Casual",
+    },
+    "season": {
+        "autumn": "Fall",
+    },
+    "articleType": {
+        "tshirt": "Tshirts", "tshirts": "Tshirts", "t shirt": "Tshirts", "t shirts": "Tshirts",
+        "tee": "Tshirts", "tees": "Tshirts", "sneaker": "Sports Shoes", "sneakers": "Sports Shoes",
+        "trainers": "Sports Shoes", "sport shoes": "Sports Shoes", "joggers": "Track Pants",
+        "hoodie": "Sweatshirts", "hoodies": "Sweatshirts", "scarf": "Scarves", "cap": "Caps",
+        "kurti": "Kurtas", "sari": "Sarees", "saree": "Sarees", "slippers": "Flip Flops",
+        "shades": "Sunglasses", "perfume": "Perfume and Body Mist",
+    },
+}
+
+# Price range / sort fields, carried forward like the catalog fields
+PRICE_FIELDS = ("min_price", "max_price", "sort")
+
+# Price phrases, matched on the raw message ("$40" has no word token of its own)
+_AMOUNT = r"\$?\s*(\d+(?:\.\d+)?)\s*(?:dollars?|usd|bucks)?"
+PRICE_PATTERNS: List[Tuple[re.Pattern, Tuple[str, ...]]] = [
+    (re.compile(rf"\bbetween\s+{_AMOUNT}\s+and\s+{_AMOUNT}"), ("min_price", "max_price")),
+    (re.compile(r"\$\s*(\d+(?:\.\d+)?)\s*(?:-|to)\s*\$?\s*(\d+(?:\.\d+)?)"), ("min_price", "max_price")),
+    (re.compile(rf"\b(?:under|below|less than|cheaper than|up to|at most|max|within)\s+{_AMOUNT}"), ("max_price",)),
+    (re.compile(rf"\b(?:over|above|more than|at least|min|starting at)\s+{_AMOUNT}"), ("min_price",)),
+]
+# Only superlatives sort most-expensive first: a bare "expensive" is usually a
+# complaint ("not too expensive"), not a request
+SORT_PATTERNS: List[Tuple[re.Pattern, str]] = [
+    (re.compile(r"\b(?:most expensive|priciest|highest price[ds]?)\b"), "price_desc"),
+    (re.compile(r"\b(?:cheapest|cheaper|cheap|lowest price[ds]?|budget|affordable|inexpensive)\b"), "price_asc"),
+]
+
+# Cues that negate the phrase right after them ("not black", "no black shirts",
+# "without leather", "too formal"), optionally through a softener ("not too ...")
+NEGATIONS = {"not", "no", "nothing", "without", "too"}
+SOFTENERS = {"too", "so", "very", "any", "that", "overly"}
+# Cues that exclude something anywhere in the message ("I don't want black shirts",
+# "anything but black", "shirts except black", "other than black"): the whole
+# message goes to the LLM, since filters can only include values
+EXCLUSIONS = {"dont", "doesnt", "except", "but", "besides"}
+EXCLUSION_PHRASES = {("other", "than"), ("do", "not"), ("does", "not")}
+# Negated price words ("not too expensive", "nothing cheap") ask for no order
+_NEGATED_PRICE = re.compile(
+    rf"\b(?:{'|'.join(sorted(NEGATIONS))})\s+(?:(?:{'|'.join(sorted(SOFTENERS))})\s+)?"
+    r"(?:expensive|pricey|costly|cheap|cheaper|cheapest|priciest|budget|affordable|inexpensive)\b"
+)
+
+# Plural-only article names whose singular is a different everyday word
+_NO_SINGULAR = {"shorts", "jeans", "trousers", "pants", "flats", "briefs", "boxers", "glasses"}
+
+# Words that carry no search intent of their own
+STOPWORDS = {
+    "a", "an", "the", "for", "me", "my", "show", "i", "im", "want", "need", "looking",
+    "look", "some", "any", "in", "with", "and", "of", "to", "please", "get", "find",
+    "buy", "do", "you", "have", "got", "what", "about", "like", "would", "can", "could",
+    "new", "one", "ones", "color", "colour", "colored", "coloured", "also", "now", "just",
+    "something", "items", "item", "products", "options", "there", "are", "is", "it",
+    "that", "those", "these", "them", "instead", "too", "more", "only", "hi", "hey",
+}
+
+
+def extract_price(message: str) -> Tuple[Dict[str, Any], str]:
+    """
+    Price range and sort order stated in a message ("under $40", "cheapest").
+    Returns (found fields, message with those phrases removed).
+    """
+    text = message.lower()
+    found: Dict[str, Any] = {}
+    for pattern, fields in PRICE_PATTERNS:
+        match = pattern.search(text)
+        if match and not any(field in found for field in fields):
+            amounts = sorted(float(amount) for amount in match.groups())
+            found.update(zip(fields, amounts))
+            text = text[:match.start()] + " " + text[match.end():]
+    text = _NEGATED_PRICE.sub(" ", text)
+    for pattern, sort in SORT_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            found["sort"] = sort
+            text = text[:match.start()] + " " + text[match.end():]
+            break
+    return found, text
+
+
+def _has_exclusion(tokens: List[str]) -> bool:
+    """Whether the tokens contain an EXCLUSIONS word or an EXCLUSION_PHRASES pair."""
+    return any(token in EXCLUSIONS for token in tokens) or any(
+        pair in EXCLUSION_PHRASES for pair in zip(tokens, tokens[1:])
+    )
+
+
+class PhraseTrie:
+    """Word-level trie for leftmost-longest phrase matching in one pass."""
+    
+    def __init__(self):
+        self.root: Dict = {}
+    
+    def add(self, phrase: List[str], payload: Tuple[str, str]):
+        node = self.root
+        for token in phrase:
+            node = node.setdefault(token, {})
+        node.setdefault(None, set()).add(payload)
+    
+    def match_at(self, tokens: List[str], i: int) -> Tuple[Optional[int], Optional[set]]:
+        """(end, payloads) of the longest phrase starting at tokens[i], or (None, None)."""
+        node = self.root
+        best_end, best_payload = None, None
+        j = i
+        while j < len(tokens) and tokens[j] in node:
+            node = node[tokens[j]]
+            j += 1
+            if None in node:
+                best_end, best_payload = j, node[None]
+        return best_end, best_payload
+    
+    def scan(
+        self,
+        tokens: List[str]
+    ) -> Tuple[List[Tuple[str, str]], List[str], List[Tuple[str, str]]]:
+        """
+        Return (matches, leftover tokens, negated matches).
+        At each position the longest phrase wins, then scanning resumes after it.
+        A phrase right after a NEGATIONS cue (and an optional softener) is negated.
+        """
+        matches: List[Tuple[str, str]] = []
+        leftover: List[str] = []
+        negated: List[Tuple[str, str]] = []
+        i = 0
+        while i < len(tokens):
+            if tokens[i] in NEGATIONS:
+                start = i + 1
+                if start < len(tokens) and tokens[start] in SOFTENERS and tokens[start] not in self.root:
+                    start += 1
+                end, payload = self.match_at(tokens, start)
+                if end is not None:
+                    negated.extend(sorted(payload))
+                    i = end
+                    continue
+    
+            end, payload = self.match_at(tokens, i)
+            if end is None:
+                leftover.append(tokens[i])
+                i += 1
+            else:
+                matches.extend(sorted(payload))
+                i = end
+        return matches, leftover, negated
+
+
+class LocalMetadataExtractor:
+    """
+    Deterministic ProductMetadata extraction from the catalog's closed vocabulary.
+    
+    Phrases come from the distinct articleType/gender/baseColour/usage/season values
+    in the product metadata (plus singular/plural forms and SYNONYMS). Context from
+    the previous turn's product_metadata is carried forward. Returns None when the
+    message is ambiguous, negates a catalog value ("not black") or excludes
+    something ("anything but black"), so the caller can fall back to the LLM.
+    """
+    
+    def __init__(self, vector_store: VectorStore):
+        self.vector_store = vector_store
+        self._lock = threading.Lock()
+        self._counts = {"local": 0, "fallback": 0}
+        self._build()
+        vector_store.add_reload_listener(self._build, stores=("products",))
+    
+    def _build(self):
+        """Build the phrase trie from the current catalog vocabulary."""
+        metadata = self.vector_store.product_metadata
+        trie = PhraseTrie()
+    
+        for field in EXTRACTED_FIELDS:
+            if field not in metadata.categorical:
+                continue
+            _, categories = metadata.categorical[field]
+            vocabulary = {str(value).lower(): str(value) for value in categories}
+    
+            for lowered, value in vocabulary.items():
+                for phrase in self._variants(tokenize(lowered)):
+                    trie.add(phrase, (field, value))
+    
+            for phrase, value in SYNONYMS.get(field, {}).items():
+                if value.lower() in vocabulary:
+                    trie.add(tokenize(phrase), (field, vocabulary[value.lower()]))
+    
+        self.trie = trie
+    
+    def _variants(self, tokens: List[str]) -> List[List[str]]:
+        """A phrase plus its singular/plural form (last word only)."""
+        if not tokens:
+            return []
+        variants = [tokens]
+        last = tokens[-1]
+        if last in _NO_SINGULAR:
+            return variants
+        if last.endswith(("ches", "shes", "sses", "xes")):
+            variants.append(tokens[:-1] + [last[:-2]])
+        elif last.endswith("s") and len(last) > 3:
+            variants.append(tokens[:-1] + [last[:-1]])
+        else:
+            variants.append(tokens[:-1] + [last + "s"])
+        return variants
+    
+    def extract(
+        self,
+        message: str,
+        previous: Optional[ProductMetadata] = None
+    ) -> Optional[ProductMetadata]:
+        """Extract metadata from one message, or None if the LLM should decide."""
+        price, message = extract_price(message)
+        tokens = tokenize(message)
+        if _has_exclusion(tokens):
+            return self._count(None)
+        matches, leftover, negated = self.trie.scan(tokens)
+        leftover = [token for token in leftover if token not in STOPWORDS]
+        if negated:
+            # "not black", "no leather wallets": exclusions need the LLM
+            return self._count(None)
+    
+        found: Dict[str, str] = {}
+        for field, value in matches:
+            if found.get(field, value) != value:
+                # "black or white shirts" - two values for one field
+                return self._count(None)
+            found[field] = value
+    
+        if not found and not (price and previous is not None):
+            # Nothing from the catalog vocabulary (or a price for an earlier search): let the LLM interpret it
+            return self._count(None)
+    
+        # Carry context from the previous turn ("shirts" -> "mens black", "under $40")
+        fields: Dict[str, Any] = {}
+        if previous is not None:
+            if found.get("articleType") and found["articleType"] != previous.articleType:
+                # A new product type starts a new search; keep only who it's for
+                fields["gender"] = previous.gender
+            else:
+                fields = {field: getattr(previous, field) for field in EXTRACTED_FIELDS + PRICE_FIELDS}
+        if "min_price" in price or "max_price" in price:
+            # A new price range replaces the old one rather than narrowing it
+            fields.pop("min_price", None)
+            fields.pop("max_price", None)
+        fields.update(found)
+        fields.update(price)
+    
+        query_parts = [fields[field] for field in EXTRACTED_FIELDS if fields.get(field)]
+        search_query = " ".join(query_parts + leftover)
+    
+        return self._count(ProductMetadata(
+            search_query=search_query,
+            can_search=True,
+            needs_clarification=False,
+            **{field: fields.get(field) for field in EXTRACTED_FIELDS + PRICE_FIELDS}
+        ))
+    
+    def _count(self, metadata: Optional[ProductMetadata]) -> Optional[ProductMetadata]:
+        with self._lock:
+            self._counts["fallback" if metadata is None else "local"] += 1
+        return metadata
+    
+    def stats(self) -> dict:
+        """How many turns were extracted locally vs sent to the LLM."""
+        with self._lock:
+            counts = dict(self._counts)
+        total = counts["local"] + counts["fallback"]
+        counts["local_ratio"] = counts["local"] / total if total else 0.0
+        return counts
+
+
+_metadata_extractor: Optional[LocalMetadataExtractor] = None
+
+
+def get_metadata_extractor() -> LocalMetadataExtractor:
+    """Get or create LocalMetadataExtractor singleton."""
+    global _metadata_extractor
+    if _metadata_extractor is None:
+        _metadata_extractor = LocalMetadataExtractor(get_vector_store())
+    return _metadata_extractor
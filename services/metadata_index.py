@@ -0,0 +1,124 @@
+"""Inverted index over metadata fields for filter pre-selection"""
+from typing import Dict, Any, NamedTuple, Optional, Tuple, TYPE_CHECKING
+import numpy as np
+
+if TYPE_CHECKING:
+    from .metadata_store import ColumnarMetadata
+
+
+class Range(NamedTuple):
+    """Inclusive numeric range filter value, e.g. {"price": Range(max=40)}; None = open end"""
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+
+def filter_value_key(value: Any) -> Any:
+    """Hashable, case-insensitive form of a filter value (ranges are kept as is)."""
+    if isinstance(value, Range):
+        return value
+    return str(value).lower()
+
+
+class MetadataIndex:
+    """
+    Maps (field, value) -> sorted array of row ids.
+    Values are matched case-insensitively (Men == men), same as the old post-filter.
+    Range values are answered from a sorted copy of the numeric column.
+    """
+
+    def __init__(self, store: "ColumnarMetadata"):
+        self.store = store
+        self.size = store.size
+        self._postings: Dict[str, Dict[str, np.ndarray]] = {}
+        self._sorted: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+        # Categorical columns are cheap to index from their codes, do them up front
+        for field in store.categorical:
+            self._field_postings(field)
+
+    def _field_postings(self, field: str) -> Dict[str, np.ndarray]:
+        """Get (or build) value -> ids postings for one field."""
+        postings = self._postings.get(field)
+        if postings is not None:
+            return postings
+
+        postings = {}
+        if field in self.store.categorical:
+            codes, categories = self.store.categorical[field]
+            # One stable sort groups rows by code, already in id order
+            order = np.argsort(codes, kind="stable")
+            sorted_codes = codes[order]
+            bounds = np.searchsorted(sorted_codes, np.arange(len(categories) + 1))
+            for code, category in enumerate(categories):
+                ids = order[bounds[code]:bounds[code + 1]].astype(np.int64)
+                key = str(category).lower()
+                if key in postings:
+                    # Categories differing only by case share a posting list
+                    ids = np.union1d(postings[key], ids)
+                postings[key] = ids
+        else:
+            buckets: Dict[str, list] = {}
+            for row in range(self.size):
+                value = self.store.value(row, field)
+                if value is None:
+                    continue
+                buckets.setdefault(str(value).lower(), []).append(row)
+            postings = {
+                value: np.array(rows, dtype=np.int64)
+                for value, rows in buckets.items()
+            }
+
+        self._postings[field] = postings
+        return postings
+
+    def _field_sorted(self, field: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Get (or build) (sorted values, row ids in that order) for a numeric field."""
+        column = self._sorted.get(field)
+        if column is not None:
+            return column
+
+        values = self.store.numeric.get(field)
+        if values is None:
+            column = (np.empty(0, dtype=np.float64), np.empty(0, dtype=np.int64))
+        else:
+            # NaN (missing) sorts last; leave it out so no range matches it
+            order = np.argsort(values, kind="stable")
+            sorted_values = np.asarray(values[order], dtype=np.float64)
+            present = int(np.count_nonzero(~np.isnan(sorted_values)))
+            column = (sorted_values[:present], order[:present].astype(np.int64))
+
+        self._sorted[field] = column
+        return column
+
+    def range_ids(self, field: str, value: Range) -> np.ndarray:
+        """Sorted ids whose numeric `field` lies within the range (two binary searches)."""
+        sorted_values, order = self._field_sorted(field)
+        start = 0 if value.min is None else np.searchsorted(sorted_values, value.min, side="left")
+        end = len(sorted_values) if value.max is None else np.searchsorted(sorted_values, value.max, side="right")
+        return np.sort(order[start:end])
+
+    def lookup(self, filters: Dict[str, Any]) -> np.ndarray:
+        """Resolve filters (values or Ranges) to the sorted ids matching all of them."""
+        empty = np.empty(0, dtype=np.int64)
+
+        id_sets = []
+        for field, value in filters.items():
+            if isinstance(value, Range):
+                ids = self.range_ids(field, value)
+            else:
+                ids = self._field_postings(field).get(str(value).lower())
+            if ids is None:
+                return empty
+            id_sets.append(ids)
+
+        if not id_sets:
+            return np.arange(self.size, dtype=np.int64)
+
+        # Intersect smallest first so the work shrinks as we go
+        id_sets.sort(key=len)
+        result = id_sets[0]
+        for ids in id_sets[1:]:
+            if not result.size:
+                break
+            result = np.intersect1d(result, ids, assume_unique=True)
+        return result
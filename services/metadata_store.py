@@ -0,0 +1,303 @@
+"""Columnar, read-only metadata store and lightweight search results"""
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Tuple
+import numpy as np
+
+from .metadata_index import MetadataIndex
+from .lexical_index import BM25Index
+
+
+# Bump when the on-disk column layout changes
+COLUMNS_FORMAT_VERSION = 1
+
+
+class ColumnarMetadata:
+    """
+    Column-oriented metadata for one FAISS index (row i == FAISS id i).
+    
+    - numeric fields (price, product_id, year) -> numpy arrays
+    - low-cardinality strings (gender, articleType, ...) -> int32 codes + categories
+    - free text (productDisplayName, answer, ...) -> plain lists
+    """
+    
+    def __init__(
+        self,
+        items: List[Dict[str, Any]],
+        categorical_fields: Iterable[str] = (),
+        data_type: Optional[str] = None
+    ):
+        self.size = len(items)
+        self.data_type = data_type
+        self.numeric: Dict[str, np.ndarray] = {}
+        self.categorical: Dict[str, Tuple[np.ndarray, List[str]]] = {}
+        self.text: Dict[str, List[Any]] = {}
+    
+        # Keep field order of the source records
+        fields: Dict[str, None] = {}
+        for item in items:
+            for field in item:
+                fields.setdefault(field, None)
+        self.fields: List[str] = list(fields)
+    
+        categorical_fields = set(categorical_fields)
+        for field in self.fields:
+            values = [item.get(field) for item in items]
+            present = [v for v in values if v is not None]
+    
+            if present and all(
+                isinstance(v, (int, float, np.number)) and not isinstance(v, bool)
+                for v in present
+            ):
+                if any(isinstance(v, (float, np.floating)) for v in present) or len(present) < len(values):
+                    self.numeric[field] = np.array(
+                        [np.nan if v is None else v for v in values], dtype=np.float64
+                    )
+                else:
+                    self.numeric[field] = np.array(values, dtype=np.int64)
+                continue
+    
+            distinct = set(present)
+            if field in categorical_fields or len(distinct) <= max(16, self.size // 2):
+                categories = sorted(distinct, key=str)
+                lookup = {value: code for code, value in enumerate(categories)}
+                codes = np.array(
+                    [lookup[v] if v is not None else -1 for v in values], dtype=np.int32
+                )
+                self.categorical[field] = (codes, categories)
+            else:
+                self.text[field] = values
+    
+        self.source_mtime: Optional[float] = None
+        self._filter_index: Optional[MetadataIndex] = None
+        self._lexical_index: Optional[BM25Index] = None
+    
+    @classmethod
+    def from_metadata(
+        cls,
+        metadata: Any,
+        categorical_fields: Iterable[str] = ()
+    ) -> "ColumnarMetadata":
+        """Build from the pickled {'metadata_list', 'id_to_metadata'} format."""
+        if isinstance(metadata, list):
+            return cls(metadata, categorical_fields)
+    
+        metadata_list = metadata.get('metadata_list')
+        if not isinstance(metadata_list, list):
+            id_to_metadata = metadata.get('id_to_metadata', {})
+            size = max(id_to_metadata, default=-1) + 1
+            metadata_list = [id_to_metadata.get(i, {}) for i in range(size)]
+        return cls(metadata_list, categorical_fields, metadata.get('data_type'))
+    
+    def save(self, path: Path, source_mtime: Optional[float] = None):
+        """
+        Write the columns to a directory of .npy files plus manifest.json.
+        The directory is written aside and renamed into place, so readers never see half of it.
+        """
+        path = Path(path)
+        tmp = path.with_name(f"{path.name}.tmp{os.getpid()}")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+    
+        manifest = {
+            "version": COLUMNS_FORMAT_VERSION,
+            "size": self.size,
+            "data_type": self.data_type,
+            "source_mtime": source_mtime,
+            "fields": self.fields,
+            "numeric": [],
+            "categorical": {},
+            "text": [],
+        }
+        for i, field in enumerate(self.fields):
+            if field in self.numeric:
+                np.save(tmp / f"{i}.npy", self.numeric[field])
+                manifest["numeric"].append(field)
+            elif field in self.categorical:
+                codes, categories = self.categorical[field]
+                np.save(tmp / f"{i}.codes.npy", codes)
+                manifest["categorical"][field] = list(categories)
+            else:
+                offsets, data = _encode_text(self.text[field])
+                np.save(tmp / f"{i}.offsets.npy", offsets)
+                np.save(tmp / f"{i}.data.npy", data)
+                manifest["text"].append(field)
+    
+        with open(tmp / "manifest.json", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+    
+        # Swap in the new version; an old copy (stale source) is moved aside first
+        old = path.with_name(f"{path.name}.old{os.getpid()}")
+        if path.exists():
+            os.rename(path, old)
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            # Another process won the race, its copy is just as good
+            shutil.rmtree(tmp, ignore_errors=True)
+        shutil.rmtree(old, ignore_errors=True)
+    
+    @classmethod
+    def load(cls, path: Path, mmap: bool = True) -> "ColumnarMetadata":
+        """
+        Open a directory written by `save`.
+        With mmap=True columns are memory-mapped: nothing is read until used and
+        worker processes share the pages through the OS cache.
+        """
+        path = Path(path)
+        with open(path / "manifest.json", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != COLUMNS_FORMAT_VERSION:
+            raise ValueError(f"Unsupported metadata columns version in {path}")
+    
+        mmap_mode = "r" if mmap else None
+        store = cls.__new__(cls)
+        store.size = manifest["size"]
+        store.data_type = manifest["data_type"]
+        store.source_mtime = manifest["source_mtime"]
+        store.fields = manifest["fields"]
+        store.numeric, store.categorical, store.text = {}, {}, {}
+        for i, field in enumerate(store.fields):
+            if field in manifest["categorical"]:
+                codes = np.load(path / f"{i}.codes.npy", mmap_mode=mmap_mode)
+                store.categorical[field] = (codes, manifest["categorical"][field])
+            elif field in manifest["numeric"]:
+                store.numeric[field] = np.load(path / f"{i}.npy", mmap_mode=mmap_mode)
+            else:
+                store.text[field] = TextColumn(
+                    np.load(path / f"{i}.offsets.npy", mmap_mode=mmap_mode),
+                    np.load(path / f"{i}.data.npy", mmap_mode=mmap_mode),
+                )
+        store._filter_index = None
+        store._lexical_index = None
+        return store
+    
+    def __len__(self) -> int:
+        return self.size
+    
+    def value(self, row: int, field: str) -> Any:
+        """Single cell as a plain Python value (None if missing)."""
+        if field in self.categorical:
+            codes, categories = self.categorical[field]
+            code = codes[row]
+            return categories[code] if code >= 0 else None
+        if field in self.numeric:
+            value = self.numeric[field][row].item()
+            return None if value != value else value  # NaN -> None
+        if field in self.text:
+            return self.text[field][row]
+        return None
+    
+    def row_dict(self, row: int) -> Dict[str, Any]:
+        """Materialize one row as a fresh dict (skipping missing fields)."""
+        record = {}
+        for field in self.fields:
+            value = self.value(row, field)
+            if value is not None:
+                record[field] = value
+        return record
+    
+    def numeric_values(self, field: str, rows: np.ndarray) -> np.ndarray:
+        """Float values of a numeric field for `rows` in one gather (NaN if missing)."""
+        column = self.numeric.get(field)
+        if column is None:
+            return np.full(len(rows), np.nan)
+        return np.asarray(column[rows], dtype=np.float64)
+    
+    def facet_counts(self, field: str, rows: Optional[np.ndarray] = None) -> Dict[Any, int]:
+        """Value -> number of rows (all rows, or just `rows`) in one bincount over the codes."""
+        if field in self.categorical:
+            codes, categories = self.categorical[field]
+            if rows is not None:
+                codes = codes[rows]
+            counts = np.bincount(codes[codes >= 0], minlength=len(categories))
+            return {categories[code]: int(counts[code]) for code in np.flatnonzero(counts)}
+    
+        counts: Dict[Any, int] = {}
+        for row in (range(self.size) if rows is None else rows.tolist()):
+            value = self.value(row, field)
+            if value is not None:
+                counts[value] = counts.get(value, 0) + 1
+        return counts
+    
+    @property
+    def filter_index(self) -> MetadataIndex:
+        """Inverted (field, value) -> ids index, built on first use."""
+        if self._filter_index is None:
+            self._filter_index = MetadataIndex(self)
+        return self._filter_index
+    
+    @property
+    def lexical_index(self) -> BM25Index:
+        """BM25 index over all string fields, built on first use."""
+        if self._lexical_index is None:
+            self._lexical_index = BM25Index(
+                self, [field for field in self.fields if field not in self.numeric]
+            )
+        return self._lexical_index
+
+
+class TextColumn:
+    """Free-text column as one UTF-8 JSON buffer + offsets, decoded per cell on access."""
+    
+    def __init__(self, offsets: np.ndarray, data: np.ndarray):
+        self.offsets = offsets
+        self.data = data
+    
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+    
+    def __getitem__(self, row: int) -> Any:
+        start, end = self.offsets[row], self.offsets[row + 1]
+        return json.loads(self.data[start:end].tobytes().decode("utf-8"))
+
+
+def _encode_text(values: List[Any]) -> Tuple[np.ndarray, np.ndarray]:
+    encoded = [json.dumps(value, ensure_ascii=False).encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(chunk) for chunk in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+class SearchResult:
+    """
+    Read-only view of one search hit: a row in a ColumnarMetadata plus its score.
+    Supports dict-style reads (result['price'], result.get('gender')).
+    """
+    
+    __slots__ = ("row", "score", "store")
+    
+    def __init__(self, row: int, score: float, store: ColumnarMetadata):
+        object.__setattr__(self, "row", row)
+        object.__setattr__(self, "score", score)
+        object.__setattr__(self, "store", store)
+    
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError("SearchResult is read-only")
+    
+    def __getitem__(self, field: str) -> Any:
+        value = self.store.value(self.row, field)
+        if value is None:
+            raise KeyError(field)
+        return value
+    
+    def get(self, field: str, default: Any = None) -> Any:
+        value = self.store.value(self.row, field)
+        return default if value is None else value
+    
+    def __contains__(self, field: str) -> bool:
+        return self.store.value(self.row, field) is not None
+    
+    def keys(self) -> Iterator[str]:
+        return (field for field in self.store.fields if field in self)
+    
+    def to_dict(self, fields: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Fresh dict of this row (optionally only some fields)."""
+        if fields is None:
+            return self.store.row_dict(self.row)
+        return {field: self.get(field) for field in fields if field in self}
+    
+    def __repr__(self) -> str:
+        return f"SearchResult(row={self.row}, score={self.score:.4f})"
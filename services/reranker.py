@@ -0,0 +1,100 @@
+"""Local cross-encoder reranker for search candidates"""
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from core.config import settings
+from .metadata_store import SearchResult
+
+
+class CrossEncoderReranker:
+    """
+    Re-orders retrieved candidates with a small local cross-encoder.
+
+    (query, candidate text) pairs are scored in batches of settings.RERANK_BATCH_SIZE.
+    If scoring runs past settings.RERANK_BUDGET_MS before every batch is done,
+    the candidates keep their retrieval order, so a slow CPU costs ranking
+    quality but never more than about one batch of extra latency.
+    """
+
+    def __init__(self, model_name: str = settings.RERANK_MODEL):
+        self.model_name = model_name
+        self.batch_size = settings.RERANK_BATCH_SIZE
+        self.budget = settings.RERANK_BUDGET_MS / 1000.0
+        self._model = None
+        self._available = True
+        self._load_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "fallbacks": 0, "pairs": 0, "total_ms": 0.0, "last_ms": 0.0}
+
+    def _load(self):
+        """Load the cross-encoder on first use; None if it can't be loaded."""
+        if self._model is not None or not self._available:
+            return self._model
+        with self._load_lock:
+            if self._model is None and self._available:
+                try:
+                    from sentence_transformers import CrossEncoder
+                    self._model = CrossEncoder(self.model_name)
+                except (ImportError, OSError) as e:
+                    print(f"Reranker disabled, could not load {self.model_name}: {e}")
+                    self._available = False
+        return self._model
+
+    def rerank(
+        self,
+        query: str,
+        results: Sequence[SearchResult],
+        top_n: int,
+        text_field: str
+    ) -> List[SearchResult]:
+        """Top n of `results` by cross-encoder score (retrieval order if over budget)."""
+        results = list(results)
+        model = self._load()
+        if model is None or len(results) <= 1:
+            return results[:top_n]
+
+        started = time.perf_counter()
+        pairs = [(query, str(hit.get(text_field, ""))) for hit in results]
+        scores: List[float] = []
+        for start in range(0, len(pairs), self.batch_size):
+            if scores and time.perf_counter() - started > self.budget:
+                break
+            batch = pairs[start:start + self.batch_size]
+            scores.extend(float(score) for score in model.predict(batch, batch_size=len(batch)))
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        fallback = len(scores) < len(results)
+        self._record(len(scores), elapsed_ms, fallback)
+        if fallback:
+            return results[:top_n]
+        order = sorted(range(len(results)), key=lambda i: -scores[i])
+        return [results[i] for i in order[:top_n]]
+
+    def _record(self, pairs: int, elapsed_ms: float, fallback: bool):
+        with self._lock:
+            self._stats["calls"] += 1
+            self._stats["pairs"] += pairs
+            self._stats["total_ms"] += elapsed_ms
+            self._stats["last_ms"] = elapsed_ms
+            if fallback:
+                self._stats["fallbacks"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Rerank calls, over-budget fallbacks, pairs scored and timings (ms)."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["mean_ms"] = stats["total_ms"] / stats["calls"] if stats["calls"] else 0.0
+        stats["available"] = self._available
+        return stats
+
+
+_reranker: Optional[CrossEncoderReranker] = None
+
+
+def get_reranker() -> CrossEncoderReranker:
+    """Get or create CrossEncoderReranker singleton."""
+    global _reranker
+    if _reranker is None:
+        _reranker = CrossEncoderReranker()
+    return _reranker
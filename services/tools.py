@@ -1,38 +1,101 @@
 """Search tools for FAQ and Products."""
-from typing import List, Dict, Any, Optional
+import asyncio
+import functools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+
+import faiss
+import numpy as np
+from langchain_core.tools import StructuredTool
 
 from core.config import settings
-from .vector_store import get_vector_store
+from .batcher import MicroBatcher
+from .cache import TTLCache
+from .metadata_index import Range, filter_value_key
+from .metadata_store import SearchResult
+from .reranker import get_reranker
+from .vector_store import VectorStore, get_vector_store
+
+
+# Query caches shared by every tool call.
+# Cached search hits are immutable SearchResult views, so they are shared as-is;
+# they are invalidated whenever the VectorStore reloads its indices.
+_embedding_cache = TTLCache(settings.EMBEDDING_CACHE_SIZE, settings.CACHE_TTL_SECONDS)
+_search_cache = TTLCache(settings.SEARCH_CACHE_SIZE, settings.CACHE_TTL_SECONDS)
+_cache_store: Optional[VectorStore] = None
+
+# Bounded pool for CPU-bound embedding/FAISS work behind the async tools
+_search_executor = ThreadPoolExecutor(
+    max_workers=settings.SEARCH_THREAD_POOL_SIZE,
+    thread_name_prefix="search"
+)
 
+# Micro-batchers feeding the search worker processes (see start_search_workers)
+_batchers: Dict[str, MicroBatcher] = {}
 
-def search_faq_tool(query: str) -> List[Dict[str, Any]]:
+
+def search_faq_tool(query: str, mode: Optional[str] = None) -> List[Dict[str, Any]]:
     """
     Search FAQ knowledge base.
     
     Args:
         query: User's question
-        
+        mode: Retrieval mode - 'vector' (meaning, default), 'hybrid' (keywords + meaning) or 'lexical'
+    
     Returns:
         List of FAQ entries with questions and answers
     """
-    vector_store = get_vector_store()
+    return _search("faq", (query, mode))
+
+
+async def asearch_faq_tool(query: str, mode: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Async search_faq_tool: runs the search on the search workers or the bounded thread pool."""
+    return await _asearch("faq", (query, mode))
+
+
+def search_faq_batch(queries: List[str], mode: Optional[str] = None) -> List[List[Dict[str, Any]]]:
+    """
+    Batched search_faq_tool: embed and search all queries in one pass.
     
-    # Embed query
-    query_vec = vector_store.embed_query(query)
+    Args:
+        queries: User questions
+        mode: Retrieval mode (default settings.SEARCH_MODE)
     
-    # Search
-    distances, results = vector_store.search(
-        vector_store.faq_index,
-        vector_store.faq_metadata,
-        query_vec,
-        k=settings.FAQ_SEARCH_K
-    )
+    Returns:
+        One list of FAQ entries per query, in input order
+    """
+    vector_store = _get_store()
+    mode = mode or settings.SEARCH_MODE
+    
+    keys = [("faq", mode, _normalize_query(query)) for query in queries]
+    batch_hits: List[Optional[Tuple[SearchResult, ...]]] = [
+        _search_cache.get(key) for key in keys
+    ]
+    misses = [row for row, hits in enumerate(batch_hits) if hits is None]
+    
+    if misses:
+        # Embed all uncached queries at once
+        miss_queries = [queries[row] for row in misses]
+        query_matrix = embed_queries(vector_store, miss_queries, mode)
     
-    # Add similarity scores
-    for i, result in enumerate(results):
-        result['similarity_score'] = float(distances[i])
+        # Search (deeper when a reranker picks the final top k)
+        outputs = vector_store.hybrid_search_batch(
+            vector_store.faq_index,
+            vector_store.faq_metadata,
+            query_matrix,
+            miss_queries,
+            k=_rerank_depth(settings.FAQ_SEARCH_K),
+            mode=mode
+        )
     
-    return results
+        for row, (_, results) in zip(misses, outputs):
+            batch_hits[row] = tuple(_rerank(queries[row], results, settings.FAQ_SEARCH_K, "faq"))
+            _search_cache.set(keys[row], batch_hits[row])
+    
+    # Every caller gets its own dicts, with the similarity score added
+    return [[_result_payload(hit) for hit in hits] for hits in batch_hits]
 
 
 def search_products_tool(
@@ -42,7 +105,11 @@ def search_products_tool(
     baseColour: Optional[str] = None,
     usage: Optional[str] = None,
     season: Optional[str] = None,
-    k: int = 8
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    sort: Optional[str] = None,
+    k: int = 8,
+    mode: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Search product catalog with metadata filters.
@@ -55,68 +122,365 @@ def search_products_tool(
         baseColour: Color filter (e.g., 'Blue', 'Red', 'Black')
         usage: Usage filter (e.g., 'Casual', 'Formal', 'Sports')
         season: Season filter (e.g., 'Summer', 'Winter')
+        min_price: Only products costing at least this much
+        max_price: Only products costing at most this much (e.g., 40 for "under $40")
+        sort: Result order - 'relevance' (default), 'price_asc' (cheapest first) or 'price_desc'
         k: Number of results to return (default 8)
-        
+        mode: Retrieval mode - 'vector' (meaning, default), 'hybrid' (keywords + meaning) or 'lexical'.
+              Use 'lexical' for exact brand names or product codes.
+    
     Returns:
         Dict with count, results, and optional available_filters
-        
+    
     Example:
-        search_products_tool(query="blue shirts", gender="Men", usage="Casual")
+        search_products_tool(query="blue shirts", gender="Men", usage="Casual", max_price=40)
     """
-    vector_store = get_vector_store()
+    return _search("products", dict(
+        query=query,
+        articleType=articleType,
+        gender=gender,
+        baseColour=baseColour,
+        usage=usage,
+        season=season,
+        min_price=min_price,
+        max_price=max_price,
+        sort=sort,
+        k=k,
+        mode=mode,
+    ))
+
+
+async def asearch_products_tool(
+    query: str = "general product search",
+    articleType: Optional[str] = None,
+    gender: Optional[str] = None,
+    baseColour: Optional[str] = None,
+    usage: Optional[str] = None,
+    season: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    sort: Optional[str] = None,
+    k: int = 8,
+    mode: Optional[str] = None
+) -> Dict[str, Any]:
+    """Async search_products_tool: runs the search on the search workers or the bounded thread pool."""
+    return await _asearch("products", dict(
+        query=query,
+        articleType=articleType,
+        gender=gender,
+        baseColour=baseColour,
+        usage=usage,
+        season=season,
+        min_price=min_price,
+        max_price=max_price,
+        sort=sort,
+        k=k,
+        mode=mode,
+    ))
+
+
+def search_products_batch(requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Batched search_products_tool for coalescing concurrent requests.
     
-    # Embed query
-    query_vec = vector_store.embed_query(query)
+    Args:
+        requests: One dict of search_products_tool keyword arguments per search
     
-    # Build filters (exclude None values)
-    filters = {}
-    if articleType: filters['articleType'] = articleType
-    if gender: filters['gender'] = gender
-    if baseColour: filters['baseColour'] = baseColour
-    if usage: filters['usage'] = usage
-    if season: filters['season'] = season
-    
-    # Search with post-filtering
-    distances, results = vector_store.search(
-        vector_store.product_index,
-        vector_store.product_metadata,
-        query_vec,
-        k=k,
-        filters=filters if filters else None
+    Returns:
+        One search_products_tool response per request, in input order
+    """
+    vector_store = _get_store()
+    if not requests:
+        return []
+    
+    requests = [{"query": "general product search", "k": 8, **request} for request in requests]
+    for request in requests:
+        request["mode"] = request.get("mode") or settings.SEARCH_MODE
+        request["sort"] = request.get("sort") or "relevance"
+    
+    keys = [
+        (
+            "products",
+            request["mode"],
+            _normalize_query(request["query"]),
+            _filters_key(_build_filters(request)),
+            request["k"],
+            request["sort"],
+        )
+        for request in requests
+    ]
+    batch_hits: List[Optional[Tuple]] = [_search_cache.get(key) for key in keys]
+    misses = [row for row, hits in enumerate(batch_hits) if hits is None]
+    
+    if misses:
+        # Embed all uncached queries at once (lexical-only searches need no vectors)
+        needs_vectors = any(requests[row]["mode"] != "lexical" for row in misses)
+        query_matrix = embed_queries(
+            vector_store, [requests[row]["query"] for row in misses],
+            "vector" if needs_vectors else "lexical"
+        )
+    
+        # Search each (k, mode, sort) separately so every query gets exactly its own top-k
+        rows_by_group: Dict[Tuple[int, str, str], List[int]] = {}
+        for position, row in enumerate(misses):
+            request = requests[row]
+            rows_by_group.setdefault((request["k"], request["mode"], request["sort"]), []).append(position)
+    
+        for (k, mode, sort), positions in rows_by_group.items():
+            # Search with metadata pre-filtering
+            outputs = vector_store.search_products_batch(
+                query_matrix[positions] if query_matrix is not None else None,
+                k=_rerank_depth(k) if sort == "relevance" else k,
+                filters_per_query=[_build_filters(requests[misses[p]]) for p in positions],
+                queries=[requests[misses[p]]["query"] for p in positions],
+                mode=mode,
+                sort=sort,
+                lambda_mult=settings.MMR_LAMBDA if settings.PRODUCT_DIVERSIFY else None
+            )
+            for position, (_, results) in zip(positions, outputs):
+                row = misses[position]
+                if sort == "relevance":
+                    results = _rerank(requests[row]["query"], results, k, "products")
+                batch_hits[row] = (
+                    tuple(results),
+                    _suggest_filters(vector_store, requests[row], results),
+                )
+                _search_cache.set(keys[row], batch_hits[row])
+    
+    return [
+        _format_product_response(request, results, available_filters)
+        for request, (results, available_filters) in zip(requests, batch_hits)
+    ]
+
+
+def start_search_workers(workers: int = settings.SEARCH_WORKERS) -> None:
+    """
+    Serve the search tools from `workers` processes.
+    Each worker opens the (memory-mapped) indices itself, so pages are shared
+    through the OS cache. Concurrent tool calls in this process are coalesced
+    into micro-batches (settings.SEARCH_BATCH_WINDOW_MS) before they are sent.
+    """
+    if _batchers or workers <= 0:
+        return
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_search_worker,
+    )
+    # Start (and warm) every worker now rather than on the first searches
+    for _ in range(workers):
+        executor.submit(os.getpid)
+    for kind, batch_fn in (("products", search_products_batch), ("faq", _faq_batch)):
+        _batchers[kind] = MicroBatcher(
+            batch_fn,
+            executor,
+            window_ms=settings.SEARCH_BATCH_WINDOW_MS,
+            max_batch=settings.SEARCH_MAX_BATCH,
+            max_pending=settings.SEARCH_MAX_PENDING,
+            name=f"{kind}-batcher",
+        )
+
+
+def get_batcher_stats() -> Dict[str, Dict[str, Any]]:
+    """Micro-batching counters per search kind (empty when searching in-process)."""
+    return {kind: batcher.stats() for kind, batcher in _batchers.items()}
+
+
+def get_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Hit/miss/eviction counters for the embedding and search caches."""
+    return {
+        "embeddings": _embedding_cache.stats(),
+        "search": _search_cache.stats(),
+    }
+
+
+def get_rerank_stats() -> Dict[str, Any]:
+    """Reranker calls, over-budget fallbacks and timings (empty when reranking is off)."""
+    return get_reranker().stats() if settings.RERANK else {}
+
+
+def clear_caches():
+    """Drop all cached embeddings and search results."""
+    _embedding_cache.clear()
+    _search_cache.clear()
+
+
+async def run_in_search_pool(func, *args, **kwargs):
+    """Run blocking embedding/search work on the bounded pool, without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _search_executor, functools.partial(func, *args, **kwargs)
     )
+
+
+def _search(kind: str, item: Any) -> Any:
+    """One search, through the micro-batcher when search workers are running."""
+    batcher = _batchers.get(kind)
+    if batcher is not None:
+        return batcher.submit(item).result()
+    return _BATCH_FUNCTIONS[kind]([item])[0]
+
+
+async def _asearch(kind: str, item: Any) -> Any:
+    """Async _search, without blocking the event loop."""
+    batcher = _batchers.get(kind)
+    if batcher is not None:
+        return await asyncio.wrap_future(batcher.submit(item))
+    return await run_in_search_pool(_search, kind, item)
+
+
+def _faq_batch(items: List[Tuple[str, Optional[str]]]) -> List[List[Dict[str, Any]]]:
+    """search_faq_batch over (query, mode) items, one batch per mode."""
+    outputs: List[Optional[List[Dict[str, Any]]]] = [None] * len(items)
+    rows_by_mode: Dict[Optional[str], List[int]] = {}
+    for row, (_, mode) in enumerate(items):
+        rows_by_mode.setdefault(mode, []).append(row)
+    for mode, rows in rows_by_mode.items():
+        for row, entries in zip(rows, search_faq_batch([items[row][0] for row in rows], mode)):
+            outputs[row] = entries
+    return outputs
+
+
+_BATCH_FUNCTIONS = {"products": search_products_batch, "faq": _faq_batch}
+
+
+def _init_search_worker():
+    """Search worker start-up: one compute thread each (the workers are the parallelism), warm the model."""
+    faiss.omp_set_num_threads(settings.SEARCH_WORKER_THREADS)
+    try:
+        import torch
+        torch.set_num_threads(settings.SEARCH_WORKER_THREADS)
+    except ImportError:
+        pass
+    _get_store().embedding_model
+
+
+def _get_store() -> VectorStore:
+    """Get the VectorStore, hooking cache invalidation into its reloads."""
+    global _cache_store
+    vector_store = get_vector_store()
+    if vector_store is not _cache_store:
+        # Catalog updates only drop cached product searches
+        for kind, store in (("faq", "faq"), ("products", "products")):
+            vector_store.add_reload_listener(functools.partial(_clear_search_cache, kind), stores=(store,))
+        _search_cache.clear()
+        _cache_store = vector_store
+    return vector_store
+
+
+def _clear_search_cache(kind: str):
+    """Drop the cached searches of one kind ("faq" or "products")."""
+    _search_cache.discard(lambda key: key[0] == kind)
+
+
+def _normalize_query(query: str) -> str:
+    """Cache key form of a query: lowercased, whitespace collapsed."""
+    return " ".join(query.lower().split())
+
+
+def _filters_key(filters: Optional[Dict[str, Any]]) -> Tuple:
+    """Hashable, order-independent form of a filter dict."""
+    return tuple(sorted(
+        (field, filter_value_key(value)) for field, value in (filters or {}).items()
+    ))
+
+
+def embed_queries(
+    vector_store: VectorStore,
+    queries: List[str],
+    mode: str = "vector"
+) -> Optional[np.ndarray]:
+    """
+    Embed queries through the shared query-embedding cache, encoding only the
+    misses (None in lexical mode). Used by every component that embeds user text.
+    """
+    if mode == "lexical":
+        return None
+    texts = [_normalize_query(query) for query in queries]
+    vectors: List[Optional[np.ndarray]] = [_embedding_cache.get(text) for text in texts]
     
-    # Add similarity scores
-    for i, result in enumerate(results):
-        result['similarity_score'] = float(distances[i]) if i < len(distances) else 0.0
+    missing = [row for row, vector in enumerate(vectors) if vector is None]
+    if missing:
+        encoded = vector_store.embed_queries([texts[row] for row in missing])
+        for row, vector in zip(missing, encoded):
+            _embedding_cache.set(texts[row], vector)
+            vectors[row] = vector
     
-    # Adaptive result handling
-    count = len(results)
-    
-    # Analyze missing filters from results
-    available_filters = {}
-    if count >= 10 and results:  # Only if we have many results
-        if not gender:
-            genders = list(set([r.get('gender') for r in results[:20] if r.get('gender')]))
-            if len(genders) > 1:
-                available_filters['gender'] = genders
-        
-        if not baseColour:
-            colors = list(set([r.get('baseColour') for r in results[:20] if r.get('baseColour')]))
-            if len(colors) > 3:
-                available_filters['baseColour'] = colors[:5]  # Top 5 colors
-        
-        if not usage:
-            usages = list(set([r.get('usage') for r in results[:20] if r.get('usage')]))
-            if len(usages) > 1:
-                available_filters['usage'] = usages
+    return np.array(vectors, dtype=np.float32).reshape(len(texts), -1)
+
+
+def _build_filters(request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Build filters from search arguments (exclude None values, prices become a Range)."""
+    filters = {}
+    for key in ("articleType", "gender", "baseColour", "usage", "season"):
+        if request.get(key):
+            filters[key] = request[key]
+    if request.get("min_price") is not None or request.get("max_price") is not None:
+        filters["price"] = Range(request.get("min_price"), request.get("max_price"))
+    return filters if filters else None
+
+
+def _rerank_depth(k: int) -> int:
+    """Candidates to retrieve for a final top k (more when reranking)."""
+    return max(k, settings.RERANK_CANDIDATES) if settings.RERANK else k
+
+
+def _rerank(query: str, results: List[SearchResult], k: int, kind: str) -> List[SearchResult]:
+    """Top k hits, re-ordered by the cross-encoder when settings.RERANK is on."""
+    if not settings.RERANK:
+        return list(results[:k])
+    return get_reranker().rerank(query, results, k, settings.RERANK_TEXT_FIELDS[kind])
+
+
+def _result_payload(result: SearchResult) -> Dict[str, Any]:
+    """Fresh dict for one hit; the score travels separately on the result."""
+    payload = result.to_dict()
+    payload['similarity_score'] = result.score
+    return payload
+
+
+def _suggest_filters(
+    vector_store: VectorStore,
+    request: Dict[str, Any],
+    results: List[SearchResult]
+) -> Dict[str, Dict[str, int]]:
+    """
+    Suggest narrowing filters the user has not set yet: value counts over every
+    product matching the current filters, for fields with more than one value.
+    Only when there are more matches than we show.
+    """
+    filters = _build_filters(request)
+    unset = [field for field in settings.FACET_FIELDS if not (filters or {}).get(field)]
+    total, facets = vector_store.product_facets(filters, unset)
+    if total <= len(results):
+        return {}
+    return {field: counts for field, counts in facets.items() if len(counts) > 1}
+
+
+def _format_product_response(
+    request: Dict[str, Any],
+    results: Tuple[SearchResult, ...],
+    available_filters: Dict[str, Dict[str, int]]
+) -> Dict[str, Any]:
+    """Shape search hits into a fresh search_products_tool response."""
+    k = request["k"]
     
+    # Adaptive result handling
     return {
-        "count": count,
-        "results": results[:k],  # Return top k
-        "available_filters": available_filters if available_filters else None
+        "count": len(results),
+        "results": [_result_payload(result) for result in results[:k]],  # Return top k
+        "available_filters": {
+            field: dict(counts) for field, counts in available_filters.items()
+        } if available_filters else None
     }
 
 
-def get_tools():
-    """Get list of all search tools."""
-    return [search_faq_tool, search_products_tool]
+def get_tools(kind: Optional[str] = None):
+    """Get list of search tools (sync and async entry points): all, or only "faq" / "products"."""
+    tools = {
+        "faq": StructuredTool.from_function(search_faq_tool, coroutine=asearch_faq_tool),
+        "products": StructuredTool.from_function(search_products_tool, coroutine=asearch_products_tool),
+    }
+    if kind is None:
+        return list(tools.values())
+    return [tools[kind]]
@@ -1,121 +1,944 @@
 """Vector store management for FAISS indices"""
+import math
+import os
 import sys
+import threading
+import time
 import numpy as np
 import joblib
 import faiss
 from sentence_transformers import SentenceTransformer
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from core.config import settings
+from .metadata_store import ColumnarMetadata, SearchResult
+from .catalog_updates import (
+    DeltaLog, DeltaSegment, FileLock, ProductSegments,
+    base_files, manifest_path, merge_segments, switch_base, write_base_version,
+)
+from .lexical_index import CorpusStats, reciprocal_rank_fusion
+from .facets import candidate_rows, count_facets
+from .metadata_index import Range, filter_value_key
+from .diversify import dedup_positions, mmr
+from .encoders import load_encoder, recorded_compatibility
+
+
+# What reload listeners can watch: every reload touches both, catalog updates only products
+STORES = ("faq", "products")
+
+SEARCH_MODES = ("hybrid", "vector", "lexical")
+
+# Result orders: relevance, or (numeric field, descending). A sorted search with
+# filters is exact over every matching product (see sort_filters); without filters
+# it re-orders the settings.SORT_CANDIDATES most relevant hits.
+SORT_ORDERS: Dict[str, Optional[Tuple[str, bool]]] = {
+    "relevance": None,
+    "price_asc": ("price", False),
+    "price_desc": ("price", True),
+}
 
 
 class VectorStore:
-    """Manages FAISS vector stores for FAQ and Products"""
+    """
+    Manages FAISS vector stores for FAQ and Products
+    
+    With settings.LAZY_LOAD the embedding model, indices and metadata are loaded
+    on first use. With settings.INDEX_MMAP indices and metadata columns are
+    memory-mapped, so worker processes share pages through the OS cache.
+    """
     
     def __init__(self):
         print("Loading vector stores...")
-        
-        # Initialize embedding model
-        self.embedding_model = SentenceTransformer(settings.EMBEDDING_MODEL)
-        
-        # Load FAQ and Product indices
-        self.faq_index = faiss.read_index(str(settings.FAQ_INDEX_PATH))
-        self.faq_metadata = joblib.load(str(settings.FAQ_METADATA_PATH))
-        print(f"FAQ store loaded: {self.faq_index.ntotal} vectors")
-        
-        self.product_index = faiss.read_index(str(settings.PRODUCT_INDEX_PATH))
-        self.product_metadata = joblib.load(str(settings.PRODUCT_METADATA_PATH))
-        print(f"Product store loaded: {self.product_index.ntotal} vectors")
+        started = time.perf_counter()
+    
+        self._lock = threading.RLock()
+        self._components: Dict[str, Any] = {}
+        self.load_times: Dict[str, float] = {}
+    
+        # Callbacks run after indices are (re)loaded or updated, e.g. cache invalidation
+        self._reload_listeners: List[Tuple[Callable[[], None], Tuple[str, ...]]] = []
+    
+        # Incremental catalog updates: serialized writers, one merge at a time, across
+        # threads and processes (server workers each have their own VectorStore)
+        log_path = settings.PRODUCT_DELTA_LOG_PATH
+        self._delta_log = DeltaLog(log_path)
+        self._update_lock = FileLock(log_path.with_name(log_path.name + ".lock"))
+        self._merge_lock = FileLock(log_path.with_name(log_path.name + ".merge.lock"))
+        self._merge_thread: Optional[threading.Thread] = None
+        self._merge_wakeup = threading.Event()
+        # What the loaded product segments reflect: (manifest inode, log inode, log offset)
+        self._disk_state: Optional[Tuple] = None
+    
+        if not settings.LAZY_LOAD:
+            self._load_indices()
+    
+        self.load_times["startup"] = time.perf_counter() - started
+        print(
+            f"Vector stores ready in {self.load_times['startup'] * 1000:.0f} ms "
+            f"(lazy={settings.LAZY_LOAD}, mmap={settings.INDEX_MMAP}, "
+            f"RSS {rss_mb():.0f} MB, private {rss_mb(private=True):.0f} MB)"
+        )
+    
+    # Components, loaded on first access (or all at once by _load_indices)
+    embedding_model = property(lambda self: self._component("embedding_model"))
+    faq_index = property(lambda self: self._component("faq_index"))
+    faq_metadata = property(lambda self: self._component("faq_metadata"))
+    product_segments = property(lambda self: self._component("product_segments"))
+    # Base product index/metadata (without pending updates, see search_products_batch)
+    product_index = property(lambda self: self.product_segments.index)
+    product_metadata = property(lambda self: self.product_segments.metadata)
+    
+    def _component(self, name: str) -> Any:
+        component = self._components.get(name)
+        if component is not None:
+            return component
+        with self._lock:
+            if name not in self._components:
+                started = time.perf_counter()
+                self._components[name] = getattr(self, f"_load_{name}")()
+                self.load_times[name] = time.perf_counter() - started
+            return self._components[name]
+    
+    def _load_embedding_model(self) -> SentenceTransformer:
+        """
+        Encoder on settings.EMBEDDING_BACKEND if `python -m services.encoders --check`
+        recorded that its vectors match the torch encoder's, else the torch encoder.
+        Only one model is loaded.
+        """
+        backend = settings.EMBEDDING_BACKEND
+        if backend != "torch":
+            # The indices were embedded by torch: the backend must reproduce its vectors
+            cosine = recorded_compatibility(settings.EMBEDDING_MODEL, backend)
+            if cosine is None:
+                print(f"{backend} not checked against torch (python -m services.encoders --check), using torch")
+                backend = "torch"
+            elif cosine < settings.EMBEDDING_MIN_COSINE:
+                print(f"{backend} embeddings differ from torch (mean cosine {cosine:.3f}), using torch")
+                backend = "torch"
+            else:
+                print(f"Embedding backend: {backend} (mean cosine to torch {cosine:.4f})")
+        return load_encoder(settings.EMBEDDING_MODEL, backend)
+    
+    def _load_faq_index(self) -> faiss.Index:
+        index = self._read_index(settings.FAQ_INDEX_PATH)
+        print(f"FAQ store loaded: {index.ntotal} vectors")
+        return index
+    
+    def _load_faq_metadata(self) -> ColumnarMetadata:
+        return self._load_metadata(settings.FAQ_METADATA_PATH, settings.FAQ_COLUMNS_PATH)
+    
+    def _load_product_segments(self) -> ProductSegments:
+        """Current base product index + metadata, with logged updates replayed on top"""
+        # A merge elsewhere switches manifest and log one after the other: read again
+        # until neither changed meanwhile, so base and log belong together
+        while True:
+            files_state = self._disk_state_now()[:2]
+            files = base_files(settings.PRODUCT_INDEX_PATH, settings.PRODUCT_METADATA_PATH)
+            ops, offset = self._delta_log.read_from(0)
+            if self._disk_state_now()[:2] == files_state:
+                break
+    
+        columns_path = settings.PRODUCT_COLUMNS_PATH if files.version == 0 else files.metadata.with_suffix(".columns")
+        index = self._read_index(files.index)
+        metadata = self._load_metadata(files.metadata, columns_path)
+        if index.ntotal != metadata.size:
+            raise ValueError(
+                f"{files.index.name} has {index.ntotal} vectors but "
+                f"{files.metadata.name} has {metadata.size} rows"
+            )
+        delta = DeltaSegment(metadata, index.d).apply(ops)
+        self._disk_state = files_state + (offset,)
+        print(f"Product store loaded: {index.ntotal} vectors (+{len(delta.live)} updated, -{delta.tombstones.size} replaced/removed)")
+        if delta.changed:
+            self._start_merge_thread()
+        return ProductSegments(index, metadata, delta)
+    
+    def _load_indices(self):
+        """Load the embedding model, FAQ and Product indices plus their metadata"""
+        for name in ("embedding_model", "faq_index", "faq_metadata", "product_segments"):
+            self._component(name)
+    
+        # Build the inverted filter index (value -> ids) up front
+        self.product_metadata.filter_index
+    
+    def _read_index(self, path) -> faiss.Index:
+        """Read a FAISS index, memory-mapped if settings.INDEX_MMAP"""
+        if settings.INDEX_MMAP:
+            # IO_FLAG_MMAP_IFC (newer faiss) maps flat codes as well as inverted lists;
+            # the two flags can't be combined
+            flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+            index = faiss.read_index(str(path), flags)
+        else:
+            index = faiss.read_index(str(path))
+        apply_search_params(index, settings.IVF_NPROBE, settings.HNSW_EF_SEARCH)
+        return index
+    
+    def _load_metadata(self, path, columns_path) -> ColumnarMetadata:
+        """
+        Load metadata into a columnar, read-only store.
+        With settings.INDEX_MMAP the pickle is converted once to an mmap-able
+        columns directory next to it, rebuilt whenever the pickle changes.
+        """
+        if not settings.INDEX_MMAP:
+            return ColumnarMetadata.from_metadata(joblib.load(str(path)), settings.FILTER_FIELDS)
+    
+        source_mtime = path.stat().st_mtime if path.exists() else None
+        if columns_path.exists():
+            metadata = ColumnarMetadata.load(columns_path)
+            if source_mtime is None or metadata.source_mtime == source_mtime:
+                return metadata
+    
+        print(f"Converting {path.name} to columns...")
+        ColumnarMetadata.from_metadata(
+            joblib.load(str(path)), settings.FILTER_FIELDS
+        ).save(columns_path, source_mtime)
+        return ColumnarMetadata.load(columns_path)
+    
+    def reload(self):
+        """Re-read indices from disk and notify reload listeners"""
+        print("Reloading vector stores...")
+        with self._lock:
+            # Keep the embedding model, drop everything read from the indices dir
+            embedding_model = self._components.get("embedding_model")
+            self._components = {}
+            if embedding_model is not None:
+                self._components["embedding_model"] = embedding_model
+            if not settings.LAZY_LOAD:
+                self._load_indices()
+        self._notify_listeners()
+    
+    def add_reload_listener(self, listener: Callable[[], None], stores: Tuple[str, ...] = STORES):
+        """
+        Register a callback to run whenever indices are reloaded or updated
+        stores: only run it when one of these (see STORES) changed, e.g. ("faq",)
+                to ignore product catalog updates
+        """
+        self._reload_listeners.append((listener, tuple(stores)))
+    
+    def _notify_listeners(self, store: Optional[str] = None):
+        """Run the listeners of `store` (all of them when None)"""
+        for listener, stores in self._reload_listeners:
+            if store is None or store in stores:
+                listener()
+    
+    # ---- incremental catalog updates ------------------------------------
+    
+    def upsert_products(
+        self,
+        records: List[Dict[str, Any]],
+        vectors: Optional[np.ndarray] = None
+    ) -> int:
+        """
+        Add or replace products (matched by product_id) without a rebuild.
+        Without `vectors`, products are embedded like the index builder does;
+        a product whose text did not change (e.g. a price update) keeps its vector.
+        Returns the number of products written.
+        """
+        if not records:
+            return 0
+        if any("product_id" not in record for record in records):
+            raise ValueError("Every product needs a product_id")
+    
+        with self._update_lock:
+            segments = self._sync_segments()
+            if vectors is None:
+                vectors = self._product_vectors(segments, records)
+            ops = [("upsert", dict(record), vector) for record, vector in zip(records, vectors)]
+            self._apply_ops(segments, ops)
+        return len(ops)
+    
+    def delete_products(self, product_ids: List[Any]) -> int:
+        """Remove products from search results. Returns how many were in the catalog."""
+        with self._update_lock:
+            segments = self._sync_segments()
+            ops = [("delete", pid, None) for pid in product_ids if segments.delta.contains(pid)]
+            if ops:
+                self._apply_ops(segments, ops)
+        return len(ops)
+    
+    def _apply_ops(self, segments: ProductSegments, ops: list):
+        """Log ops, then swap in a new delta segment (callers hold _update_lock and have synced)"""
+        self._delta_log.append(ops)
+        self._swap_delta(segments, ops)
+        # Nobody else appends while we hold the lock
+        self._disk_state = self._disk_state_now()
+        self._start_merge_thread()
+        if len(self.product_segments.delta.live) >= settings.DELTA_MERGE_MAX_ROWS:
+            self._merge_wakeup.set()
+    
+    def _swap_delta(self, segments: ProductSegments, ops: list):
+        self._components["product_segments"] = segments._replace(delta=segments.delta.apply(ops))
+        self._notify_listeners("products")
+    
+    def _current_segments(self) -> ProductSegments:
+        """Product segments, after catching up with updates and merges of other processes"""
+        segments = self.product_segments
+        if self._disk_state != self._disk_state_now():
+            with self._update_lock:
+                segments = self._sync_segments()
+        return segments
+    
+    def _disk_state_now(self) -> Tuple:
+        log = self._delta_log.identity()
+        return (
+            _inode(manifest_path(settings.PRODUCT_INDEX_PATH)),
+            None if log is None else log[0],
+            0 if log is None else log[1],
+        )
+    
+    def _sync_segments(self) -> ProductSegments:
+        """
+        Bring the product segments up to date with the files (callers hold _update_lock):
+        ops other processes appended to the log are applied; a merge elsewhere
+        (new manifest or rewritten log) reloads the segments.
+        """
+        segments = self.product_segments
+        manifest_inode, log_inode, log_size = self._disk_state_now()
+        loaded_manifest, loaded_log, offset = self._disk_state
+        log_replaced = loaded_log is not None and log_inode != loaded_log
+        if manifest_inode != loaded_manifest or log_replaced or log_size < offset:
+            segments = self._load_product_segments()
+            self._components["product_segments"] = segments
+            self._notify_listeners("products")
+        elif log_size > offset:
+            ops, offset = self._delta_log.read_from(offset)
+            if ops:
+                self._swap_delta(segments, ops)
+                segments = self.product_segments
+            self._disk_state = (loaded_manifest, log_inode, offset)
+        return segments
+    
+    def _product_vectors(self, segments: ProductSegments, records: List[Dict[str, Any]]) -> np.ndarray:
+        """Embeddings for upserted products, reusing vectors of unchanged text"""
+        from .index_builder import PRODUCT_TEXT_FIELDS, embed_texts, record_text
+    
+        vectors = np.zeros((len(records), segments.index.d), dtype=np.float32)
+        to_embed = []
+        for row, record in enumerate(records):
+            vector = self._current_vector(segments, record, PRODUCT_TEXT_FIELDS, record_text)
+            if vector is None:
+                to_embed.append(row)
+            else:
+                vectors[row] = vector
+    
+        if to_embed:
+            texts = [record_text(records[row], PRODUCT_TEXT_FIELDS) for row in to_embed]
+            vectors[to_embed] = embed_texts(self.embedding_model, texts, batch_size=64)
+        return vectors
+    
+    def _current_vector(self, segments, record, text_fields, record_text) -> Optional[np.ndarray]:
+        product_id = record["product_id"]
+        current = segments.delta.record(product_id)
+        if current is None or record_text(current, text_fields) != record_text(record, text_fields):
+            return None
+        vector = segments.delta.delta_vector(product_id)
+        if vector is not None:
+            return vector
+        try:
+            return segments.index.reconstruct(segments.delta.base_rows[product_id])
+        except RuntimeError:
+            # e.g. IVF without a direct map: just embed again
+            return None
+    
+    def merge_delta(self) -> bool:
+        """
+        Fold pending updates into a new base index and metadata on disk, then swap it in.
+        Searches and updates keep running on the old segments meanwhile. One merge
+        runs at a time across processes; returns False if another one is running
+        or there was nothing to merge.
+        """
+        if not self._merge_lock.acquire(blocking=False):
+            return False
+        try:
+            with self._update_lock:
+                segments = self._sync_segments()
+                log_offset = self._disk_state[2]
+            if not segments.delta.changed:
+                return False
+    
+            started = time.perf_counter()
+            index, records = merge_segments(segments)
+            files = write_base_version(
+                settings.PRODUCT_INDEX_PATH, settings.PRODUCT_METADATA_PATH,
+                index, records, segments.metadata.data_type
+            )
+    
+            with self._update_lock:
+                # Updates that arrived while merging stay in the log and the new delta.
+                # A crash between the two steps replays the whole log onto the new
+                # base, which gives the same catalog (ops are idempotent).
+                pending = self._delta_log.read(log_offset)
+                switch_base(settings.PRODUCT_INDEX_PATH, files)
+                self._delta_log.rewrite(pending)
+                self._components["product_segments"] = self._load_product_segments()
+    
+            print(f"Merged catalog updates into {len(records)} products in {time.perf_counter() - started:.1f}s")
+            self._notify_listeners("products")
+            return True
+        finally:
+            self._merge_lock.release()
+    
+    def _start_merge_thread(self):
+        """Background thread merging the delta every DELTA_MERGE_INTERVAL (or once it is large)"""
+        if self._merge_thread is not None:
+            return
+        self._merge_thread = threading.Thread(target=self._merge_loop, name="delta-merge", daemon=True)
+        self._merge_thread.start()
+    
+    def _merge_loop(self):
+        while True:
+            self._merge_wakeup.wait(settings.DELTA_MERGE_INTERVAL)
+            self._merge_wakeup.clear()
+            try:
+                self.merge_delta()
+            except Exception as e:
+                print(f"Delta merge failed: {e}")
+    
+    def load_stats(self) -> dict:
+        """Startup/component load times (seconds), what is loaded and current RSS"""
+        return {
+            "lazy": settings.LAZY_LOAD,
+            "mmap": settings.INDEX_MMAP,
+            "loaded": sorted(self._components),
+            "load_times": dict(self.load_times),
+            "rss_mb": rss_mb(),
+            "private_rss_mb": rss_mb(private=True),
+        }
+    
+    def search_products_batch(
+        self,
+        query_matrix: Optional[np.ndarray],
+        k: int = settings.DEFAULT_SEARCH_K,
+        filters_per_query: Optional[List[Optional[Dict[str, Any]]]] = None,
+        queries: Optional[List[str]] = None,
+        mode: str = "vector",
+        sort: str = "relevance",
+        lambda_mult: Optional[float] = None
+    ) -> List[Tuple[np.ndarray, List[SearchResult]]]:
+        """
+        Search in one of SEARCH_MODES over the product catalog including pending updates:
+        every retriever searches base (minus tombstoned rows) and delta and merges
+        them into one ranked list, then hybrid fuses those lists once, then sort applies.
+        lambda_mult: diversify the hits (see diversify_results), None = raw ranking
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode {mode!r}, expected one of {SEARCH_MODES}")
+        depth = sort_depth(k, sort)
+        if lambda_mult is not None:
+            depth = max(depth, settings.MMR_CANDIDATES)
+        segments = self._current_segments()
+    
+        if SORT_ORDERS[sort] is not None and filters_per_query is not None and any(filters_per_query):
+            # Narrow filtered queries to their best rows by the sort key, and retrieve all of them
+            window = k if lambda_mult is None else depth
+            narrowed = [
+                self.sort_filters(
+                    segments, filters, sort, window, queries[row] if mode == "lexical" else None
+                ) if filters else (filters, 0)
+                for row, filters in enumerate(filters_per_query)
+            ]
+            filters_per_query = [filters for filters, _ in narrowed]
+            depth = max([depth] + [count for _, count in narrowed])
+    
+        # Each retriever's hits are merged across segments first (L2 distances share
+        # one embedding space, BM25 scores share the whole catalog's statistics),
+        # so a product in the small delta ranks exactly as it would after a merge
+        retriever_depth = depth if mode != "hybrid" else max(depth, settings.HYBRID_CANDIDATES)
+        if mode != "lexical":
+            vector_outputs = self._segment_vector_search(
+                segments, query_matrix, retriever_depth, filters_per_query
+            )
+        if mode != "vector":
+            lexical_outputs = self._segment_lexical_search(
+                segments, queries, retriever_depth, filters_per_query
+            )
+    
+        if mode == "vector":
+            outputs = vector_outputs
+        elif mode == "lexical":
+            outputs = lexical_outputs
+        else:
+            outputs = [
+                fuse_results(vector_results, lexical_results, depth)
+                for (_, vector_results), (_, lexical_results) in zip(vector_outputs, lexical_outputs)
+            ]
+        if lambda_mult is not None:
+            outputs = [
+                self.diversify_results(
+                    segments, scores, results, k if sort == "relevance" else depth, lambda_mult,
+                    query_matrix[row] if mode == "vector" else None
+                )
+                for row, (scores, results) in enumerate(outputs)
+            ]
+        return [sort_results(scores, results, sort, k) for scores, results in outputs]
+    
+    def sort_filters(
+        self,
+        segments: ProductSegments,
+        filters: Dict[str, Any],
+        sort: str,
+        n: int,
+        query: Optional[str] = None
+    ) -> Tuple[Dict[str, Any], int]:
+        """
+        `filters` narrowed by a Range on the sort field to the n products that come
+        first in `sort` order (ties included), so relevance retrieval over them and
+        sort_results give the exact top n of every matching product.
+        query: count only products with a query token (what lexical search can return)
+        Returns (filters, number of products they match).
+        """
+        field, descending = SORT_ORDERS[sort]
+        base_index, base_metadata, delta = segments
+        parts = [(base_metadata, candidate_rows(base_metadata, filters, exclude=delta.tombstones))]
+        if delta.live:
+            parts.append((delta.metadata, candidate_rows(delta.metadata, filters, include=delta.live_rows)))
+        values = []
+        for metadata, rows in parts:
+            if rows is None:
+                rows = np.arange(metadata.size, dtype=np.int64)
+            if query is not None:
+                rows = rows[metadata.lexical_index.scores(query, delta.lexical_stats)[rows] > 0]
+            values.append(metadata.numeric_values(field, rows))
+        values = np.concatenate(values)
+        present = values[~np.isnan(values)]
+        if present.size <= n:
+            # Products without a value sort last: all of them may be needed
+            return filters, len(values)
+    
+        # n-th best value in one partition pass
+        if descending:
+            bound = -np.partition(-present, n - 1)[n - 1]
+            narrowed = {**filters, field: _intersect_range(filters.get(field), Range(min=float(bound)))}
+            count = int(np.count_nonzero(present >= bound))
+        else:
+            bound = np.partition(present, n - 1)[n - 1]
+            narrowed = {**filters, field: _intersect_range(filters.get(field), Range(max=float(bound)))}
+            count = int(np.count_nonzero(present <= bound))
+        return narrowed, count
+    
+    def _segment_vector_search(
+        self,
+        segments: ProductSegments,
+        query_matrix: np.ndarray,
+        k: int,
+        filters_per_query: Optional[List[Optional[Dict[str, Any]]]]
+    ) -> List[Tuple[np.ndarray, List[SearchResult]]]:
+        """search_batch over base (minus tombstones) and delta, merged by distance"""
+        base_index, base_metadata, delta = segments
+        outputs = self.search_batch(
+            base_index, base_metadata, query_matrix, k, filters_per_query, exclude=delta.tombstones
+        )
+        if not delta.live:
+            return outputs
+        delta_outputs = self.search_batch(
+            delta.index, delta.metadata, query_matrix, k, filters_per_query,
+            exclude=delta.dead_ids, id_offset=delta.id_offset
+        )
+        return [merge_ranked(a, b, k) for a, b in zip(outputs, delta_outputs)]
+    
+    def _segment_lexical_search(
+        self,
+        segments: ProductSegments,
+        queries: List[str],
+        k: int,
+        filters_per_query: Optional[List[Optional[Dict[str, Any]]]]
+    ) -> List[Tuple[np.ndarray, List[SearchResult]]]:
+        """lexical_search_batch over base and delta with shared BM25 statistics, merged by score"""
+        base_index, base_metadata, delta = segments
+        stats = delta.lexical_stats if delta.changed else None
+        outputs = self.lexical_search_batch(
+            base_metadata, queries, k, filters_per_query, exclude=delta.tombstones, stats=stats
+        )
+        if not delta.live:
+            return outputs
+        delta_outputs = self.lexical_search_batch(
+            delta.metadata, queries, k, filters_per_query,
+            exclude=delta.dead_ids, id_offset=delta.id_offset, stats=stats
+        )
+        return [merge_ranked(a, b, k, descending=True) for a, b in zip(outputs, delta_outputs)]
+    
+    def diversify_results(
+        self,
+        segments: ProductSegments,
+        scores: np.ndarray,
+        results: List[SearchResult],
+        k: int,
+        lambda_mult: float,
+        query_vec: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, List[SearchResult]]:
+        """
+        Drop near-duplicate variants (same settings.DEDUP_FIELD root), then pick k
+        of the rest by maximal marginal relevance over their FAISS vectors.
+        If the index can't reconstruct vectors (IVF without a direct map) only de-dup applies.
+        """
+        keep = dedup_positions(results, settings.DEDUP_FIELD)
+        scores, results = scores[keep], [results[i] for i in keep]
+        if len(results) <= k:
+            return scores, results
+    
+        vectors = self._result_vectors(segments, results)
+        if vectors is None:
+            return scores[:k], results[:k]
+        order = mmr(vectors, k, lambda_mult, query_vec)
+        return scores[order], [results[i] for i in order]
+    
+    def _result_vectors(self, segments: ProductSegments, results: List[SearchResult]) -> Optional[np.ndarray]:
+        """Stored embeddings of product hits: reconstructed from the base index, read from the delta"""
+        base_index, base_metadata, delta = segments
+        vectors = np.empty((len(results), base_index.d), dtype=np.float32)
+        base_positions, base_rows = [], []
+        for position, hit in enumerate(results):
+            if hit.store is base_metadata:
+                base_positions.append(position)
+                base_rows.append(hit.row)
+            else:
+                vectors[position] = delta.vectors[hit.row]
+        if base_rows:
+            try:
+                vectors[base_positions] = base_index.reconstruct_batch(np.array(base_rows, dtype=np.int64))
+            except RuntimeError:
+                return None
+        return vectors
+    
+    def product_facets(
+        self,
+        filters: Optional[Dict[str, Any]] = None,
+        fields: Optional[List[str]] = None,
+        top_n: Optional[int] = None
+    ) -> Tuple[int, Dict[str, Dict[Any, int]]]:
+        """
+        Value counts per field over every product matching `filters` (pending updates included)
+        Returns: (number of matching products, {field: {value: count}}) with the top_n values by count
+        """
+        base_index, base_metadata, delta = self._current_segments()
+        parts = [(base_metadata, candidate_rows(base_metadata, filters, exclude=delta.tombstones))]
+        if delta.live:
+            parts.append((delta.metadata, candidate_rows(delta.metadata, filters, include=delta.live_rows)))
+        return count_facets(
+            parts,
+            fields or settings.FACET_FIELDS,
+            top_n or settings.FACET_TOP_N
+        )
+    
+    def hybrid_search_batch(
+        self,
+        index: faiss.Index,
+        metadata: ColumnarMetadata,
+        query_matrix: Optional[np.ndarray],
+        queries: Optional[List[str]],
+        k: int = settings.DEFAULT_SEARCH_K,
+        filters_per_query: Optional[List[Optional[Dict[str, Any]]]] = None,
+        mode: str = "hybrid",
+        exclude: Optional[np.ndarray] = None,
+        id_offset: int = 0,
+        sort: str = "relevance"
+    ) -> List[Tuple[np.ndarray, List[SearchResult]]]:
+        """
+        Search in one of SEARCH_MODES, with the same filters for every retriever
+        - vector: search_batch (result.score = L2 distance, lower is better)
+        - lexical: BM25 over the metadata text (result.score = BM25, higher is better)
+        - hybrid: both, fused by reciprocal rank (result.score = RRF score, higher is better)
+        sort: one of SORT_ORDERS, applied to the top settings.SORT_CANDIDATES hits
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode {mode!r}, expected one of {SEARCH_MODES}")
+        if sort != "relevance":
+            outputs = self.hybrid_search_batch(
+                index, metadata, query_matrix, queries, sort_depth(k, sort),
+                filters_per_query, mode, exclude, id_offset
+            )
+            return [sort_results(scores, results, sort, k) for scores, results in outputs]
+        if mode == "vector":
+            return self.search_batch(index, metadata, query_matrix, k, filters_per_query, exclude, id_offset)
+        if mode == "lexical":
+            return self.lexical_search_batch(metadata, queries, k, filters_per_query, exclude, id_offset)
+    
+        depth = max(k, settings.HYBRID_CANDIDATES)
+        vector_outputs = self.search_batch(index, metadata, query_matrix, depth, filters_per_query, exclude, id_offset)
+        lexical_outputs = self.lexical_search_batch(metadata, queries, depth, filters_per_query, exclude, id_offset)
+    
+        return [
+            fuse_results(vector_results, lexical_results, k)
+            for (_, vector_results), (_, lexical_results) in zip(vector_outputs, lexical_outputs)
+        ]
+    
+    def lexical_search_batch(
+        self,
+        metadata: ColumnarMetadata,
+        queries: List[str],
+        k: int = settings.DEFAULT_SEARCH_K,
+        filters_per_query: Optional[List[Optional[Dict[str, Any]]]] = None,
+        exclude: Optional[np.ndarray] = None,
+        id_offset: int = 0,
+        stats: Optional[CorpusStats] = None
+    ) -> List[Tuple[np.ndarray, List[SearchResult]]]:
+        """
+        BM25 search over the metadata text, restricted like search_batch
+        stats: collection statistics shared by several segments (default: this store's own)
+        Returns: one (bm25_scores, results) pair per query, best first
+        """
+        if filters_per_query is None:
+            filters_per_query = [None] * len(queries)
+        if exclude is not None and exclude.size:
+            # FAISS ids -> metadata rows
+            exclude = exclude - id_offset
+        else:
+            exclude = None
+    
+        outputs = []
+        for query, filters in zip(queries, filters_per_query):
+            allowed = metadata.filter_index.lookup(filters) if filters else None
+            if exclude is not None:
+                if allowed is None:
+                    allowed = np.arange(metadata.size, dtype=np.int64)
+                allowed = np.setdiff1d(allowed, exclude, assume_unique=True)
+            if allowed is not None and not allowed.size:
+                outputs.append((np.array([], dtype=np.float32), []))
+                continue
+    
+            scores, rows = metadata.lexical_index.search(query, k, allowed, stats)
+            outputs.append((scores, [
+                SearchResult(int(row), float(score), metadata) for row, score in zip(rows, scores)
+            ]))
+        return outputs
     
     def embed_query(self, text: str) -> np.ndarray:
         """Convert text to vector embedding"""
         return self.embedding_model.encode([text])[0]
     
+    def embed_queries(self, texts: List[str]) -> np.ndarray:
+        """Convert a batch of texts to embeddings in one encoder pass"""
+        if not texts:
+            return np.empty((0, self.product_index.d), dtype=np.float32)
+        return np.asarray(self.embedding_model.encode(list(texts)), dtype=np.float32)
+    
     def search(
         self,
         index: faiss.Index,
-        metadata: Dict,
+        metadata: ColumnarMetadata,
         query_vec: np.ndarray,
         k: int = settings.DEFAULT_SEARCH_K,
-        filters: Optional[Dict[str, str]] = None
-    ) -> Tuple[np.ndarray, List[Dict[str, Any]]]:
+        filters: Optional[Dict[str, Any]] = None,
+        sort: str = "relevance"
+    ) -> Tuple[np.ndarray, List[SearchResult]]:
         """
         Search FAISS index with optional metadata filtering
-        Returns: (distances, filtered_results)
+        Filters are resolved to an id set first, so top-k is exact. A filter value
+        may be a Range for numeric fields, e.g. {"price": Range(max=40)}.
+        sort: one of SORT_ORDERS, applied to the top settings.SORT_CANDIDATES hits
+        Returns: (distances, filtered_results) - results are read-only SearchResult views
         """
-        if filters:
-            # Retrieve more results first, then filter
-            search_k = min(k * 10, index.ntotal)
-            distances, indices = index.search(
-                np.array([query_vec], dtype=np.float32), search_k
-            )
-            
-            # Extract metadata
-            metadata_list = metadata.get('metadata_list', metadata)
-            id_to_metadata = metadata.get('id_to_metadata', {})
-            
-            # Collect candidates
-            candidates = []
-            candidate_distances = []
-            for dist, idx in zip(distances[0], indices[0]):
-                idx = int(idx)
-                item = self._get_metadata_item(metadata_list, id_to_metadata, idx)
-                
-                if item:
-                    candidates.append(item)
-                    candidate_distances.append(dist)
-            
-            # Filter by metadata (case-insensitive: Men == men)
-            filtered_results = []
-            filtered_distances = []
-            for item, dist in zip(candidates, candidate_distances):
-                if self._matches_filters(item, filters):
-                    filtered_results.append(item)
-                    filtered_distances.append(dist)
-                    if len(filtered_results) >= k:
-                        break
-            
-            return np.array(filtered_distances), filtered_results
-        else:
-            # No filters - direct search
-            distances, indices = index.search(
-                np.array([query_vec], dtype=np.float32), k
-            )
-            
-            metadata_list = metadata.get('metadata_list', metadata)
-            id_to_metadata = metadata.get('id_to_metadata', {})
-            
-            results = []
-            for idx in indices[0]:
-                idx = int(idx)
-                item = self._get_metadata_item(metadata_list, id_to_metadata, idx)
-                if item:
-                    results.append(item)
-            
-            return distances[0], results
-    
-    def _get_metadata_item(
+        distances, results = self.search_batch(
+            index, metadata, np.array([query_vec], dtype=np.float32), sort_depth(k, sort), [filters]
+        )[0]
+        return sort_results(distances, results, sort, k)
+    
+    def search_batch(
         self,
-        metadata_list: Any,
-        id_to_metadata: Dict,
-        idx: int
-    ) -> Optional[Dict[str, Any]]:
-        """Get metadata item by index."""
-        # Try metadata_list first
-        if isinstance(metadata_list, list) and idx < len(metadata_list):
-            return metadata_list[idx]
-        # Fallback to id_to_metadata
-        elif isinstance(metadata_list, dict) and idx in id_to_metadata:
-            return id_to_metadata[idx]
-        elif idx in id_to_metadata:
-            return id_to_metadata[idx]
-        return None
+        index: faiss.Index,
+        metadata: ColumnarMetadata,
+        query_matrix: np.ndarray,
+        k: int = settings.DEFAULT_SEARCH_K,
+        filters_per_query: Optional[List[Optional[Dict[str, Any]]]] = None,
+        exclude: Optional[np.ndarray] = None,
+        id_offset: int = 0
+    ) -> List[Tuple[np.ndarray, List[SearchResult]]]:
+        """
+        Search FAISS index for a batch of queries
+        Queries sharing the same filters go through one matrix search call.
+        exclude: sorted FAISS ids to skip (e.g. deleted products)
+        id_offset: FAISS id of metadata row 0 (delta segments)
+        Returns: one (distances, filtered_results) pair per query row
+        """
+        query_matrix = np.ascontiguousarray(query_matrix, dtype=np.float32)
+        n_queries = len(query_matrix)
+        if filters_per_query is None:
+            filters_per_query = [None] * n_queries
     
-    def _matches_filters(self, item: Dict[str, Any], filters: Dict[str, str]) -> bool:
-        """Check if item matches all filters (case-insensitive)."""
-        return all(
-            str(item.get(key, '')).lower() == str(value).lower()
-            for key, value in filters.items()
-        )
+        # Group query rows by filter combination
+        groups: Dict[Tuple, List[int]] = {}
+        for row, filters in enumerate(filters_per_query):
+            key = tuple(sorted(
+                (field, filter_value_key(value)) for field, value in (filters or {}).items()
+            ))
+            groups.setdefault(key, []).append(row)
+    
+        outputs: List[Tuple[np.ndarray, List[SearchResult]]] = [None] * n_queries
+        if exclude is not None and not exclude.size:
+            exclude = None
+    
+        for key, rows in groups.items():
+            group_k = k
+            params = None
+            ids = None
+            if key:
+                # Pre-filter: only let FAISS score ids that match every filter
+                ids = metadata.filter_index.lookup(dict(key)) + id_offset
+                if exclude is not None:
+                    ids = np.setdiff1d(ids, exclude, assume_unique=True)
+            if index.ntotal == 0 or (ids is not None and not ids.size):
+                for row in rows:
+                    outputs[row] = (np.array([], dtype=np.float32), [])
+                continue
+    
+            if ids is not None:
+                group_k = min(k, int(ids.size))
+                params = filter_search_params(index, ids)
+            elif exclude is not None:
+                params = filter_search_params(index, exclude=exclude)
+    
+            distances, indices = index.search(query_matrix[rows], group_k, params=params)
+    
+            for row, row_distances, row_indices in zip(rows, distances, indices):
+                # -1 ids pad the tail when fewer than k vectors exist
+                row_indices = row_indices - id_offset
+                valid = (row_indices >= 0) & (row_indices < metadata.size)
+                row_distances = row_distances[valid]
+                results = [
+                    SearchResult(int(idx), float(dist), metadata)
+                    for idx, dist in zip(row_indices[valid], row_distances)
+                ]
+                outputs[row] = (row_distances, results)
+    
+        return outputs
+
+
+def merge_ranked(
+    first: Tuple[np.ndarray, List[SearchResult]],
+    second: Tuple[np.ndarray, List[SearchResult]],
+    k: int,
+    descending: bool = False
+) -> Tuple[np.ndarray, List[SearchResult]]:
+    """Top k of two ranked (scores, results) lists with comparable scores; ties keep `first` ahead"""
+    scores = np.concatenate([first[0], second[0]])
+    results = first[1] + second[1]
+    order = np.argsort(-scores if descending else scores, kind="stable")[:k]
+    return scores[order], [results[i] for i in order]
+
+
+def fuse_results(
+    vector_results: List[SearchResult],
+    lexical_results: List[SearchResult],
+    k: int
+) -> Tuple[np.ndarray, List[SearchResult]]:
+    """Reciprocal rank fusion of one query's vector and BM25 hits (result.score = RRF score)"""
+    fused = reciprocal_rank_fusion([vector_results, lexical_results], k, settings.RRF_K)
+    return (
+        np.array([score for _, score in fused], dtype=np.float32),
+        [SearchResult(hit.row, score, hit.store) for hit, score in fused],
+    )
+
+
+def _intersect_range(current: Any, bound: Range) -> Range:
+    """Range filter within both an existing filter value (if a Range) and `bound`"""
+    if not isinstance(current, Range):
+        return bound
+    lows = [value for value in (current.min, bound.min) if value is not None]
+    highs = [value for value in (current.max, bound.max) if value is not None]
+    return Range(max(lows) if lows else None, min(highs) if highs else None)
+
+
+def sort_depth(k: int, sort: str) -> int:
+    """How many relevant hits to fetch so that `sort` can re-order them into the top k"""
+    if sort not in SORT_ORDERS:
+        raise ValueError(f"Unknown sort {sort!r}, expected one of {tuple(SORT_ORDERS)}")
+    return k if SORT_ORDERS[sort] is None else max(k, settings.SORT_CANDIDATES)
+
+
+def sort_results(
+    scores: np.ndarray,
+    results: List[SearchResult],
+    sort: str,
+    k: int
+) -> Tuple[np.ndarray, List[SearchResult]]:
+    """
+    Top k of relevance-ordered hits in `sort` order.
+    Sort keys are gathered from the numeric columns, one fancy-index per store;
+    hits without a value go last, ties keep relevance order.
+    """
+    spec = SORT_ORDERS[sort]
+    if spec is None or not results:
+        return scores[:k], results[:k]
+    
+    field, descending = spec
+    rows = np.fromiter((hit.row for hit in results), dtype=np.int64, count=len(results))
+    store_ids = np.fromiter((id(hit.store) for hit in results), dtype=np.int64, count=len(results))
+    values = np.empty(len(results), dtype=np.float64)
+    for store_id in np.unique(store_ids):
+        positions = np.flatnonzero(store_ids == store_id)
+        values[positions] = results[positions[0]].store.numeric_values(field, rows[positions])
+    
+    # NaN sorts last either way
+    order = np.argsort(-values if descending else values, kind="stable")[:k]
+    return scores[order], [results[i] for i in order]
+
+
+def apply_search_params(index: faiss.Index, nprobe: int, ef_search: int):
+    """Set query-time knobs (IVF nprobe, HNSW efSearch) on an index"""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
+
+
+def filter_search_params(
+    index: faiss.Index,
+    ids: Optional[np.ndarray] = None,
+    exclude: Optional[np.ndarray] = None
+) -> faiss.SearchParameters:
+    """
+    Search parameters restricting `index` to `ids` (or to everything but `exclude`),
+    of the type the index expects.
+    IVF probes proportionally more lists for selective filters, so a filter
+    matching 1% of the catalog still finds k neighbours.
+    """
+    if ids is not None:
+        selector = faiss.IDSelectorBatch(ids)
+        selected = int(ids.size)
+        keepalive = (selector,)
+    else:
+        excluded = faiss.IDSelectorBatch(exclude)
+        selector = faiss.IDSelectorNot(excluded)
+        selected = index.ntotal - int(exclude.size)
+        keepalive = (selector, excluded)
+    
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        share = max(selected, 1) / max(index.ntotal, 1)
+        nprobe = min(ivf.nlist, math.ceil(ivf.nprobe / share))
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=nprobe)
+    elif isinstance(index, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    # SWIG does not keep the selectors alive for us
+    params.keepalive = keepalive
+    return params
+
+
+def _inode(path) -> Optional[int]:
+    try:
+        return os.stat(path).st_ino
+    except FileNotFoundError:
+        return None
+
+
+def rss_mb(private: bool = False) -> float:
+    """
+    Resident set size of this process in MB.
+    private=True leaves out file-backed pages (mmapped indices/metadata), which
+    worker processes share through the OS page cache.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            fields = f.read().split()
+        pages = int(fields[1]) - (int(fields[2]) if private else 0)
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        # Not Linux: peak RSS is the best we have (KB on Linux, bytes on macOS)
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
 
 
 _vector_store: Optional[VectorStore] = None
@@ -0,0 +1,214 @@
+"""Shared fixtures: a small on-disk catalog and a deterministic encoder (no model download)"""
+import asyncio
+import os
+import uuid
+import zlib
+
+# Before agents.nodes is imported, which picks the LLM
+os.environ.setdefault("LLM_PROVIDER", "fake")
+
+import faiss
+import numpy as np
+import pytest
+from langchain_core.messages import AIMessage, ToolMessage
+
+from core import IntentClassification, ProductMetadata
+from core.config import settings
+from services.index_builder import FAQ_TEXT_FIELDS, PRODUCT_TEXT_FIELDS, embed_texts, record_text, write_store
+from services.lexical_index import tokenize
+from services.vector_store import VectorStore
+
+
+class HashingEncoder:
+    """Bag-of-words embeddings hashed into `dim` buckets, standing in for the sentence-transformer"""
+
+    def __init__(self, dim: int = 64):
+        self.dim = dim
+        self.max_seq_length = 128
+        self.calls = 0
+
+    def encode(self, texts, **kwargs):
+        self.calls += 1
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                vectors[row, zlib.crc32(token.encode("utf-8")) % self.dim] += 1.0
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+class StubLLM:
+    """
+    Chat model stand-in: "faq" intent on FAQ words, product metadata from the message,
+    one search tool call per assistant turn, then a reply quoting the tool result.
+    Counts async calls in flight.
+    """
+
+    FAQ_WORDS = ("return", "refund", "shipping", "payment", "order", "policy", "cancel")
+
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def with_structured_output(self, schema):
+        def reply(messages):
+            # The user's message inside the classification/extraction prompt
+            text = messages[-1].content.split("Current user message:")[-1].strip().splitlines()[0].lower()
+            if schema is IntentClassification:
+                faq = any(word in text for word in self.FAQ_WORDS)
+                return IntentClassification(intent_type="faq" if faq else "product", confidence=0.9, reasoning="stub")
+            return ProductMetadata(search_query="black watch", can_search=True, needs_clarification=False)
+        return _StubCall(self, reply)
+
+    def bind_tools(self, tools, **kwargs):
+        name = getattr(tools[0], "name", None) or tools[0].__name__
+
+        def reply(messages):
+            if isinstance(messages[-1], ToolMessage):
+                return AIMessage(content=f"Found: {messages[-1].content[:40]}")
+            return AIMessage(content="", tool_calls=[{"name": name, "args": {"query": "black watch"}, "id": uuid.uuid4().hex}])
+        return _StubCall(self, reply)
+
+
+class _StubCall:
+    def __init__(self, llm, reply):
+        self.llm = llm
+        self.reply = reply
+
+    def invoke(self, messages):
+        return self.reply(messages)
+
+    async def ainvoke(self, messages):
+        self.llm.in_flight += 1
+        self.llm.max_in_flight = max(self.llm.max_in_flight, self.llm.in_flight)
+        await asyncio.sleep(0.01)
+        self.llm.in_flight -= 1
+        return self.reply(messages)
+
+
+def product(product_id, name, gender, colour, article_type, price, usage="Casual", season="Summer"):
+    return {
+        "product_id": product_id,
+        "productDisplayName": name,
+        "gender": gender,
+        "baseColour": colour,
+        "articleType": article_type,
+        "usage": usage,
+        "season": season,
+        "masterCategory": "Apparel",
+        "subCategory": "Topwear",
+        "price": price,
+    }
+
+
+PRODUCTS = [
+    product(1, "Turtle Check Men Navy Blue Shirt", "Men", "Navy Blue", "Shirts", 45.0),
+    product(2, "Peter England Men Party Blue Jeans", "Men", "Blue", "Jeans", 60.0),
+    product(3, "Titan Women Silver Watch", "Women", "Silver", "Watches", 120.0, "Formal"),
+    product(4, "Manchester United Men Solid Black Track Pants", "Men", "Black", "Track Pants", 35.0, "Sports"),
+    product(5, "Puma Men Grey T-shirt", "Men", "Grey", "Tshirts", 25.0, "Sports"),
+    product(6, "Inkfruit Mens Chain Reaction T-shirt", "Men", "Grey", "Tshirts", 18.0),
+    product(7, "Fabindia Men Striped Green Shirt", "Men", "Green", "Shirts", 40.0),
+    product(8, "Jealous 21 Women Purple Shirt", "Women", "Purple", "Shirts", 30.0),
+    product(9, "Puma Men Pack of 3 Socks", "Men", "White", "Socks", 12.0, "Sports"),
+    product(10, "Skagen Men Black Watch", "Men", "Black", "Watches", 150.0, "Formal"),
+    product(11, "Fossil Men Black Leather Wallet", "Men", "Black", "Wallets", 55.0, "Formal"),
+    product(12, "Hidesign Men Brown Leather Wallet", "Men", "Brown", "Wallets", 48.0, "Formal"),
+    product(13, "Baggit Women Red Handbag", "Women", "Red", "Handbags", 70.0),
+    product(14, "Nike Men Black Running Shoes", "Men", "Black", "Sports Shoes", 90.0, "Sports"),
+    product(15, "Adidas Women White Running Shoes", "Women", "White", "Sports Shoes", 85.0, "Sports"),
+    product(16, "Arrow Men Formal White Shirt", "Men", "White", "Shirts", 50.0, "Formal"),
+    product(17, "Levis Men Black Jeans", "Men", "Black", "Jeans", 65.0),
+    product(18, "Biba Women Printed Kurta", "Women", "Pink", "Kurtas", 38.0, "Ethnic"),
+    product(19, "Jockey Men Black Briefs", "Men", "Black", "Briefs", 9.0),
+    product(20, "Axe Men Dark Temptation Deodorant", "Men", "Black", "Deodorant", 6.0),
+    product(21, "Woodland Men Brown Casual Shoes", "Men", "Brown", "Casual Shoes", 75.0),
+    product(22, "Wildcraft Unisex Blue Backpack", "Unisex", "Blue", "Backpacks", 42.0),
+    product(23, "Ray-Ban Men Black Sunglasses", "Men", "Black", "Sunglasses", 110.0),
+    product(24, "Van Heusen Women Black Blazer", "Women", "Black", "Blazers", 95.0, "Formal", "Winter"),
+]
+
+FAQS = [
+    {"question": "What is your return policy?", "answer": "Returns are accepted within 30 days."},
+    {"question": "How long does shipping take?", "answer": "Orders ship in 3-5 business days."},
+    {"question": "Which payment methods do you accept?", "answer": "Cards, UPI and cash on delivery."},
+    {"question": "How do I cancel my order?", "answer": "Cancel from My Orders before it ships."},
+]
+
+
+@pytest.fixture
+def encoder():
+    return HashingEncoder()
+
+
+@pytest.fixture
+def indices_dir(tmp_path, monkeypatch, encoder):
+    """products/faq indices built from PRODUCTS/FAQS in a temp dir, with settings pointing at it"""
+    for name, value in {
+        "INDICES_DIR": tmp_path,
+        "FAQ_INDEX_PATH": tmp_path / "faq.index",
+        "FAQ_METADATA_PATH": tmp_path / "faq.metadata",
+        "PRODUCT_INDEX_PATH": tmp_path / "products.index",
+        "PRODUCT_METADATA_PATH": tmp_path / "products.metadata",
+        "FAQ_COLUMNS_PATH": tmp_path / "faq.columns",
+        "PRODUCT_COLUMNS_PATH": tmp_path / "products.columns",
+        "PRODUCT_DELTA_LOG_PATH": tmp_path / "products.delta.jsonl",
+        "EMBEDDING_CHECK_PATH": tmp_path / "encoder_checks.json",
+        "LAZY_LOAD": True,
+        # Merges run only when a test asks for one
+        "DELTA_MERGE_INTERVAL": 3600.0,
+    }.items():
+        monkeypatch.setattr(settings, name, value)
+
+    for name, records, fields, data_type in (
+        ("products", PRODUCTS, PRODUCT_TEXT_FIELDS, "products"),
+        ("faq", FAQS, FAQ_TEXT_FIELDS, "faq"),
+    ):
+        vectors = embed_texts(encoder, [record_text(record, fields) for record in records], batch_size=64)
+        index = faiss.IndexFlatL2(vectors.shape[1])
+        index.add(vectors)
+        write_store(tmp_path, name, index, records, data_type)
+    return tmp_path
+
+
+@pytest.fixture
+def vector_store(indices_dir, encoder):
+    """VectorStore over the temp indices, embedding with the HashingEncoder"""
+    store = VectorStore()
+    store._components["embedding_model"] = encoder
+    return store
+
+
+def product_ids(results):
+    return [hit["product_id"] for hit in results]
+
+
+@pytest.fixture
+def search_store(vector_store, monkeypatch):
+    """vector_store as the process-wide store behind the search tools, with fresh caches/singletons"""
+    import services.answer_cache
+    import services.intent_classifier
+    import services.metadata_extractor
+    import services.tools
+    import services.vector_store
+
+    monkeypatch.setattr(services.vector_store, "_vector_store", vector_store)
+    for module, name in (
+        (services.answer_cache, "_answer_cache"),
+        (services.intent_classifier, "_intent_classifier"),
+        (services.metadata_extractor, "_metadata_extractor"),
+        (services.tools, "_cache_store"),
+    ):
+        monkeypatch.setattr(module, name, None)
+    services.tools.clear_caches()
+    monkeypatch.setattr(settings, "CHECKPOINTER", "memory")
+    return vector_store
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    """StubLLM as the chat model of the graph nodes"""
+    import agents.nodes
+
+    stub = StubLLM()
+    monkeypatch.setattr(agents.nodes, "llm", stub)
+    return stub
@@ -0,0 +1,78 @@
+import asyncio
+import uuid
+
+import numpy as np
+import pytest
+
+from core.config import settings
+from main import FashionChatbot
+from services import get_answer_cache
+from services.answer_cache import SemanticAnswerCache
+
+
+@pytest.fixture
+def chatbot(search_store, monkeypatch):
+    monkeypatch.setattr(settings, "ANSWER_CACHE", True)
+    return FashionChatbot(echo=False)
+
+
+def nodes(chatbot, message, thread_id):
+    return [event["node"] for event in chatbot.chat_stream(message, thread_id) if event["type"] == "node"]
+
+
+def test_first_turn_answers_are_cached(chatbot):
+    assert "answer_cache" not in nodes(chatbot, "What is your return policy?", uuid.uuid4().hex)
+    assert nodes(chatbot, "What is your return policy?", uuid.uuid4().hex) == ["answer_cache"]
+
+
+def test_follow_ups_neither_use_nor_fill_the_cache(chatbot):
+    thread_id = uuid.uuid4().hex
+    nodes(chatbot, "Show me black watches", thread_id)
+    assert "answer_cache" not in nodes(chatbot, "What is your return policy?", thread_id)
+    assert get_answer_cache().stats()["size"] == 0
+
+    nodes(chatbot, "What is your return policy?", uuid.uuid4().hex)
+    assert "answer_cache" not in nodes(chatbot, "What is your return policy?", thread_id)
+
+
+def test_async_follow_ups_skip_the_cache(chatbot):
+    async def turn(message, thread_id):
+        return [event["node"] async for event in chatbot.achat_stream(message, thread_id) if event["type"] == "node"]
+
+    async def run():
+        await turn("What is your return policy?", uuid.uuid4().hex)
+        thread_id = uuid.uuid4().hex
+        first = await turn("What is your return policy?", thread_id)
+        follow_up = await turn("What is your return policy?", thread_id)
+        return first, follow_up
+
+    first, follow_up = asyncio.run(run())
+    assert first == ["answer_cache"]
+    assert "answer_cache" not in follow_up
+
+
+def test_cache_is_opt_in(search_store):
+    chatbot = FashionChatbot(echo=False)
+    nodes(chatbot, "What is your return policy?", uuid.uuid4().hex)
+    assert "answer_cache" not in nodes(chatbot, "What is your return policy?", uuid.uuid4().hex)
+    assert get_answer_cache().stats()["stores"] == 0
+
+
+def test_expired_entries_do_not_shadow_live_ones(search_store, monkeypatch):
+    vectors = {
+        "old": np.array([1.0, 0.0], dtype=np.float32),
+        "new": np.array([0.9, 0.436], dtype=np.float32),
+        "query": np.array([0.99, 0.141], dtype=np.float32),
+    }
+    cache = SemanticAnswerCache(search_store, ttl=60.0, threshold=0.95)
+    monkeypatch.setattr(cache, "_vector", lambda text: vectors[text] / np.linalg.norm(vectors[text]))
+    cache.store("old", "old answer")
+    cache.store("new", "new answer")
+
+    # The nearest question has expired; the next one is still within the threshold
+    entry_id = next(iter(cache._entries))
+    question, answer, _ = cache._entries[entry_id]
+    cache._entries[entry_id] = (question, answer, 0.0)
+
+    assert cache.lookup("query") == "new answer"
+    assert cache.stats()["size"] == 1
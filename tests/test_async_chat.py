@@ -0,0 +1,47 @@
+import asyncio
+import threading
+import uuid
+
+import pytest
+
+import services.tools
+from main import FashionChatbot
+from services import asearch_products_tool
+
+
+@pytest.fixture
+def chatbot(search_store, llm):
+    return FashionChatbot()
+
+
+def test_achat_matches_chat(chatbot):
+    reply = chatbot.chat("black watch", uuid.uuid4().hex)
+    assert reply.startswith("Found:")
+    assert asyncio.run(chatbot.achat("black watch", uuid.uuid4().hex)) == reply
+
+
+def test_concurrent_conversations_share_the_event_loop(chatbot, llm):
+    async def run():
+        return await asyncio.gather(*(chatbot.achat("black watch", uuid.uuid4().hex) for _ in range(4)))
+
+    replies = asyncio.run(run())
+    assert len(set(replies)) == 1
+    assert llm.max_in_flight > 1
+
+
+def test_async_search_runs_off_the_event_loop(search_store, monkeypatch):
+    threads = []
+    batch = services.tools.search_products_batch
+
+    def recording_batch(requests):
+        threads.append(threading.current_thread())
+        return batch(requests)
+
+    monkeypatch.setitem(services.tools._BATCH_FUNCTIONS, "products", recording_batch)
+
+    async def run():
+        return await asearch_products_tool("black watch"), threading.current_thread()
+
+    response, loop_thread = asyncio.run(run())
+    assert response["results"]
+    assert threads and threads[0] is not loop_thread
@@ -0,0 +1,42 @@
+import numpy as np
+
+from services import search_products_batch, search_products_tool
+from tests.conftest import product_ids
+
+QUERIES = ["black watch", "navy blue shirt", "leather wallet", "running shoes"]
+FILTERS = [None, {"gender": "Men"}, None, {"gender": "Women"}]
+
+
+def test_batch_matches_one_search_per_query(vector_store):
+    vectors = vector_store.embed_queries(QUERIES)
+    outputs = vector_store.search_batch(
+        vector_store.product_index, vector_store.product_metadata, vectors, k=4, filters_per_query=FILTERS
+    )
+
+    assert len(outputs) == len(QUERIES)
+    for vector, filters, (distances, results) in zip(vectors, FILTERS, outputs):
+        single_distances, single = vector_store.search(
+            vector_store.product_index, vector_store.product_metadata, vector, k=4, filters=filters
+        )
+        np.testing.assert_allclose(distances, single_distances, rtol=1e-5)
+        assert sorted(product_ids(results)) == sorted(product_ids(single))
+
+
+def test_queries_are_embedded_in_one_encoder_pass(vector_store, encoder):
+    calls = encoder.calls
+    vectors = vector_store.embed_queries(QUERIES)
+    assert encoder.calls == calls + 1
+    assert vectors.shape == (len(QUERIES), vector_store.product_index.d)
+    assert vector_store.embed_queries([]).shape == (0, vector_store.product_index.d)
+
+
+def test_tool_batch_matches_single_calls(search_store, encoder):
+    requests = [{"query": query, "k": 3, **(filters or {})} for query, filters in zip(QUERIES, FILTERS)]
+    calls = encoder.calls
+    responses = search_products_batch(requests)
+    assert encoder.calls == calls + 1
+
+    # Singles are now cache hits of the batch
+    for request, response in zip(requests, responses):
+        assert search_products_tool(**request) == response
+    assert encoder.calls == calls + 1
@@ -0,0 +1,57 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from services.batcher import MicroBatcher, SearchOverloaded
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        yield executor
+
+
+def test_concurrent_items_are_coalesced_in_order(executor):
+    batches = []
+
+    def double(items):
+        batches.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(double, executor, window_ms=200, max_batch=8, max_pending=100)
+    futures = [batcher.submit(item) for item in range(5)]
+    assert [future.result(timeout=5) for future in futures] == [0, 2, 4, 6, 8]
+    assert batches == [[0, 1, 2, 3, 4]]
+    assert batcher.stats()["mean_batch_size"] == 5
+
+
+def test_batches_are_capped(executor):
+    sizes = []
+
+    def identity(items):
+        sizes.append(len(items))
+        return items
+
+    batcher = MicroBatcher(identity, executor, window_ms=200, max_batch=3, max_pending=100)
+    futures = [batcher.submit(item) for item in range(7)]
+    assert [future.result(timeout=5) for future in futures] == list(range(7))
+    assert max(sizes) <= 3 and sum(sizes) == 7
+
+
+def test_overload_is_rejected_and_errors_reach_every_caller(executor):
+    release = threading.Event()
+
+    def failing(items):
+        release.wait(5)
+        raise ValueError("index unavailable")
+
+    batcher = MicroBatcher(failing, executor, window_ms=1, max_batch=8, max_pending=2)
+    futures = [batcher.submit(1), batcher.submit(2)]
+    with pytest.raises(SearchOverloaded):
+        batcher.submit(3)
+    release.set()
+    for future in futures:
+        with pytest.raises(ValueError):
+            future.result(timeout=5)
+    assert batcher.stats()["rejected"] == 1 and batcher.stats()["pending"] == 0
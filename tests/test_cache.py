@@ -0,0 +1,47 @@
+import services.cache
+from services import clear_caches, get_cache_stats, search_faq_tool, search_products_tool
+from services.cache import TTLCache
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_cache_expires_entries(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(services.cache.time, "monotonic", lambda: now[0])
+    cache = TTLCache(maxsize=8, ttl=10)
+    cache.set("a", 1)
+    now[0] += 9
+    assert cache.get("a") == 1
+    now[0] += 2
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_repeated_searches_hit_the_caches(search_store, encoder):
+    search_products_tool("Black Watch", gender="Men")
+    calls = encoder.calls
+    # Counters outlive clear_caches: compare against this point
+    before = get_cache_stats()
+    # Normalized query, same filters: served from the search cache
+    assert search_products_tool("  black   watch ", gender="Men") == search_products_tool("black watch", gender="Men")
+    # Other filters: a new search, but the query embedding is reused
+    search_products_tool("black watch", gender="Women")
+    search_faq_tool("black watch")
+    assert encoder.calls == calls
+
+    stats = get_cache_stats()
+    assert stats["search"]["hits"] - before["search"]["hits"] == 2
+    assert stats["embeddings"]["hits"] - before["embeddings"]["hits"] >= 2
+
+    clear_caches()
+    search_products_tool("black watch", gender="Men")
+    assert encoder.calls == calls + 1
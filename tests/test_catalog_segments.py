@@ -0,0 +1,55 @@
+"""Ranking over base + delta catalog segments"""
+import pytest
+
+from tests.conftest import PRODUCTS, product, product_ids
+
+
+def search(store, encoder, query, mode, k=12):
+    query_matrix = encoder.encode([query]) if mode != "lexical" else None
+    scores, results = store.search_products_batch(query_matrix, k, queries=[query], mode=mode)[0]
+    return scores, results
+
+
+@pytest.mark.parametrize("mode", ["hybrid", "vector", "lexical"])
+def test_upsert_does_not_reorder_unrelated_results(vector_store, encoder, mode):
+    # Deep enough that the tail holds hits found by only one retriever
+    query = "black leather wallet for men"
+    _, before = search(vector_store, encoder, query, mode, k=20)
+
+    vector_store.upsert_products([product(900, "Zzz Silk Red Saree", "Women", "Red", "Sarees", 80.0)])
+    _, after = search(vector_store, encoder, query, mode, k=20)
+
+    assert 900 not in product_ids(after)
+    assert product_ids(after) == product_ids(before)
+
+
+@pytest.mark.parametrize("mode", ["hybrid", "lexical"])
+def test_price_update_keeps_rank_and_score(vector_store, encoder, mode):
+    query = "Turtle Check Men Navy Blue Shirt"
+    scores, before = search(vector_store, encoder, query, mode)
+    assert product_ids(before)[0] == 1
+
+    vector_store.upsert_products([dict(PRODUCTS[0], price=39.0)])
+    new_scores, after = search(vector_store, encoder, query, mode)
+
+    assert product_ids(after) == product_ids(before)
+    assert after[0]["price"] == 39.0
+    assert new_scores[0] == pytest.approx(scores[0])
+
+
+@pytest.mark.parametrize("mode", ["hybrid", "vector", "lexical"])
+def test_delta_ranks_like_merged_catalog(vector_store, encoder, mode):
+    vector_store.upsert_products([
+        product(900, "Zzz Silk Red Saree", "Women", "Red", "Sarees", 80.0),
+        product(901, "Roadster Men Black Leather Jacket", "Men", "Black", "Jackets", 130.0, season="Winter"),
+        dict(PRODUCTS[10], price=52.0),
+    ])
+    vector_store.delete_products([12])
+    queries = ["black leather wallet for men", "men black jacket", "red saree", "running shoes"]
+    pending = [product_ids(search(vector_store, encoder, query, mode)[1]) for query in queries]
+
+    assert vector_store.merge_delta()
+    merged = [product_ids(search(vector_store, encoder, query, mode)[1]) for query in queries]
+
+    assert pending == merged
+    assert all(12 not in ids for ids in merged)
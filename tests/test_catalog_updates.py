@@ -0,0 +1,103 @@
+"""Incremental catalog updates: upsert/delete/merge round trip, crash safety, several processes"""
+
+from core.config import settings
+from services.catalog_updates import base_files, manifest_path, merge_segments, write_base_version
+from services.vector_store import VectorStore
+from tests.conftest import PRODUCTS, product, product_ids
+
+
+def catalog(store):
+    """product_id -> price of every product currently searchable"""
+    base_index, base_metadata, delta = store._current_segments()
+    prices = {}
+    for row in range(base_metadata.size):
+        if row not in set(delta.tombstones.tolist()):
+            prices[base_metadata.value(row, "product_id")] = base_metadata.value(row, "price")
+    for product_id, row in delta.live.items():
+        prices[product_id] = delta.records[row]["price"]
+    return prices
+
+
+def second_process(encoder):
+    """Another VectorStore on the same files, like a server worker process has"""
+    store = VectorStore()
+    store._components["embedding_model"] = encoder
+    return store
+
+
+def search_ids(store, encoder, query, k=5):
+    return product_ids(store.search_products_batch(encoder.encode([query]), k, queries=[query], mode="hybrid")[0][1])
+
+
+def test_upsert_delete_merge_round_trip(vector_store, encoder):
+    vector_store.upsert_products([
+        product(900, "Roadster Men Black Leather Jacket", "Men", "Black", "Jackets", 130.0),
+        dict(PRODUCTS[0], price=39.0),
+    ])
+    assert vector_store.delete_products([12, 999]) == 1
+    expected = {p["product_id"]: p["price"] for p in PRODUCTS if p["product_id"] != 12}
+    expected.update({900: 130.0, 1: 39.0})
+    assert catalog(vector_store) == expected
+
+    assert vector_store.merge_delta()
+    assert not vector_store.product_segments.delta.changed
+    assert catalog(vector_store) == expected
+    assert base_files(settings.PRODUCT_INDEX_PATH, settings.PRODUCT_METADATA_PATH).version == 1
+
+    # A restart loads the merged base, with nothing left to replay
+    restarted = second_process(encoder)
+    assert catalog(restarted) == expected
+    assert search_ids(restarted, encoder, "black leather jacket")[0] == 900
+    assert not vector_store.merge_delta()
+
+
+def test_interrupted_merge_keeps_old_base(vector_store, encoder):
+    vector_store.upsert_products([dict(PRODUCTS[0], price=39.0)])
+    # Crash after the new version was written, before the manifest switched to it
+    index, records = merge_segments(vector_store.product_segments)
+    write_base_version(settings.PRODUCT_INDEX_PATH, settings.PRODUCT_METADATA_PATH, index, records[:-1], "products")
+
+    restarted = second_process(encoder)
+    assert catalog(restarted)[1] == 39.0
+    assert restarted.product_index.ntotal == len(PRODUCTS)
+    assert restarted.merge_delta()
+    assert catalog(second_process(encoder))[1] == 39.0
+
+
+def test_updates_are_visible_across_processes(vector_store, encoder):
+    other = second_process(encoder)
+    assert 900 not in search_ids(other, encoder, "black leather jacket")
+
+    vector_store.upsert_products([product(900, "Roadster Men Black Leather Jacket", "Men", "Black", "Jackets", 130.0)])
+    assert search_ids(other, encoder, "black leather jacket")[0] == 900
+
+    # Merged by the other process: the first one picks up the new base
+    other.delete_products([11])
+    assert other.merge_delta()
+    assert manifest_path(settings.PRODUCT_INDEX_PATH).exists()
+    assert catalog(vector_store) == catalog(other)
+    assert 11 not in catalog(vector_store)
+
+
+def test_one_merge_at_a_time(vector_store, encoder):
+    other = second_process(encoder)
+    vector_store.upsert_products([dict(PRODUCTS[0], price=39.0)])
+    assert vector_store._merge_lock.acquire(blocking=False)
+    try:
+        assert not other.merge_delta()
+    finally:
+        vector_store._merge_lock.release()
+    assert other.merge_delta()
+
+
+def test_product_updates_leave_faq_listeners_alone(vector_store):
+    calls = []
+    vector_store.add_reload_listener(lambda: calls.append("faq"), stores=("faq",))
+    vector_store.add_reload_listener(lambda: calls.append("products"), stores=("products",))
+
+    vector_store.upsert_products([dict(PRODUCTS[0], price=39.0)])
+    vector_store.merge_delta()
+    assert calls and set(calls) == {"products"}
+
+    vector_store.reload()
+    assert "faq" in calls
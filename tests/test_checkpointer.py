@@ -0,0 +1,74 @@
+import asyncio
+import operator
+import threading
+from typing import Annotated, List, TypedDict
+
+from langgraph.graph import END, START, StateGraph
+
+from services.checkpointer import SQLiteCheckpointSaver
+
+
+class Counter(TypedDict):
+    turns: Annotated[List[str], operator.add]
+
+
+def counter_graph(checkpointer):
+    builder = StateGraph(Counter)
+    builder.add_node("step", lambda state: {"turns": ["step"]})
+    builder.add_edge(START, "step")
+    builder.add_edge("step", END)
+    return builder.compile(checkpointer=checkpointer)
+
+
+def test_conversation_resumes_from_disk(tmp_path):
+    config = {"configurable": {"thread_id": "t1"}}
+    saver = SQLiteCheckpointSaver(tmp_path / "checkpoints.sqlite")
+    graph = counter_graph(saver)
+    graph.invoke({"turns": ["hi"]}, config)
+    graph.invoke({"turns": ["again"]}, config)
+    saver.close()
+
+    reopened = SQLiteCheckpointSaver(tmp_path / "checkpoints.sqlite")
+    state = counter_graph(reopened).invoke({"turns": ["back"]}, config)
+    assert state["turns"] == ["hi", "step", "again", "step", "back", "step"]
+    reopened.close()
+
+
+def test_compaction_keeps_last_checkpoints_and_their_blobs(tmp_path):
+    config = {"configurable": {"thread_id": "t1"}}
+    saver = SQLiteCheckpointSaver(tmp_path / "checkpoints.sqlite", keep_last=2, flush_every=1)
+    graph = counter_graph(saver)
+    for turn in range(5):
+        graph.invoke({"turns": [str(turn)]}, config)
+
+    assert len(list(saver.list(config))) == 2
+    # The latest state survives compaction intact
+    assert graph.get_state(config).values["turns"][-2:] == ["4", "step"]
+    versions = saver.get_tuple(config).checkpoint["channel_versions"]
+    blobs = saver._conn.execute("SELECT channel, version FROM blobs").fetchall()
+    referenced = {(channel, str(version)) for channel, version in versions.items()}
+    assert referenced <= set(blobs)
+    assert len(blobs) < 5 * len(versions)
+    saver.close()
+
+
+def test_async_methods_run_off_the_event_loop(tmp_path):
+    config = {"configurable": {"thread_id": "t1"}}
+    saver = SQLiteCheckpointSaver(tmp_path / "checkpoints.sqlite")
+    threads = []
+    get_tuple = saver.get_tuple
+
+    def recording_get_tuple(*args, **kwargs):
+        threads.append(threading.current_thread())
+        return get_tuple(*args, **kwargs)
+
+    saver.get_tuple = recording_get_tuple
+
+    async def run():
+        await counter_graph(saver).ainvoke({"turns": ["hi"]}, config)
+        return threading.current_thread()
+
+    loop_thread = asyncio.run(run())
+    assert threads and all(thread is not loop_thread for thread in threads)
+    assert saver.get_tuple(config).checkpoint["channel_values"]["turns"] == ["hi", "step"]
+    saver.close()
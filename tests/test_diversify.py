@@ -0,0 +1,28 @@
+from core.config import settings
+from tests.conftest import product, product_ids
+
+
+VARIANTS = [
+    product(101, "Puma Men Black Polo T-shirt", "Men", "Black", "Tshirts", 30.0),
+    product(102, "Puma Men Navy Blue Polo T-shirt", "Men", "Navy Blue", "Tshirts", 30.0),
+    product(103, "Puma Men Grey Polo T-shirt", "Men", "Grey", "Tshirts", 30.0),
+]
+
+
+def search(vector_store, encoder, lambda_mult):
+    query = "puma polo t-shirt"
+    (_, results), = vector_store.search_products_batch(
+        encoder.encode([query]), k=5, queries=[query], mode="vector", lambda_mult=lambda_mult
+    )
+    return product_ids(results)
+
+
+def test_colour_variants_collapse_only_when_diversifying(vector_store, encoder):
+    vector_store.upsert_products(VARIANTS)
+
+    plain = search(vector_store, encoder, None)
+    assert set(plain[:3]) == {101, 102, 103}
+
+    diverse = search(vector_store, encoder, settings.MMR_LAMBDA)
+    assert len(set(diverse) & {101, 102, 103}) == 1
+    assert len(diverse) == 5
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+import services.encoders
+import services.vector_store
+from core.config import settings
+from services.encoders import compatibility
+from services.vector_store import VectorStore
+from tests.conftest import HashingEncoder
+
+
+class NoisyEncoder(HashingEncoder):
+    """HashingEncoder with deterministic noise, for a backend that drifts from torch"""
+
+    def __init__(self, noise: float):
+        super().__init__()
+        self.noise = noise
+
+    def encode(self, texts, **kwargs):
+        vectors = super().encode(texts)
+        rng = np.random.default_rng(0)
+        return vectors + self.noise * rng.standard_normal(vectors.shape).astype(np.float32)
+
+
+def test_compatibility_compares_encoders_on_same_texts():
+    texts = ["navy blue shirt", "black leather wallet", "running shoes"]
+    assert compatibility(HashingEncoder(), HashingEncoder(), texts) == pytest.approx(1.0)
+    assert compatibility(NoisyEncoder(1.0), HashingEncoder(), texts) < settings.EMBEDDING_MIN_COSINE
+    assert compatibility(HashingEncoder(), HashingEncoder(), []) is None
+
+
+@pytest.mark.parametrize("noise, expected", [(0.0, "onnx"), (1.0, "torch")])
+def test_backend_falls_back_to_torch_when_vectors_drift(indices_dir, monkeypatch, noise, expected):
+    encoders = {"torch": HashingEncoder(), "onnx": NoisyEncoder(noise)}
+    monkeypatch.setattr(services.encoders, "load_encoder", lambda name, backend: encoders[backend])
+    services.encoders.check_backend("onnx", ["navy blue shirt", "black leather wallet", "running shoes"])
+
+    # Serving loads only the chosen encoder
+    loaded = []
+    monkeypatch.setattr(
+        services.vector_store, "load_encoder", lambda name, backend: loaded.append(backend) or encoders[backend]
+    )
+    monkeypatch.setattr(settings, "EMBEDDING_BACKEND", "onnx")
+    assert VectorStore().embedding_model is encoders[expected]
+    assert loaded == [expected]
+
+
+def test_unchecked_backend_uses_torch(indices_dir, monkeypatch):
+    loaded = []
+    monkeypatch.setattr(services.vector_store, "load_encoder", lambda name, backend: loaded.append(backend))
+    monkeypatch.setattr(settings, "EMBEDDING_BACKEND", "onnx-int8")
+    VectorStore().embedding_model
+    assert loaded == ["torch"]
+
+
+def test_verdicts_are_keyed_by_onnx_file(indices_dir, monkeypatch):
+    monkeypatch.setattr(services.encoders, "load_encoder", lambda name, backend: HashingEncoder())
+    services.encoders.check_backend("onnx-int8", ["navy blue shirt"], model_name="model")
+    assert services.encoders.recorded_compatibility("model", "onnx-int8") == pytest.approx(1.0)
+
+    monkeypatch.setattr(settings, "EMBEDDING_ONNX_INT8_FILE", "onnx/model_qint8_arm64.onnx")
+    assert services.encoders.recorded_compatibility("model", "onnx-int8") is None
+
+
+def test_max_seq_length_capped_on_accelerated_backends_only(monkeypatch):
+    class Model:
+        def __init__(self, *args, **kwargs):
+            self.max_seq_length = 256
+
+    monkeypatch.setattr(services.encoders, "SentenceTransformer", Model)
+    assert services.encoders.load_encoder("model", "torch").max_seq_length == 256
+    assert services.encoders.load_encoder("model", "onnx").max_seq_length == settings.EMBEDDING_MAX_SEQ_LENGTH
@@ -0,0 +1,40 @@
+from collections import Counter
+
+from services import search_products_tool
+from services.metadata_index import Range
+from tests.conftest import PRODUCTS
+
+
+def expected_counts(field, predicate, top_n=5):
+    counts = Counter(p[field] for p in PRODUCTS if predicate(p))
+    return dict(sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:top_n])
+
+
+def test_facets_count_every_matching_product(vector_store):
+    total, facets = vector_store.product_facets({"gender": "Men"}, ["baseColour", "usage"])
+    men = lambda p: p["gender"] == "Men"
+    assert total == sum(map(men, PRODUCTS))
+    assert facets["baseColour"] == expected_counts("baseColour", men)
+    assert facets["usage"] == expected_counts("usage", men)
+
+
+def test_facets_follow_pending_updates(vector_store):
+    vector_store.upsert_products([{**PRODUCTS[0], "baseColour": "Black"}])
+    vector_store.delete_products([10])
+    total, facets = vector_store.product_facets({"price": Range(min=40)}, ["baseColour"], top_n=1)
+
+    updated = [{**PRODUCTS[0], "baseColour": "Black"}] + [p for p in PRODUCTS[1:] if p["product_id"] != 10]
+    matching = [p for p in updated if p["price"] >= 40]
+    assert total == len(matching)
+    assert facets["baseColour"] == {"Black": sum(p["baseColour"] == "Black" for p in matching)}
+
+
+def test_tool_suggests_only_unset_fields_with_choices(search_store):
+    response = search_products_tool("shirt", gender="Men", k=2)
+    filters = response["available_filters"]
+    assert "gender" not in filters
+    assert filters["baseColour"] == expected_counts("baseColour", lambda p: p["gender"] == "Men")
+    assert all(len(counts) > 1 for counts in filters.values())
+
+    # Everything that matches is shown: nothing to narrow
+    assert search_products_tool("watch", gender="Men", articleType="Watches", k=5)["available_filters"] is None
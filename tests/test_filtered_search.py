@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from services.index_builder import PRODUCT_TEXT_FIELDS, record_text
+from services.metadata_index import Range
+from tests.conftest import PRODUCTS, product_ids
+
+
+def brute_force(encoder, query, predicate):
+    """product_id -> squared L2 distance to the query, for every product matching the filter"""
+    matching = [p for p in PRODUCTS if predicate(p)]
+    vectors = encoder.encode([record_text(p, PRODUCT_TEXT_FIELDS) for p in matching])
+    distances = ((vectors - encoder.encode([query])[0]) ** 2).sum(axis=1)
+    return {p["product_id"]: float(d) for p, d in zip(matching, distances)}
+
+
+@pytest.mark.parametrize("filters, predicate", [
+    ({"gender": "Men"}, lambda p: p["gender"] == "Men"),
+    ({"gender": "men", "baseColour": "BLACK"}, lambda p: p["gender"] == "Men" and p["baseColour"] == "Black"),
+    ({"price": Range(max=40)}, lambda p: p["price"] <= 40),
+    ({"articleType": "Shirts", "price": Range(min=40, max=50)}, lambda p: p["articleType"] == "Shirts" and 40 <= p["price"] <= 50),
+])
+def test_filtered_top_k_is_exact(vector_store, encoder, filters, predicate):
+    query = "black leather watch"
+    expected = brute_force(encoder, query, predicate)
+    distances, results = vector_store.search(
+        vector_store.product_index, vector_store.product_metadata, encoder.encode([query])[0], k=5, filters=filters
+    )
+    # Exactly the k best matching products (any order among equal distances)
+    assert len(results) == min(5, len(expected))
+    np.testing.assert_allclose(distances, sorted(expected.values())[:len(results)], atol=1e-5)
+    for hit, distance in zip(product_ids(results), distances):
+        assert expected[hit] == pytest.approx(distance, abs=1e-5)
+
+
+def test_filter_without_matches_returns_nothing(vector_store, encoder):
+    distances, results = vector_store.search(
+        vector_store.product_index, vector_store.product_metadata, encoder.encode(["shirt"])[0],
+        k=5, filters={"baseColour": "Turquoise"}
+    )
+    assert results == [] and len(distances) == 0
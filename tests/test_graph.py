@@ -0,0 +1,29 @@
+"""Graph routing with the fake LLM: product fast path"""
+import uuid
+
+from langchain_core.messages import HumanMessage
+
+from graph import build_graph
+
+
+def ask(graph, message):
+    config = {"configurable": {"thread_id": uuid.uuid4().hex}}
+    state = graph.invoke({"messages": [HumanMessage(content=message)]}, config)
+    return state["messages"][-1].content
+
+
+def test_template_fast_path_renders_products(search_store):
+    reply = ask(build_graph(fast_path="template"), "show me black watches for men")
+    assert reply.startswith("Here's what I found:")
+    assert "(ID: 10) Skagen Men Black Watch - $150.0" in reply
+
+
+def test_fast_path_mode_is_fixed_per_graph(search_store):
+    template_graph = build_graph(fast_path="template")
+    llm_graph = build_graph(fast_path="llm")
+
+    # Building the second graph does not switch the first one
+    assert ask(template_graph, "show me black watches for men").startswith("Here's what I found:")
+    llm_reply = ask(llm_graph, "show me black watches for men")
+    assert not llm_reply.startswith("Here's what I found:")
+    assert "(ID: 10) Skagen Men Black Watch" in llm_reply
@@ -0,0 +1,34 @@
+import uuid
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from agents.nodes import _conversation_history, _project_history
+from graph import build_graph
+
+
+def test_history_is_kept_incrementally(search_store):
+    graph = build_graph(speculative=False, fast_path="off")
+    config = {"configurable": {"thread_id": uuid.uuid4().hex}}
+    for message in ("What is your return policy?", "show me black watches"):
+        graph.invoke({"messages": [HumanMessage(content=message)]}, config)
+    state = graph.get_state(config).values
+
+    history = state["history"]
+    # The same projection a full rescan gives: user turns and final replies only
+    assert [(type(m), m.content) for m in history] == [
+        (type(m), m.content) for m in _project_history(state["messages"])
+    ]
+    assert [type(m) for m in history] == [HumanMessage, AIMessage, HumanMessage, AIMessage]
+    assert any(isinstance(m, ToolMessage) for m in state["messages"])
+
+
+def test_checkpoints_without_history_are_rebuilt():
+    messages = [
+        HumanMessage(content="hi", id="1"),
+        AIMessage(content="", id="2", tool_calls=[{"name": "search", "args": {}, "id": "c"}]),
+        ToolMessage(content="[]", tool_call_id="c", id="3"),
+        AIMessage(content="hello", id="4"),
+        HumanMessage(content="shirts?", id="5"),
+    ]
+    history = _conversation_history({"messages": messages, "history": None})
+    assert [m.content for m in history] == ["hi", "hello", "shirts?"]
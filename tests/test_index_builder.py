@@ -0,0 +1,60 @@
+import argparse
+
+import faiss
+import numpy as np
+import pytest
+
+import services.index_builder
+from services.index_builder import build_index, evaluate, main, read_records
+from services.vector_store import VectorStore
+from tests.conftest import HashingEncoder, product_ids
+
+
+def index_args(**overrides):
+    values = dict(nlist=0, nprobe=16, pq_m=4, pq_bits=8, hnsw_m=16, ef_construction=100, ef_search=64)
+    return argparse.Namespace(**{**values, **overrides})
+
+
+@pytest.fixture(scope="module")
+def vectors():
+    vectors = np.random.default_rng(0).standard_normal((2000, 16)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+@pytest.mark.parametrize("index_type, min_recall", [("flat", 1.0), ("ivf", 0.9), ("hnsw", 0.9), ("ivfpq", 0.3)])
+def test_index_types_report_recall_against_exact_search(vectors, index_type, min_recall):
+    index = build_index(vectors, index_type, index_args())
+    assert index.ntotal == len(vectors)
+    report = evaluate(index, vectors, vectors[:50], k=10)
+    assert report["recall"] >= min_recall
+    assert report["p50_ms"] > 0 and report["exact_p50_ms"] > 0
+
+
+def test_too_few_vectors_fall_back_to_flat(vectors):
+    index = build_index(vectors[:100], "ivf", index_args(nlist=10))
+    assert isinstance(index, faiss.IndexFlatL2)
+
+
+def test_read_records_coerces_csv_cells(tmp_path):
+    path = tmp_path / "styles.csv"
+    path.write_text("id,productDisplayName,price,year\n7,Puma Grey T-shirt,25.5,\n")
+    assert read_records(path, {"id": "product_id"}) == [
+        {"product_id": 7, "productDisplayName": "Puma Grey T-shirt", "price": 25.5}
+    ]
+
+
+def test_built_indices_load_in_the_vector_store(indices_dir, tmp_path, monkeypatch):
+    encoder = HashingEncoder()
+    monkeypatch.setattr(services.index_builder, "load_encoder", lambda name, backend: encoder)
+    products = tmp_path / "styles.jsonl"
+    products.write_text(
+        '{"id": 1, "productDisplayName": "Skagen Men Black Watch", "gender": "Men", "price": 150}\n'
+        '{"id": 2, "productDisplayName": "Biba Women Printed Kurta", "gender": "Women", "price": 38}\n'
+    )
+    main(["--products", str(products), "--out", str(indices_dir), "--eval-queries", "2", "--k", "2"])
+
+    store = VectorStore()
+    store._components["embedding_model"] = encoder
+    (_, results), = store.search_products_batch(encoder.encode(["black watch"]), k=1)
+    assert product_ids(results) == [1]
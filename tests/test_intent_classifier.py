@@ -0,0 +1,60 @@
+import math
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from agents.nodes import _local_intent
+from core.config import settings
+from core.schemas import IntentClassification
+from services.intent_classifier import LocalIntentClassifier
+
+
+@pytest.fixture
+def classifier(search_store):
+    return LocalIntentClassifier(search_store)
+
+
+def intent(intent_type, confidence=1.0):
+    return IntentClassification(intent_type=intent_type, confidence=confidence, reasoning="")
+
+
+def test_classifies_against_both_indices(classifier):
+    assert classifier.classify("how long does shipping take").intent_type == "faq"
+    assert classifier.classify("skagen men black watch").intent_type == "product"
+
+
+def test_follow_up_switching_intent_goes_to_the_llm(classifier):
+    assert classifier.accept(intent("product"), previous=intent("product"))
+    assert not classifier.accept(intent("faq"), previous=intent("product"))
+    assert classifier.accept(intent("faq"))
+
+
+def test_local_intent_uses_previous_turn(search_store, monkeypatch):
+    monkeypatch.setattr(settings, "LOCAL_INTENT_CLASSIFIER", True)
+    monkeypatch.setattr(settings, "LOCAL_INTENT_THRESHOLD", 0.0)
+    state = {"messages": [HumanMessage(content="what is your return policy")], "intent": None}
+    assert _local_intent(state).intent_type == "faq"
+    assert _local_intent({**state, "intent": intent("product")}) is None
+
+
+def test_calibrate_finds_lowest_threshold_meeting_target(classifier):
+    examples = [
+        ("what is your return policy", "faq"),
+        ("how do i cancel my order", "faq"),
+        ("fossil men black leather wallet", "product"),
+        ("nike men black running shoes", "product"),
+        # Mislabelled on purpose
+        ("titan women silver watch", "faq"),
+    ]
+    confidences = {text: classifier.classify(text).confidence for text, _ in examples}
+
+    threshold, coverage = classifier.calibrate(examples, target_accuracy=1.0)
+    assert threshold > confidences["titan women silver watch"]
+    assert coverage == pytest.approx(
+        sum(value >= threshold for value in confidences.values()) / len(examples)
+    )
+
+    threshold, coverage = classifier.calibrate(examples, target_accuracy=0.8)
+    assert threshold == min(confidences.values()) and coverage == 1.0
+
+    assert classifier.calibrate([("titan women silver watch", "faq")], 1.0) == (math.inf, 0.0)
@@ -0,0 +1,36 @@
+from core.config import settings
+from services.vector_store import VectorStore
+
+
+def test_components_load_on_first_use(indices_dir, encoder):
+    store = VectorStore()
+    assert store._components == {}
+
+    store.faq_index
+    assert set(store._components) == {"faq_index"}
+    store._components["embedding_model"] = encoder
+    store.product_metadata
+    assert set(store._components) == {"faq_index", "embedding_model", "product_segments"}
+    assert set(store.load_times) >= {"startup", "faq_index", "product_segments"}
+
+
+def test_metadata_columns_are_converted_once(indices_dir, capsys, monkeypatch):
+    monkeypatch.setattr(settings, "INDEX_MMAP", True)
+    VectorStore().product_metadata
+    assert "Converting products.metadata to columns" in capsys.readouterr().out
+
+    metadata = VectorStore().product_metadata
+    assert "Converting" not in capsys.readouterr().out
+    assert metadata.row_dict(0)["productDisplayName"] == "Turtle Check Men Navy Blue Shirt"
+
+
+def test_reload_keeps_the_model_and_notifies(indices_dir, encoder):
+    store = VectorStore()
+    store._components["embedding_model"] = encoder
+    store.faq_index
+    reloads = []
+    store.add_reload_listener(lambda: reloads.append(True))
+
+    store.reload()
+    assert store._components == {"embedding_model": encoder}
+    assert reloads == [True]
@@ -0,0 +1,80 @@
+import asyncio
+import threading
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+import agents.nodes
+from core.config import settings
+from services.metadata_extractor import LocalMetadataExtractor, extract_price
+
+
+@pytest.fixture
+def extractor(vector_store):
+    return LocalMetadataExtractor(vector_store)
+
+
+def test_extracts_catalog_values(extractor):
+    metadata = extractor.extract("black shirts for men")
+    assert (metadata.baseColour, metadata.articleType, metadata.gender) == ("Black", "Shirts", "Men")
+
+
+@pytest.mark.parametrize("message", [
+    "shirts, not black",
+    "no black shirts",
+    "wallets without black",
+    "something not too formal",
+    "I don't want black shirts",
+    "anything but black shirts",
+    "shirts except black",
+    "shirts other than black",
+])
+def test_negated_values_are_not_filters(extractor, message):
+    # Exclusions can't be expressed as filters: the LLM decides
+    assert extractor.extract(message) is None
+
+
+def test_synonyms_resolve_to_the_catalog_value(extractor):
+    assert extractor.extract("navy shirts").baseColour == "Navy Blue"
+
+
+@pytest.mark.parametrize("message, sort", [
+    ("most expensive watches", "price_desc"),
+    ("priciest watches", "price_desc"),
+    ("cheapest watches", "price_asc"),
+    ("expensive watches", None),
+    ("watches, not too expensive", None),
+    ("watches but nothing too expensive", None),
+    ("watches, not too cheap", None),
+])
+def test_sort_needs_a_superlative_and_no_negation(message, sort):
+    found, _ = extract_price(message)
+    assert found.get("sort") == sort
+
+
+def test_negated_price_phrase_is_dropped_from_query(extractor):
+    metadata = extractor.extract("black watches, not too expensive")
+    assert metadata.sort is None
+    assert "expensive" not in metadata.search_query
+    assert metadata.baseColour == "Black"
+
+
+def test_async_node_extracts_off_the_event_loop(search_store, monkeypatch):
+    extractor = LocalMetadataExtractor(search_store)
+    threads = []
+
+    def extract(*args):
+        threads.append(threading.current_thread())
+        return LocalMetadataExtractor.extract(extractor, *args)
+
+    monkeypatch.setattr(extractor, "extract", extract)
+    monkeypatch.setattr(agents.nodes, "get_metadata_extractor", lambda: extractor)
+    monkeypatch.setattr(settings, "LOCAL_METADATA_EXTRACTOR", True)
+
+    async def run():
+        state = {"messages": [HumanMessage(content="black shirts for men")], "product_metadata": None}
+        return await agents.nodes.aextract_product_metadata(state), threading.current_thread()
+
+    update, loop_thread = asyncio.run(run())
+    assert update["product_metadata"].baseColour == "Black"
+    assert threads and threads[0] is not loop_thread
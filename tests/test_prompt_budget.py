@@ -0,0 +1,52 @@
+import json
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from agents.prompt_budget import PRODUCT_PROMPT_FIELDS, assemble_prompt, estimate_tokens
+from core.prompts import PRODUCT_ASSISTANT_SYSTEM_PROMPT
+
+
+def product_turn(question, answer, call_id):
+    payload = {
+        "count": 1,
+        "results": [{"product_id": 10, "productDisplayName": "Skagen Men Black Watch", "price": 150.0,
+                     "season": "Winter", "usage": "Formal", "similarity_score": 0.5}],
+        "available_filters": None,
+    }
+    return [
+        HumanMessage(content=question),
+        AIMessage(content="", tool_calls=[{"name": "search_products_tool", "args": {"query": question}, "id": call_id}]),
+        ToolMessage(content=json.dumps(payload), tool_call_id=call_id),
+        AIMessage(content=answer),
+    ]
+
+
+SYSTEM = SystemMessage(content="You are a shopping assistant.")
+
+
+def test_tool_results_keep_only_prompt_fields():
+    prompt = assemble_prompt(SYSTEM, product_turn("black watches", "Here you go", "c1"), budget=0)
+    result = json.loads(prompt[3].content)["results"][0]
+    assert result == {"product_id": 10, "productDisplayName": "Skagen Men Black Watch", "price": 150.0}
+
+
+def test_product_prompt_describes_the_compacted_fields():
+    line = next(line for line in PRODUCT_ASSISTANT_SYSTEM_PROMPT.splitlines() if "Each product has:" in line)
+    assert line.split("Each product has:")[1].replace(" ", "").split(",") == list(PRODUCT_PROMPT_FIELDS)
+
+
+def test_over_budget_drops_old_tool_traffic_then_old_turns():
+    messages = product_turn("black watches", "Skagen it is", "c1") + product_turn("and wallets?", "Fossil", "c2")
+    current = messages[4:]
+
+    full = assemble_prompt(SYSTEM, messages, budget=0)
+    assert len(full) == 9
+
+    # Earlier turn keeps its question and answer, the current turn stays whole
+    tight = estimate_tokens(assemble_prompt(SYSTEM, messages[:1] + messages[3:], budget=0))
+    trimmed = assemble_prompt(SYSTEM, messages, budget=tight)
+    assert [m.content for m in trimmed[1:3]] == ["black watches", "Skagen it is"]
+    assert trimmed[3:] == assemble_prompt(SYSTEM, current, budget=0)[1:]
+
+    smallest = assemble_prompt(SYSTEM, messages, budget=1)
+    assert smallest[1:] == assemble_prompt(SYSTEM, current, budget=0)[1:]
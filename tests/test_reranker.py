@@ -0,0 +1,74 @@
+import time
+
+import pytest
+
+import services.tools
+from core.config import settings
+from services import search_products_tool
+from services.reranker import CrossEncoderReranker
+
+
+class LengthModel:
+    """Cross-encoder stand-in: shorter texts score higher"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.batches = []
+
+    def predict(self, pairs, batch_size):
+        self.batches.append(len(pairs))
+        time.sleep(self.delay)
+        return [-len(text) for _, text in pairs]
+
+
+@pytest.fixture
+def hits(vector_store, encoder):
+    _, results = vector_store.search(
+        vector_store.product_index, vector_store.product_metadata, encoder.encode(["shirt"])[0], k=10
+    )
+    return results
+
+
+def reranker(model, batch_size=4, budget_ms=1000.0):
+    reranker = CrossEncoderReranker()
+    reranker._model = model
+    reranker.batch_size = batch_size
+    reranker.budget = budget_ms / 1000.0
+    return reranker
+
+
+def test_rerank_orders_by_score_in_batches(hits):
+    model = LengthModel()
+    reranked = reranker(model).rerank("shirt", hits, 3, "productDisplayName")
+
+    lengths = sorted(len(hit["productDisplayName"]) for hit in hits)
+    assert [len(hit["productDisplayName"]) for hit in reranked] == lengths[:3]
+    assert model.batches == [4, 4, 2]
+
+
+def test_over_budget_keeps_retrieval_order(hits):
+    model = LengthModel(delay=0.02)
+    slow = reranker(model, budget_ms=1.0)
+
+    assert slow.rerank("shirt", hits, 3, "productDisplayName") == list(hits[:3])
+    # The budget is checked between batches: one batch ran
+    assert model.batches == [4]
+    assert slow.stats()["fallbacks"] == 1
+
+
+def test_unavailable_model_keeps_retrieval_order(hits):
+    missing = CrossEncoderReranker()
+    missing._available = False
+    assert missing.rerank("shirt", hits, 3, "productDisplayName") == list(hits[:3])
+
+
+def test_search_tool_retrieves_deeper_when_reranking(search_store, monkeypatch):
+    model = LengthModel()
+    monkeypatch.setattr(settings, "RERANK", True)
+    monkeypatch.setattr(settings, "RERANK_CANDIDATES", 20)
+    monkeypatch.setattr(services.tools, "get_reranker", lambda: reranker(model, batch_size=32))
+
+    response = search_products_tool("navy shirt for reranking", k=3)
+    names = [result["productDisplayName"] for result in response["results"]]
+    assert model.batches == [20]
+    assert names == sorted(names, key=len)
@@ -0,0 +1,30 @@
+import pytest
+
+from services import search_products_tool
+
+
+def test_search_results_are_read_only_views(vector_store, encoder):
+    _, results = vector_store.search(
+        vector_store.product_index, vector_store.product_metadata, encoder.encode(["black watch"])[0], k=3
+    )
+    hit = results[0]
+    with pytest.raises(AttributeError):
+        hit.score = 0.0
+    assert hit.to_dict() == vector_store.product_metadata.row_dict(hit.row)
+    assert hit["productDisplayName"] == hit.get("productDisplayName")
+    assert "missing" not in hit and hit.get("missing", "-") == "-"
+
+
+def test_tool_responses_do_not_share_state(search_store):
+    first = search_products_tool("black watch", gender="Men")
+    first["results"][0]["price"] = -1.0
+    first["results"][0]["productDisplayName"] = "changed"
+    first["available_filters"]["baseColour"].clear()
+
+    # Same (cached) search: untouched results, and the catalog itself is unchanged
+    second = search_products_tool("black watch", gender="Men")
+    assert second["results"][0]["price"] > 0
+    assert second["results"][0]["productDisplayName"] != "changed"
+    assert second["available_filters"]["baseColour"]
+    row = search_store.product_metadata.row_dict(0)
+    assert row["productDisplayName"] == "Turtle Check Men Navy Blue Shirt"
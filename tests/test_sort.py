@@ -0,0 +1,33 @@
+import pytest
+
+from core.config import settings
+from tests.conftest import PRODUCTS, product_ids
+
+
+def sorted_search(vector_store, encoder, sort, mode, filters, k=3):
+    query = "men black watch"
+    (_, results), = vector_store.search_products_batch(
+        encoder.encode([query]), k=k, filters_per_query=[filters], queries=[query], mode=mode, sort=sort
+    )
+    return product_ids(results)
+
+
+def expected(sort, gender="Men", k=3):
+    matching = [p for p in PRODUCTS if p["gender"] == gender]
+    matching.sort(key=lambda p: p["price"], reverse=sort == "price_desc")
+    return [p["product_id"] for p in matching[:k]]
+
+
+@pytest.mark.parametrize("mode", ["vector", "lexical", "hybrid"])
+@pytest.mark.parametrize("sort", ["price_asc", "price_desc"])
+def test_sort_covers_every_filtered_product(vector_store, encoder, monkeypatch, mode, sort):
+    # A window smaller than the filtered set must not matter
+    monkeypatch.setattr(settings, "SORT_CANDIDATES", 3)
+    assert sorted_search(vector_store, encoder, sort, mode, {"gender": "Men"}) == expected(sort)
+
+
+@pytest.mark.parametrize("mode", ["vector", "lexical", "hybrid"])
+def test_sort_sees_pending_updates(vector_store, encoder, monkeypatch, mode):
+    monkeypatch.setattr(settings, "SORT_CANDIDATES", 3)
+    vector_store.upsert_products([{**PRODUCTS[4], "price": 1.0}])
+    assert sorted_search(vector_store, encoder, "price_asc", mode, {"gender": "Men"}) == [5] + expected("price_asc")[:2]
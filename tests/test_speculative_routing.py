@@ -0,0 +1,49 @@
+import uuid
+
+from langchain_core.messages import HumanMessage
+
+from agents import get_speculation_stats
+from core.config import settings
+from graph import build_graph
+
+
+def run_turn(graph, message):
+    config = {"configurable": {"thread_id": uuid.uuid4().hex}}
+    nodes = [node for chunk in graph.stream({"messages": [HumanMessage(content=message)]}, config)
+             for node in chunk]
+    return nodes, graph.get_state(config).values
+
+
+def test_extraction_runs_alongside_classification(search_store, llm):
+    graph = build_graph(speculative=True, fast_path="off")
+    before = get_speculation_stats()
+
+    nodes, state = run_turn(graph, "show me black watches")
+    assert set(nodes[:2]) == {"classify_intent", "speculative_extract"}
+    assert nodes[2:4] == ["resolve_speculation", "product_assistant"]
+    assert "extract_product_metadata" not in nodes
+    assert state["product_metadata"] is not None and state["product_metadata"].can_search
+    assert state["speculative_metadata"] is None
+
+    nodes, state = run_turn(graph, "What is your return policy?")
+    assert nodes[2:4] == ["resolve_speculation", "faq_assistant"]
+    # The FAQ turn's extraction is thrown away, and counted as wasted
+    assert state.get("product_metadata") is None
+
+    stats = get_speculation_stats()
+    assert stats["speculative_calls"] - before["speculative_calls"] == 2
+    assert stats["wasted_calls"] - before["wasted_calls"] == 1
+
+
+def test_local_extractions_are_not_counted(search_store, llm, monkeypatch):
+    monkeypatch.setattr(settings, "LOCAL_METADATA_EXTRACTOR", True)
+    graph = build_graph(speculative=True, fast_path="off")
+    before = get_speculation_stats()
+
+    nodes, state = run_turn(graph, "show me black watches")
+    assert nodes[2:4] == ["resolve_speculation", "product_assistant"]
+    assert state["product_metadata"] is not None and state["product_metadata"].can_search
+
+    stats = get_speculation_stats()
+    assert stats["speculative_calls"] == before["speculative_calls"]
+    assert stats["wasted_calls"] == before["wasted_calls"]
@@ -0,0 +1,54 @@
+import asyncio
+import uuid
+
+import pytest
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from main import FashionChatbot, _StreamTurn
+
+
+@pytest.fixture
+def chatbot(search_store):
+    return FashionChatbot(echo=False)
+
+
+@pytest.mark.parametrize("message", ["Show me black watches", "What is your return policy?"])
+def test_tokens_add_up_to_the_reply(chatbot, message):
+    events = list(chatbot.chat_stream(message, uuid.uuid4().hex))
+    done = events[-1]
+    tokens = [event for event in events if event["type"] == "token"]
+
+    assert done["type"] == "done" and done["response"]
+    assert "".join(event["text"] for event in tokens) == done["response"]
+    # Tool-calling steps emit progress, not text
+    assert {event["node"] for event in tokens} <= {"faq_assistant", "product_assistant", "product_answer"}
+    assert any(event["type"] == "node" for event in events)
+
+
+def test_async_stream_matches_sync_stream(chatbot):
+    async def run():
+        return [event async for event in chatbot.achat_stream("Show me black watches", uuid.uuid4().hex)]
+
+    sync = [event for event in chatbot.chat_stream("Show me black watches", uuid.uuid4().hex)]
+    events = asyncio.run(run())
+    assert [event["type"] for event in events] == [event["type"] for event in sync]
+    assert events[-1]["response"] == sync[-1]["response"]
+
+
+def test_token_streamed_reply_is_not_sent_twice(chatbot):
+    turn = _StreamTurn(chatbot, "t1")
+    metadata = {"langgraph_node": "product_answer"}
+    events = []
+    for text in ("Here ", "you go"):
+        events += turn.handle("messages", (AIMessageChunk(content=text), metadata))
+    events += turn.handle("updates", {"product_answer": {"messages": [AIMessage(content="Here you go")]}})
+
+    assert [event["text"] for event in events if event["type"] == "token"] == ["Here ", "you go"]
+    assert events[-1] == {"type": "node", "node": "product_answer"}
+    assert turn.done()["response"] == "Here you go"
+
+
+def test_chunks_of_other_nodes_are_not_streamed(chatbot):
+    turn = _StreamTurn(chatbot, "t1")
+    chunk = AIMessageChunk(content='{"intent_type": "product"}')
+    assert list(turn.handle("messages", (chunk, {"langgraph_node": "classify_intent"}))) == []
@@ -0,0 +1,77 @@
+"""Assistant tool loops: each assistant's own tool node, parallel tool calls, round cap"""
+import functools
+import threading
+import uuid
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+import agents.nodes
+import services.tools
+from agents.fake_llm import FakeChatModel
+from core.config import settings
+from graph import build_graph
+
+
+class ToolHappyLLM(FakeChatModel):
+    """Calls its tool `calls_per_round` times in every round it is allowed to"""
+
+    def __init__(self, calls_per_round=1):
+        self.calls_per_round = calls_per_round
+
+    def bind_tools(self, tools, tool_choice=None, **kwargs):
+        if tool_choice == "none":
+            return super().bind_tools(tools)
+        return _ToolCaller(tools[0].__name__, self.calls_per_round)
+
+
+class _ToolCaller:
+    def __init__(self, name, calls):
+        self.name, self.calls = name, calls
+
+    def invoke(self, messages):
+        return AIMessage(content="", tool_calls=[
+            {"name": self.name, "args": {"query": f"black watch {i}"}, "id": uuid.uuid4().hex}
+            for i in range(self.calls)
+        ])
+
+
+def run_turn(graph, message):
+    config = {"configurable": {"thread_id": uuid.uuid4().hex}}
+    nodes = [node for chunk in graph.stream({"messages": [HumanMessage(content=message)]}, config)
+             for node in chunk]
+    return nodes, graph.get_state(config).values["messages"]
+
+
+def test_each_assistant_loops_through_its_own_tools(search_store):
+    graph = build_graph(speculative=False, fast_path="off")
+    nodes, _ = run_turn(graph, "What is your return policy?")
+    assert nodes == ["classify_intent", "faq_assistant", "faq_tools", "faq_assistant"]
+    nodes, _ = run_turn(graph, "show me black watches")
+    assert nodes[-3:] == ["product_assistant", "product_tools", "product_assistant"]
+    assert "faq_tools" not in nodes
+
+
+def test_tool_rounds_are_capped(search_store, monkeypatch):
+    monkeypatch.setattr(agents.nodes, "llm", ToolHappyLLM())
+    _, messages = run_turn(build_graph(speculative=False, fast_path="off"), "show me black watches")
+    rounds = [msg for msg in messages if isinstance(msg, AIMessage) and msg.tool_calls]
+    assert len(rounds) == settings.MAX_TOOL_ROUNDS
+    assert messages[-1].content and not messages[-1].tool_calls
+
+
+def test_tool_calls_of_one_message_run_in_parallel(search_store, monkeypatch):
+    # Both calls must be inside the tool at once to get past the barrier
+    barrier = threading.Barrier(2, timeout=5)
+    search = services.tools.search_products_tool
+
+    @functools.wraps(search)
+    def waiting_search(*args, **kwargs):
+        barrier.wait()
+        return search(*args, **kwargs)
+
+    monkeypatch.setattr(services.tools, "search_products_tool", waiting_search)
+    monkeypatch.setattr(agents.nodes, "llm", ToolHappyLLM(calls_per_round=2))
+    monkeypatch.setattr(settings, "MAX_TOOL_ROUNDS", 1)
+    _, messages = run_turn(build_graph(speculative=False, fast_path="off"), "show me black watches")
+    results = [msg for msg in messages if isinstance(msg, ToolMessage)]
+    assert len(results) == 2 and all(msg.status != "error" for msg in results)